@@ -1,6 +1,4 @@
-import gradio as gr
 import numpy as np
-from fastrtc import WebRTC, ReplyOnPause
 
 def response(audio: tuple[int, np.ndarray]):
     """This function must yield audio frames"""
@@ -8,21 +6,31 @@ def response(audio: tuple[int, np.ndarray]):
     yield audio
 
 
-with gr.Blocks() as demo:
-    gr.HTML(
-    """
-    <h1 style='text-align: center'>
-    Chat (Powered by WebRTC ⚡️)
-    </h1>
-    """
-    )
-    with gr.Column():
-        with gr.Group():
-            audio = WebRTC(
-                mode="send-receive",
-                modality="audio",
-            )
-        audio.stream(fn=ReplyOnPause(response),
-                    inputs=[audio], outputs=[audio],
-                    time_limit=60)
-demo.launch()
\ No newline at end of file
+def build_demo():
+    import gradio as gr
+    from fastrtc import WebRTC, ReplyOnPause
+
+    with gr.Blocks() as demo:
+        gr.HTML(
+        """
+        <h1 style='text-align: center'>
+        Chat (Powered by WebRTC ⚡️)
+        </h1>
+        """
+        )
+        with gr.Column():
+            with gr.Group():
+                audio = WebRTC(
+                    mode="send-receive",
+                    modality="audio",
+                )
+            audio.stream(fn=ReplyOnPause(response),
+                        inputs=[audio], outputs=[audio],
+                        time_limit=60)
+    return demo
+
+def main():
+    build_demo().launch()
+
+if __name__ == "__main__":
+    main()
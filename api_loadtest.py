@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+
+import tracing
+from bench_chat import PLAIN_QUESTIONS, SEARCH_QUESTIONS, make_memory_file
+from mocks import MockLLM, MockSearch
+from trace_report import percentile
+
+# Configuration
+DEFAULT_SESSIONS = 50  # Concurrent conversations
+DEFAULT_TURNS = 5  # Messages sent in each conversation
+SEARCH_EVERY_N_TURNS = 4  # Every Nth question triggers a (mock) web search
+REQUEST_TIMEOUT_SECONDS = 120
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_server(persona_name, llm_latency, token_latency, search_latency, answer_cache):
+    """Serve the API in a background thread with a mock LLM and search; returns (base url, llm)"""
+    import uvicorn
+
+    import api_server
+    from persona_server import load_apps
+
+    tracing.TRACE_LOG_FILE = None
+    load_apps([persona_name])
+    engine = api_server.engine
+    llm = MockLLM(latency=llm_latency, token_latency=token_latency)
+    engine.llm = llm
+    engine.search_backend = MockSearch(latency=search_latency)
+    engine.router.log_file = None
+    engine.knowledge_base = None
+    engine.scheduler = None  # The mock LLM has no provider quota to protect
+    engine.conversations.cost_log_file = None
+    engine.conversations.counter.use_tokenizer = False  # Keeps transformers out of the measurement
+    engine.search_cache_ttl = 0
+    persona = engine.personas[persona_name]
+    persona.semantic_cache_enabled = answer_cache
+    if persona.memory_file:
+        persona.memory_file = os.path.join(tempfile.mkdtemp(prefix="api_loadtest_"), "memory.json")
+        make_memory_file(persona.memory_file, 5)
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(api_server.build_app(), host="127.0.0.1", port=port,
+                                           log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", llm
+
+
+def question_for(session, turn):
+    if (session + turn) % SEARCH_EVERY_N_TURNS == SEARCH_EVERY_N_TURNS - 1:
+        return SEARCH_QUESTIONS[(session + turn) % len(SEARCH_QUESTIONS)]
+    # Session-specific wording keeps the answer cache from serving every request when it is on
+    return f"{PLAIN_QUESTIONS[(session + turn) % len(PLAIN_QUESTIONS)]} (session {session})"
+
+
+async def send(client, url, persona_name, session, message, stream):
+    """Send one message; returns (seconds to first content, total seconds, completion tokens)"""
+    body = {"model": persona_name, "messages": [{"role": "user", "content": message}], "stream": stream}
+    if stream:
+        body["stream_options"] = {"include_usage": True}
+    headers = {"X-Session-Id": f"loadtest-{session}"}
+    start = time.perf_counter()
+    first = None
+    tokens = 0
+    if not stream:
+        response = await client.post(f"{url}/v1/chat/completions", json=body, headers=headers)
+        response.raise_for_status()
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed, response.json()["usage"]["completion_tokens"]
+
+    async with client.stream("POST", f"{url}/v1/chat/completions", json=body, headers=headers) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: ") or line == "data: [DONE]":
+                continue
+            data = json.loads(line[len("data: "):])
+            if "error" in data:
+                raise RuntimeError(data["error"]["message"])
+            if data.get("usage"):
+                tokens = data["usage"]["completion_tokens"]
+            if first is None and data["choices"] and data["choices"][0]["delta"].get("content"):
+                first = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    return first if first is not None else elapsed, elapsed, tokens
+
+
+async def run_session(client, url, persona_name, session, turns, stream, results):
+    for turn in range(turns):
+        try:
+            results.append(await send(client, url, persona_name, session, question_for(session, turn), stream))
+        except Exception as e:
+            print(f"Error in session {session}: {e}")
+            results.append(None)
+
+
+async def run_load(url, persona_name, sessions, turns, stream):
+    import httpx
+
+    results = []
+    limits = httpx.Limits(max_connections=sessions)
+    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT_SECONDS, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_session(client, url, persona_name, s, turns, stream, results)
+                               for s in range(sessions)))
+        total = time.perf_counter() - start
+    return results, total
+
+
+def print_report(results, total, stream):
+    ok = [r for r in results if r is not None]
+    print(f"Requests: {len(results)} ({len(results) - len(ok)} failed) in {total:.2f}s "
+          f"-> {len(ok) / total:.1f} req/s")
+    if not ok:
+        return
+    print(f"{'':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    rows = [("latency", [r[1] for r in ok])]
+    if stream:
+        rows.insert(0, ("time to first token", [r[0] for r in ok]))
+    for label, values in rows:
+        print(f"{label:<22}{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+              f"{percentile(values, 99) * 1000:>10.1f}")
+    tokens = sum(r[2] for r in ok)
+    print(f"Completion tokens: {tokens} ({tokens / total:.0f} tokens/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat API; starts a mock-backed server unless --url is given")
+    parser.add_argument("--url", help="Base URL of a running api_server (default: start one with a mock LLM)")
+    parser.add_argument("--persona", default="bluey")
+    parser.add_argument("--sessions", type=int, default=DEFAULT_SESSIONS, help="Concurrent conversations")
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="Messages per conversation")
+    parser.add_argument("--no-stream", action="store_true", help="Use non-streaming completions")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Mock LLM seconds per call")
+    parser.add_argument("--token-latency", type=float, default=0.005, help="Mock LLM seconds per streamed word")
+    parser.add_argument("--search-latency", type=float, default=0.5, help="Mock search seconds per query")
+    parser.add_argument("--answer-cache", action="store_true", help="Leave the semantic answer cache on")
+    args = parser.parse_args()
+
+    url, llm = args.url, None
+    if url is None:
+        url, llm = start_mock_server(args.persona, args.llm_latency, args.token_latency, args.search_latency,
+                                     args.answer_cache)
+    results, total = asyncio.run(run_load(url.rstrip("/"), args.persona, args.sessions, args.turns,
+                                          not args.no_stream))
+    print_report(results, total, not args.no_stream)
+    if llm is not None:
+        print(f"Mock LLM calls: {llm.calls}")
+
+
+if __name__ == "__main__":
+    main()
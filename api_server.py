@@ -0,0 +1,307 @@
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import memory_store
+import tracing
+from chat_engine import TurnResult, engine
+from llm_scheduler import SchedulerBusy
+from persona_server import PERSONA_APPS, load_apps
+from summarizer import append_turn
+
+# Configuration
+API_HOST = "127.0.0.1"
+API_PORT = 8000
+API_WORKERS = 32  # Threads running chat turns; each one mostly waits on the LLM
+SESSION_HEADER = "X-Session-Id"  # Conversation id; the request's `user` field is used when the header is absent
+MAX_SESSIONS = 10000  # Least recently used conversations are dropped beyond this
+SESSION_TTL_SECONDS = 3600  # Conversations idle this long are dropped
+
+
+def message_text(message):
+    """Text of an OpenAI chat message whose content is a string or a list of parts"""
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content
+
+
+def error_response(status, message, error_type="invalid_request_error"):
+    from fastapi.responses import JSONResponse
+
+    return JSONResponse({"error": {"message": message, "type": error_type}}, status_code=status)
+
+
+class SessionStore:
+    """Conversation history kept on the server, so clients only send each new message.
+
+    Keyed by (persona, session id). Turns of one session run one at a time. Sessions
+    dropped for being idle or least recently used are saved to memory like an ended one.
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL_SECONDS, executor=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.executor = executor  # Runs the memory save of dropped sessions off the event loop
+        self._sessions = OrderedDict()
+
+    def get(self, key, partition=memory_store.DEFAULT_PARTITION):
+        now = time.time()
+        self._expire(now)
+        session = self._sessions.get(key)
+        if session is None:
+            session = {"history": [], "lock": asyncio.Lock(), "last_used": now, "partition": partition}
+            self._sessions[key] = session
+            if len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+        self._sessions.move_to_end(key)
+        session["last_used"] = now
+        tracing.set_gauge("api_sessions", len(self._sessions))
+        return session
+
+    def pop(self, key):
+        return self._sessions.pop(key, None)
+
+    def _drop(self, key):
+        session = self._sessions.pop(key)
+        persona = engine.personas.get(key[0])
+        if persona is None:
+            return
+        args = (persona, session["history"], key[1], session["partition"])
+        if self.executor is not None:
+            self.executor.submit(engine.clear_and_save_memory, *args)
+        else:
+            engine.clear_and_save_memory(*args)
+
+    def _expire(self, now):
+        while self._sessions:
+            key, session = next(iter(self._sessions.items()))
+            if now - session["last_used"] < self.ttl or session["lock"].locked():
+                break
+            self._drop(key)
+
+
+class ChatAPI:
+    """OpenAI-compatible chat completions on top of the shared chat engine.
+
+    `model` names the persona. With a session id (header or `user` field) only the last
+    user message is read and the history is kept here; without one the request is
+    stateless and the earlier messages are used as the history.
+    """
+
+    def __init__(self, workers=API_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.sessions = SessionStore(executor=self.executor)
+
+    def parse(self, body, headers):
+        """Return (persona, message, history, session_id, partition) or an error response"""
+        persona = engine.personas.get(body.get("model"))
+        if persona is None:
+            return error_response(404, f"Unknown model {body.get('model')!r}; available: {sorted(engine.personas)}",
+                                  "model_not_found")
+        messages = [m for m in body.get("messages") or [] if m.get("role") in ("user", "assistant")]
+        if not messages or messages[-1].get("role") != "user":
+            return error_response(400, "messages must end with a user message")
+
+        user = body.get("user")
+        session_id = headers.get(SESSION_HEADER) or user
+        message = message_text(messages[-1])
+        history = None if session_id else [{"role": m["role"], "content": message_text(m)} for m in messages[:-1]]
+        partition = memory_store.partition_for_ids(user, session_id)
+        return persona, message, history, session_id, partition
+
+    def completion(self, completion_id, persona, result, created):
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": persona.name,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": result.response},
+                         "finish_reason": "stop"}],
+            "usage": usage(result),
+        }
+
+    async def respond(self, persona, message, history, session_id, partition):
+        """Run one turn in the worker pool and return its TurnResult"""
+        loop = asyncio.get_running_loop()
+        if session_id is None:
+            return await loop.run_in_executor(self.executor, engine.respond, persona, message, history,
+                                              None, partition)
+        session = self.sessions.get((persona.name, session_id), partition)
+        async with session["lock"]:
+            result = await loop.run_in_executor(self.executor, engine.respond, persona, message,
+                                                session["history"], session_id, partition)
+            session["history"] = append_turn(session["history"], message, result.response)
+        return result
+
+    async def stream(self, persona, message, history, session_id, partition, include_usage):
+        """Server-sent events in the OpenAI chunk format, ending with [DONE]"""
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        def chunk(delta, finish_reason=None):
+            return sse({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                        "model": persona.name, "choices": [{"index": 0, "delta": delta,
+                                                            "finish_reason": finish_reason}]})
+
+        session = None
+        if session_id is not None:
+            session = self.sessions.get((persona.name, session_id), partition)
+            await session["lock"].acquire()
+            history = session["history"]
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        stop = threading.Event()
+        result = TurnResult("")
+
+        def produce():
+            # The engine's generator runs entirely on this worker thread
+            pieces = engine.stream(persona, message, history, session_id, partition, result)
+            try:
+                for piece in pieces:
+                    if stop.is_set():
+                        pieces.close()
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, piece)
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+            except Exception as e:
+                print(f"Error streaming chat completion: {e}")
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        producer = None
+        try:
+            yield chunk({"role": "assistant", "content": ""})
+            producer = loop.run_in_executor(self.executor, produce)
+            while True:
+                piece = await queue.get()
+                if piece is None:
+                    break
+                if isinstance(piece, Exception):
+                    error_type = "rate_limit_error" if isinstance(piece, SchedulerBusy) else "server_error"
+                    yield sse({"error": {"message": str(piece), "type": error_type}})
+                    return
+                yield chunk({"content": piece})
+            await producer
+            if session is not None:
+                session["history"] = append_turn(history, message, result.response)
+            yield chunk({}, "stop")
+            if include_usage:
+                yield sse({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                           "model": persona.name, "choices": [], "usage": usage(result)})
+            yield "data: [DONE]\n\n"
+        finally:
+            # Client went away or the turn finished: stop the worker, and free the session
+            # once it has stopped so the next turn never runs alongside this one
+            stop.set()
+            if session is not None:
+                if producer is None or producer.done():
+                    session["lock"].release()
+                else:
+                    producer.add_done_callback(lambda _: session["lock"].release())
+
+    async def end_session(self, persona, session_id, user=None):
+        """Drop a conversation and save it to the persona's memory, like the Clear button"""
+        session = self.sessions.pop((persona.name, session_id))
+        if session is None:
+            return False
+        partition = memory_store.partition_for_ids(user, session_id) if user else session["partition"]
+        # Wait for a turn still running in this session so its reply is saved too
+        async with session["lock"]:
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, engine.clear_and_save_memory, persona, session["history"], session_id, partition)
+        return True
+
+
+def usage(result):
+    return {"prompt_tokens": result.input_tokens, "completion_tokens": result.output_tokens,
+            "total_tokens": result.input_tokens + result.output_tokens}
+
+
+def sse(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def build_app(api=None):
+    """FastAPI app serving every persona registered on the shared engine"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    api = api or ChatAPI()
+    app = FastAPI(title="LLMIntro chat API")
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": name, "object": "model", "owned_by": "llmintro"}
+                                           for name in sorted(engine.personas)]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        try:
+            body = await request.json()
+        except ValueError:
+            return error_response(400, "Request body must be JSON")
+        parsed = api.parse(body, request.headers)
+        if not isinstance(parsed, tuple):
+            return parsed
+        persona, message, history, session_id, partition = parsed
+        headers = {SESSION_HEADER: session_id} if session_id else {}
+
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(api.stream(persona, message, history, session_id, partition, include_usage),
+                                     media_type="text/event-stream", headers=headers)
+
+        created = int(time.time())
+        try:
+            result = await api.respond(persona, message, history, session_id, partition)
+        except SchedulerBusy as e:
+            return error_response(429, str(e), "rate_limit_error")
+        return JSONResponse(api.completion(f"chatcmpl-{uuid.uuid4().hex}", persona, result, created),
+                            headers=headers)
+
+    @app.get("/v1/sessions/{session_id}/usage")
+    async def session_usage(session_id: str, model: str):
+        if model not in engine.personas:
+            return error_response(404, f"Unknown model {model!r}", "model_not_found")
+        if engine.conversations is None:
+            return error_response(404, "Token accounting is disabled")
+        session = engine.conversations.find(model, session_id)
+        if session is None:
+            return error_response(404, f"Unknown session {session_id!r}", "session_not_found")
+        return session.report()
+
+    @app.delete("/v1/sessions/{session_id}")
+    async def end_session(session_id: str, model: str, user: str = None):
+        persona = engine.personas.get(model)
+        if persona is None:
+            return error_response(404, f"Unknown model {model!r}", "model_not_found")
+        ended = await api.end_session(persona, session_id, user)
+        return {"id": session_id, "deleted": ended}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible HTTP API for the chat personas")
+    parser.add_argument("--personas", nargs="+", choices=sorted(PERSONA_APPS), default=list(PERSONA_APPS))
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    load_apps(args.personas)
+    for name in args.personas:
+        engine.start_background(engine.personas[name])
+    tracing.start_metrics_server()
+    uvicorn.run(build_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import memory_store
+from chat_engine import engine
+from persona_server import PERSONA_APPS, load_apps
+from summarizer import append_turn
+from trace_report import percentile
+
+# Configuration
+DEFAULT_WORKERS = 8  # Conversations run at the same time; turns within one conversation run in order
+MAX_PENDING_PER_WORKER = 4  # Records read ahead of the workers, per worker
+PROGRESS_EVERY = 100  # Print progress after this many records
+
+
+def read_records(path):
+    """Yield (index, record) for each JSON line; the index is the line number and identifies the record"""
+    with open(path, "r") as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if line:
+                yield index, json.loads(line)
+
+
+def load_done(output_path):
+    """Results already written by an earlier run: {index: result} for records that succeeded"""
+    done = {}
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short when the last run was interrupted
+                continue
+            if "error" not in result:
+                done[result["index"]] = result
+    return done
+
+
+def _ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class BatchRunner:
+    """Runs chat records through the shared engine with bounded concurrency.
+
+    Records of one session run one at a time, in file order, each with the history of
+    the turns before it. A failed record stops its session so a rerun can resume it in order.
+    """
+
+    def __init__(self, output_path, workers=DEFAULT_WORKERS, done=None):
+        self.output_path = output_path
+        self.done = done or {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        self.histories = {}
+        self.stats = {"ok": 0, "errors": 0, "skipped": 0, "resumed": len(self.done), "cached": 0,
+                      "searched": 0, "input_tokens": 0, "output_tokens": 0, "search_tokens_saved": 0}
+        self.latencies = []
+        self._queues = {}
+        self._failed = set()
+        self._slots = threading.BoundedSemaphore(workers * MAX_PENDING_PER_WORKER)
+        self._lock = threading.Lock()
+        self._output = open(output_path, "a")
+        if self._output.tell() and not _ends_with_newline(output_path):
+            # Start after the line an interrupted run left unfinished
+            self._output.write("\n")
+        self._rebuild_histories()
+
+    def _rebuild_histories(self):
+        # Resumed sessions continue from the turns they already completed
+        for index in sorted(self.done):
+            result = self.done[index]
+            key = (result["persona"], result["session"])
+            self.histories[key] = append_turn(self.histories.get(key, []), result["message"], result["response"])
+
+    def submit(self, index, record):
+        """Queue a record behind earlier records of its session"""
+        if index in self.done:
+            return
+        key = (record.get("persona"), str(record.get("session", index)))
+        self._slots.acquire()
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.append((index, record))
+                return
+            self._queues[key] = deque([(index, record)])
+        self.executor.submit(self._run_session, key)
+
+    def _run_session(self, key):
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                index, record = queue.popleft()
+            try:
+                if key in self._failed:
+                    with self._lock:
+                        self.stats["skipped"] += 1
+                else:
+                    self._run_record(key, index, record)
+            finally:
+                self._slots.release()
+
+    def _run_record(self, key, index, record):
+        persona_name, session = key
+        result = {"index": index, "id": record.get("id", index), "persona": persona_name, "session": session,
+                  "message": record.get("message", "")}
+        history = self.histories.get(key, [])
+        start = time.perf_counter()
+        try:
+            persona = engine.personas.get(persona_name)
+            if persona is None:
+                raise ValueError(f"Unknown persona {persona_name!r}")
+            # Replays and cache pre-warms queue behind live users
+            turn = engine.respond(persona, result["message"], history, f"batch:{session}",
+                                  memory_store.partition_for_ids(record.get("user")), priority="background")
+            result.update(response=turn.response, used_search=turn.used_search, cached=turn.cached,
+                          input_tokens=turn.input_tokens, output_tokens=turn.output_tokens,
+                          search_tokens_saved=turn.search_tokens_saved)
+            self.histories[key] = append_turn(history, result["message"], turn.response)
+        except Exception as e:
+            print(f"Error in record {index} (session {session}): {e}")
+            result["error"] = str(e)
+            self._failed.add(key)
+        result["latency_ms"] = (time.perf_counter() - start) * 1000
+        result["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._write(result)
+
+    def _write(self, result):
+        with self._lock:
+            self._output.write(json.dumps(result) + "\n")
+            self._output.flush()
+            if "error" in result:
+                self.stats["errors"] += 1
+                return
+            self.stats["ok"] += 1
+            self.stats["cached"] += result["cached"]
+            self.stats["searched"] += result["used_search"]
+            self.stats["input_tokens"] += result["input_tokens"]
+            self.stats["output_tokens"] += result["output_tokens"]
+            self.stats["search_tokens_saved"] += result["search_tokens_saved"]
+            self.latencies.append(result["latency_ms"])
+            finished = self.stats["ok"] + self.stats["errors"]
+        if finished % PROGRESS_EVERY == 0:
+            print(f"{finished} records done")
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self._output.close()
+
+
+def write_parquet(output_path, parquet_path):
+    """Convert the JSONL results (this run and any resumed ones) to Parquet, one row per record"""
+    latest = {}
+    with open(output_path, "r") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                continue
+            # A record that failed and succeeded on a rerun keeps only its latest result
+            latest[result["index"]] = result
+    try:
+        import pandas as pd
+
+        pd.DataFrame([latest[index] for index in sorted(latest)]).to_parquet(parquet_path, index=False)
+        print(f"Parquet results saved to {os.path.abspath(parquet_path)}")
+    except Exception as e:
+        print(f"Error writing Parquet file: {e}")
+
+
+def print_report(runner, elapsed):
+    stats = runner.stats
+    print(f"\nRecords: {stats['ok']} ok, {stats['errors']} failed, {stats['skipped']} skipped after a failure, "
+          f"{stats['resumed']} already done")
+    if elapsed > 0:
+        print(f"Throughput: {stats['ok'] / elapsed:.2f} records/s, "
+              f"{(stats['input_tokens'] + stats['output_tokens']) / elapsed:.0f} tokens/s over {elapsed:.1f}s")
+    if runner.latencies:
+        print(f"Latency: p50 {percentile(runner.latencies, 50):.1f} ms, p95 {percentile(runner.latencies, 95):.1f} ms, "
+              f"p99 {percentile(runner.latencies, 99):.1f} ms")
+    print(f"Answer cache hits: {stats['cached']}, searches: {stats['searched']}, "
+          f"tokens: {stats['input_tokens']} in / {stats['output_tokens']} out, "
+          f"{stats['search_tokens_saved']} search tokens saved by compression")
+
+
+def use_mocks():
+    """Offline run: mock LLM and search instead of Groq and DuckDuckGo"""
+    from mocks import MockLLM, MockSearch
+
+    engine.llm = MockLLM()
+    engine.search_backend = MockSearch()
+    engine.router.log_file = None
+    engine.knowledge_base = None
+    engine.scheduler = None  # The mock LLM has no provider quota to protect
+    engine.conversations.cost_log_file = None
+    engine.conversations.counter.use_tokenizer = False  # Keeps transformers out of the measurement
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a JSONL file of {persona, session, message} records "
+                                                 "through the chat bots")
+    parser.add_argument("input", help="JSONL records; optional fields: id, user")
+    parser.add_argument("--output", help="Results JSONL, appended to and resumed from (default: <input>.results.jsonl)")
+    parser.add_argument("--parquet", help="Also write all results to this Parquet file (needs pandas and pyarrow)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Sessions run concurrently")
+    parser.add_argument("--mock", action="store_true", help="Use the mock LLM and search (no API key or network)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    if args.mock:
+        use_mocks()
+    load_apps(sorted(PERSONA_APPS))
+
+    if engine.scheduler is not None:
+        # Records run as background calls; in this process they only share the token budget with each other
+        engine.scheduler.dedicate("background", args.workers)
+    runner = BatchRunner(output, args.workers, load_done(output))
+    if runner.done:
+        print(f"Resuming: {len(runner.done)} records already in {output}")
+    start = time.perf_counter()
+    try:
+        for index, record in read_records(args.input):
+            runner.submit(index, record)
+    finally:
+        runner.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Results saved to {os.path.abspath(output)}")
+    print_report(runner, elapsed)
+    if args.parquet:
+        write_parquet(output, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import tracing
+
+try:
+    import resource  # Unix only; without it peak RSS is not reported
+except ImportError:
+    resource = None
+from mocks import MockLLM, MockSearch
+from trace_report import percentile
+
+# Configuration
+BOT_MODULES = {"bluey": "bluebot", "goswami": "tvanchorbot"}
+SCENARIOS = ("no_search", "search", "long_history", "large_memory", "repeat_questions")
+BASELINE_FILE = "bench_baseline.json"
+DEFAULT_TURNS = 50
+LONG_HISTORY_TURNS = 200  # user/assistant pairs already in the conversation
+LARGE_MEMORY_COUNT = 10000
+REGRESSION_TOLERANCE = 0.20  # Allowed slowdown relative to the baseline
+# Absolute differences below these are treated as noise even if above the relative tolerance
+NOISE_FLOORS = {"overhead_p95_ms": 1.0, "latency_p95_ms": 5.0, "peak_rss_mb": 5.0}
+
+PLAIN_QUESTIONS = [
+    "What games do you like to play?",
+    "How do I make friends at school?",
+    "What's your favorite animal?",
+    "Can you tell me a story about a dog?",
+]
+SEARCH_QUESTIONS = [
+    "What is the latest news about space?",
+    "What happened in the news today?",
+    "Can you search for facts about Australia?",
+]
+
+
+def make_history(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Question number {i} about something fun and interesting?"})
+        history.append({"role": "assistant", "content": f"Answer number {i}. " + "Wackadoo! " * 20})
+    return history
+
+
+def make_memory_file(path, count):
+    start = datetime(2025, 1, 1)
+    memories = [{"content": f"Memory {i}: we talked about topic {i % 97} and a game called game {i % 13}.",
+                 "timestamp": (start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S")}
+                for i in range(count)]
+    with open(path, "w") as f:
+        json.dump({"memories": memories}, f)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_scenario(bot, scenario, turns, llm_latency, search_latency):
+    """Drive one bot's chat() headlessly through a scenario and return its measurements"""
+    tracing.TRACE_LOG_FILE = None
+    module = importlib.import_module(BOT_MODULES[bot])
+    llm = MockLLM(latency=llm_latency)
+    search = MockSearch(latency=search_latency)
+    module.engine.llm = llm
+    module.engine.search_backend = search
+    module.engine.router.log_file = None
+    module.engine.knowledge_base = None
+    module.engine.scheduler = None  # The mock LLM has no provider quota to protect
+    module.engine.conversations.cost_log_file = None
+    module.engine.conversations.counter.use_tokenizer = False  # Keeps transformers out of the measurement
+    # Repeated searches should cost a search each time, like the first turn of a real chat
+    module.engine.search_cache_ttl = 0
+    # Only the repeat_questions scenario measures the answer cache; the others measure the LLM path
+    module.PERSONA.semantic_cache_enabled = scenario == "repeat_questions"
+
+    workdir = tempfile.mkdtemp(prefix="bench_chat_")
+    module.PERSONA.memory_file = os.path.join(workdir, "memory.json")
+    if scenario == "large_memory":
+        make_memory_file(module.PERSONA.memory_file, LARGE_MEMORY_COUNT)
+    else:
+        make_memory_file(module.PERSONA.memory_file, 5)
+
+    questions = SEARCH_QUESTIONS if scenario == "search" else PLAIN_QUESTIONS
+    history = make_history(LONG_HISTORY_TURNS) if scenario == "long_history" else []
+
+    latencies, overheads = [], []
+    start = time.perf_counter()
+    for i in range(turns):
+        simulated_before = llm.simulated_seconds + search.simulated_seconds
+        turn_start = time.perf_counter()
+        module.chat(questions[i % len(questions)], history)
+        elapsed = time.perf_counter() - turn_start
+        latencies.append(elapsed)
+        # Time spent in our own code, excluding simulated LLM/search latency
+        overheads.append(elapsed - (llm.simulated_seconds + search.simulated_seconds - simulated_before))
+    total = time.perf_counter() - start
+
+    return {
+        "bot": bot,
+        "scenario": scenario,
+        "turns": turns,
+        "throughput_turns_per_sec": turns / total if total > 0 else 0.0,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p95_ms": percentile(latencies, 95) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "overhead_p50_ms": percentile(overheads, 50) * 1000,
+        "overhead_p95_ms": percentile(overheads, 95) * 1000,
+        "llm_calls": llm.calls,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_isolated(bot, scenario, args):
+    """Run a scenario in a fresh interpreter so peak RSS is measured per scenario"""
+    cmd = [sys.executable, __file__, "--worker", bot, scenario, "--turns", str(args.turns),
+           "--llm-latency", str(args.llm_latency), "--search-latency", str(args.search_latency)]
+    output = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return human-readable regressions of results against a saved baseline"""
+    previous = {(r["bot"], r["scenario"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get((result["bot"], result["scenario"]))
+        if old is None:
+            continue
+        name = f"{result['bot']}/{result['scenario']}"
+        for key, floor in NOISE_FLOORS.items():
+            if result[key] is None or old.get(key) is None:
+                continue
+            if result[key] > old[key] * (1 + tolerance) and result[key] - old[key] > floor:
+                regressions.append(f"{name}: {key} {old[key]:.2f} -> {result[key]:.2f}")
+        if result["throughput_turns_per_sec"] < old["throughput_turns_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {old['throughput_turns_per_sec']:.2f} -> "
+                               f"{result['throughput_turns_per_sec']:.2f} turns/sec")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'Bot/scenario':<26}{'turns/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'ovh p95':>9}{'RSS MB':>9}")
+    print("-" * 80)
+    for r in results:
+        rss = f"{r['peak_rss_mb']:>9.1f}" if r["peak_rss_mb"] is not None else f"{'n/a':>9}"
+        print(f"{r['bot'] + '/' + r['scenario']:<26}{r['throughput_turns_per_sec']:>9.1f}"
+              f"{r['latency_p50_ms']:>9.1f}{r['latency_p95_ms']:>9.1f}{r['latency_p99_ms']:>9.1f}"
+              f"{r['overhead_p95_ms']:>9.2f}{rss}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmark for the chat bots using a mock LLM and search")
+    parser.add_argument("--bots", nargs="+", choices=sorted(BOT_MODULES), default=sorted(BOT_MODULES))
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="Chat turns per scenario")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Simulated seconds per LLM call")
+    parser.add_argument("--search-latency", type=float, default=0.5, help="Simulated seconds per search")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help=f"Baseline JSON (default: {BASELINE_FILE})")
+    parser.add_argument("--save-baseline", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="Allowed relative slowdown")
+    parser.add_argument("--worker", nargs=2, metavar=("BOT", "SCENARIO"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_scenario(args.worker[0], args.worker[1], args.turns,
+                                      args.llm_latency, args.search_latency)))
+        sys.exit(0)
+
+    results = [run_isolated(bot, scenario, args) for bot in args.bots for scenario in args.scenarios]
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "results": results}, f, indent=2)
+        print(f"\nBaseline saved to {os.path.abspath(args.baseline)}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, "r") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"- {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline.")
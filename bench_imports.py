@@ -0,0 +1,61 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# Modules that must stay importable without paying for the UI or local-model stacks
+CORE_MODULES = [
+    "bluebot", "tvanchorbot", "gradiochatbot", "newsreaderllm", "nexttokenpredict",
+    "tokenprediction", "tokenizer", "corpus", "tracing", "debuglog", "chat_engine", "persona_server",
+    "api_server", "inference_server", "knowledge_base", "snippet_compressor", "llm_scheduler", "conversation",
+]
+# Imported lazily (inside functions); importing a core module must not pull these in
+HEAVY_MODULES = ["gradio", "fastrtc", "langgraph", "torch", "transformers", "fastapi", "uvicorn", "numpy",
+                 "sentence_transformers"]
+IMPORT_TIME_TARGET_SECONDS = 1.5  # Per module, measured in a fresh interpreter
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def measure_import(module, repeats=3):
+    """Best-of-N import time for a module in fresh interpreters, plus any heavy modules it loaded"""
+    best, heavy = None, []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        best = result["seconds"] if best is None else min(best, result["seconds"])
+        heavy = result["heavy"]
+    return best, heavy
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that core modules import quickly and without heavy dependencies")
+    parser.add_argument("modules", nargs="*", default=CORE_MODULES)
+    parser.add_argument("--target", type=float, default=IMPORT_TIME_TARGET_SECONDS, help="Max seconds per import")
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per module (best time is kept)")
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'Module':<20}{'Import (s)':>12}  Heavy modules loaded")
+    print("-" * 60)
+    for module in args.modules:
+        try:
+            seconds, heavy = measure_import(module, args.repeats)
+        except subprocess.CalledProcessError as e:
+            print(f"{module:<20}{'ERROR':>12}  {e.stderr.strip().splitlines()[-1] if e.stderr else e}")
+            failures += 1
+            continue
+        too_slow = seconds > args.target
+        failures += too_slow or bool(heavy)
+        flag = "  <-- over target" if too_slow else ""
+        print(f"{module:<20}{seconds:>12.3f}  {', '.join(heavy) or '-'}{flag}")
+
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,83 @@
+import argparse
+import time
+
+import tokenprediction
+
+# Configuration
+PROMPTS = [
+    "What games do you like to play?",
+    "Can you tell me about Australia?",
+    "Explain how rain forms.",
+    "Write a short poem about the sea.",
+]
+
+
+def encode_prompts(tokenizer):
+    import torch
+
+    return [torch.tensor([tokenizer.apply_chat_template([{"role": "user", "content": prompt}], tokenize=True,
+                                                        add_generation_prompt=True)])
+            for prompt in PROMPTS]
+
+
+def run(ks, max_new_tokens, temperature, target_name):
+    import torch
+
+    draft, tokenizer = tokenprediction.load_model()
+    target = tokenprediction.load_target_model(target_name)
+    prompts = encode_prompts(tokenizer)
+    eos = tokenizer.eos_token_id
+
+    # Baseline: the target model on its own
+    start = time.perf_counter()
+    baseline = []
+    for ids in prompts:
+        if temperature <= 0:
+            baseline.append(tokenprediction.greedy_generate(target, ids, None, max_new_tokens, eos)[0])
+        else:
+            # Same sampler with k=0 drafts: every token comes from one target pass
+            baseline.append(tokenprediction.speculative_generate(draft, target, ids, max_new_tokens, 0, temperature,
+                                                                 eos, torch.Generator().manual_seed(0))[0])
+    baseline_seconds = time.perf_counter() - start
+    baseline_tokens = sum(len(ids) for ids in baseline)
+
+    print(f"Draft {tokenprediction.model_name} -> target {target_name or tokenprediction.target_model_name}, "
+          f"{len(prompts)} prompts, {max_new_tokens} new tokens, temperature {temperature}")
+    print(f"{'':<14}{'tokens/s':>10}{'accept %':>10}{'tok/pass':>10}{'speedup':>9}")
+    print(f"{'target only':<14}{baseline_tokens / baseline_seconds:>10.1f}{'':>10}{1.0:>10.2f}{1.0:>9.2f}")
+
+    for k in ks:
+        generator = torch.Generator().manual_seed(0)
+        totals = {"proposed": 0, "accepted": 0, "target_calls": 0}
+        outputs = []
+        start = time.perf_counter()
+        for ids in prompts:
+            tokens, stats = tokenprediction.speculative_generate(draft, target, ids, max_new_tokens, k, temperature,
+                                                                 eos, generator)
+            outputs.append(tokens)
+            for key in totals:
+                totals[key] += stats[key]
+        seconds = time.perf_counter() - start
+        tokens = sum(len(ids) for ids in outputs)
+        line = (f"{f'k={k}':<14}{tokens / seconds:>10.1f}{100 * totals['accepted'] / max(1, totals['proposed']):>10.1f}"
+                f"{tokens / max(1, totals['target_calls']):>10.2f}"
+                f"{(tokens / seconds) / (baseline_tokens / baseline_seconds):>9.2f}")
+        if temperature <= 0:
+            # Greedy speculative decoding must reproduce the target's own output
+            line += "" if outputs == baseline else "  (output differs from target!)"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure speculative decoding with the small model as the draft")
+    parser.add_argument("--k", type=int, nargs="+", default=[2, tokenprediction.SPECULATIVE_DRAFT_TOKENS, 6],
+                        help="Draft tokens per target pass")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--temperature", type=float, default=0.0, help="0 for greedy decoding")
+    parser.add_argument("--target", help=f"Target model (default: {tokenprediction.target_model_name})")
+    args = parser.parse_args()
+    run(args.k, args.max_new_tokens, args.temperature, args.target)
+
+
+if __name__ == "__main__":
+    main()
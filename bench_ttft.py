@@ -0,0 +1,78 @@
+import argparse
+import statistics
+
+import prompt_layout
+import tokenprediction
+from trace_report import percentile
+
+# Configuration
+QUESTIONS = [
+    "What games do you like to play?",
+    "Can you tell me about Australia?",
+    "How do I make friends at school?",
+    "What's your favorite animal?",
+    "Tell me about the solar system",
+]
+SYNTHETIC_MEMORY_COUNT = 20  # Memories used when the bot's memory file is empty
+
+
+def build_prompts(bot_module, question):
+    """Render (prefix, full prompt) text for the local model with the bot's persona and memories"""
+    _, tokenizer = tokenprediction.load_model()
+    memory_context = bot_module.get_memory_context()
+    if not memory_context:
+        memory_context = bot_module.MEMORY_CONTEXT_TEMPLATE + "".join(
+            f"Memory {i+1}: We played a game called game {i} and talked about animal number {i}.\n\n"
+            for i in range(SYNTHETIC_MEMORY_COUNT)
+        )
+    persona = getattr(bot_module, "SYSTEM_PROMPT", None) or bot_module.BASE_SYSTEM_PROMPT
+    messages = prompt_layout.build_messages(
+        persona, memory_block=memory_context + bot_module.MEMORY_USAGE_INSTRUCTION, message=question
+    )
+    full = tokenizer.apply_chat_template(prompt_layout.to_chat_dicts(messages), tokenize=False,
+                                         add_generation_prompt=True)
+    prefix = tokenizer.apply_chat_template(prompt_layout.to_chat_dicts(prompt_layout.static_prefix(messages)),
+                                           tokenize=False)
+    if not full.startswith(prefix):
+        raise ValueError("Chat template does not render the system messages as a prefix of the full prompt")
+    return prefix, full
+
+
+def run(bot, rounds, max_new_tokens):
+    bot_module = __import__({"bluey": "bluebot", "goswami": "tvanchorbot"}[bot])
+    cache = tokenprediction.PrefixKVCache()
+    uncached, cached, cold = [], [], None
+    for i in range(rounds):
+        for question in QUESTIONS:
+            prefix, full = build_prompts(bot_module, question)
+            _, ttft_full = tokenprediction.generate_uncached(full, max_new_tokens)
+            _, ttft_cached = cache.generate(prefix, full[len(prefix):], max_new_tokens)
+            uncached.append(ttft_full)
+            if cold is None:
+                # The first cached request still has to prefill the prefix
+                cold = ttft_cached
+            else:
+                cached.append(ttft_cached)
+
+    print(f"Time to first token for {bot} ({len(uncached)} requests, prefix length "
+          f"{len(tokenprediction.load_model()[1].encode(prefix))} tokens)")
+    print(f"{'':<24}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for label, values in (("full prefill", uncached), ("cached prefix", cached)):
+        print(f"{label:<24}{statistics.mean(values) * 1000:>10.1f}{percentile(values, 50) * 1000:>10.1f}"
+              f"{percentile(values, 95) * 1000:>10.1f}")
+    print(f"{'cold prefix (1st call)':<24}{cold * 1000:>10.1f}")
+    print(f"\nSpeedup (p50): {percentile(uncached, 50) / percentile(cached, 50):.2f}x; "
+          f"prefix cache hits {cache.hits}, misses {cache.misses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure time-to-first-token with and without the prefix KV cache")
+    parser.add_argument("--bot", choices=["bluey", "goswami"], default="bluey")
+    parser.add_argument("--rounds", type=int, default=3, help="Times each question is asked")
+    parser.add_argument("--max-new-tokens", type=int, default=1, help="Tokens generated per request")
+    args = parser.parse_args()
+    run(args.bot, args.rounds, args.max_new_tokens)
+
+
+if __name__ == "__main__":
+    main()
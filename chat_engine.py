@@ -0,0 +1,719 @@
+import contextlib
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import conversation
+import debuglog
+import knowledge_base
+import llm_scheduler
+import memory_lifecycle
+import memory_store
+import prompt_layout
+import router
+import semantic_cache
+import snippet_compressor
+import tracing
+from memory_store import DEFAULT_PARTITION
+from summarizer import RollingSummarizer, SUMMARY_CONTEXT_TEMPLATE, append_turn, history_to_text
+
+# Configuration
+DEBUG_MODE = True  # Set to False to disable debug information
+ENGINE_WORKERS = 4  # Shared background pool (running summaries, memory saves) for every persona
+SEARCH_CACHE_TTL_SECONDS = 900  # Identical searches within this window reuse the results; 0 disables
+SEARCH_CACHE_MAX_ENTRIES = 1000
+DEFAULT_SESSION = "default"  # Session used when the caller has no Gradio session
+
+DEFAULT_DEBUG_TEXT = "Debug information will appear here"
+DEFAULT_MEMORY_TEXT = "Memory will be displayed here"
+NO_MEMORIES_TEXT = "No memories stored yet."
+SEARCH_TRIGGER_PHRASE = "I need to search for this information"
+SEARCH_TRIGGER_WINDOW = 200  # Streamed replies are held back this many characters to catch the search trigger phrase
+
+SUMMARIZE_HUMAN_PROMPT_TEMPLATE = "Here's the conversation to summarize:\n\n{}"
+SUMMARIZE_ERROR_TEMPLATE = "Conversation on {} (failed to summarize)"
+
+
+class Persona:
+    """Everything that differs between the bots: prompts, memory file, search style and UI text.
+
+    Leave `memory_file` as None to disable memory and summaries, and
+    `search_context_template` as None to disable web search. With `knowledge_base_enabled`,
+    searches try the local knowledge base first and keep the web results they fetch.
+    """
+
+    def __init__(self, name, system_prompt, title="", description="", memory_file=None,
+                 memory_context_template="", memory_usage_instruction="", memory_display_title="# Stored Memories",
+                 search_context_template=None, search_suffix="", safesearch="moderate", max_search_results=3,
+                 summarize_system_prompt="", semantic_cache_enabled=True, knowledge_base_enabled=True):
+        self.name = name
+        self.system_prompt = system_prompt
+        self.title = title
+        self.description = description
+        self.memory_file = memory_file
+        self.memory_context_template = memory_context_template
+        self.memory_usage_instruction = memory_usage_instruction
+        self.memory_display_title = memory_display_title
+        self.search_context_template = search_context_template
+        self.search_suffix = search_suffix
+        self.safesearch = safesearch
+        self.max_search_results = max_search_results
+        self.summarize_system_prompt = summarize_system_prompt
+        self.semantic_cache_enabled = semantic_cache_enabled
+        self.knowledge_base_enabled = knowledge_base_enabled
+
+
+class TurnResult:
+    """Outcome of one chat turn"""
+
+    def __init__(self, response, used_search=False, cached=False, input_tokens=0, output_tokens=0, tier="large"):
+        self.response = response
+        self.used_search = used_search
+        self.cached = cached
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.tier = tier  # Model tier that answered: "fast" or "large"
+        self.route = None  # Router decision, when the turn was routed
+        self.search_tokens_saved = 0  # Search context tokens removed by snippet compression
+
+
+def ddg_search(query, max_results=3, safesearch="moderate"):
+    """Search DuckDuckGo and return the text of each result"""
+    from duckduckgo_search import DDGS
+    from duckduckgo_search.exceptions import RatelimitException
+
+    try:
+        results = list(DDGS().text(query, max_results=max_results, safesearch=safesearch))
+        if not results:
+            return ["No search results found."]
+        # Prefer the body, then the snippet, then the title
+        return [r.get("body") or r.get("snippet") or r.get("title", "No content available") for r in results]
+    except RatelimitException:
+        return ["[Search error: Rate limit exceeded. Please try again later.]"]
+    except Exception as e:
+        return [f"[Search error: {str(e)}]"]
+
+
+def format_messages(messages, label="Messages"):
+    """Format messages for display"""
+    output = [f"**{label}**\n"]
+    for i, msg in enumerate(messages):
+        msg_type = type(msg).__name__
+        content = msg.content[:100] + "..." if len(msg.content) > 100 else msg.content
+        output.append(f"{i}. [{msg_type}]: {content}")
+    return "\n".join(output)
+
+
+def format_search_results(search_results):
+    """Format search results for the debug display"""
+    if not search_results or (len(search_results) == 1 and search_results[0].startswith("[")):
+        # Error occurred
+        return f"**Search Results**\n{search_results[0] if search_results else 'No results returned'}"
+    # Format successful results
+    results_formatted = []
+    for i, result in enumerate(search_results):
+        results_formatted.append(f"**Source {i+1}:**\n```\n{result}\n```")
+    return f"**Search Results** (Found {len(search_results)} results)\n\n" + "\n\n".join(results_formatted)
+
+
+def session_id_for(request):
+    """Use the Gradio session as the conversation id, so each browser tab gets its own summary"""
+    return getattr(request, "session_hash", None) or DEFAULT_SESSION
+
+
+class ChatEngine:
+    """Runs chat turns for any number of personas on shared resources: one LLM client,
+    one search cache, one answer cache, one memory backend and one worker pool."""
+
+    def __init__(self, llm=None, search_backend=ddg_search, model_name=None, workers=ENGINE_WORKERS):
+        self._llm = llm
+        self.model_name = model_name
+        self._fast_llm = None
+        self.fast_model_name = None
+        # Sends easy turns to the fast model; set to None to always use the large one
+        self.router = router.QueryRouter()
+        self.search_backend = search_backend
+        self.search_cache_ttl = SEARCH_CACHE_TTL_SECONDS
+        # Local documents searched before the web; set to None to always go to the web
+        self.knowledge_base = knowledge_base.KnowledgeBase()
+        # Fetches more web results and keeps only their relevant sentences; None sends results as fetched
+        self.snippet_compressor = snippet_compressor.SnippetCompressor()
+        # Admission control shared with every other LLM caller in the process; None calls the LLM directly
+        self.scheduler = llm_scheduler.scheduler
+        # Per-session token counts and cost; None disables the accounting
+        self.conversations = conversation.ConversationStore()
+        self.personas = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chat-engine")
+        self.answer_cache = semantic_cache.SemanticCache()
+        self.prefix_tracker = prompt_layout.PrefixTracker()
+        self._summarizers = {}
+        self._search_cache = {}
+        self._search_lock = threading.Lock()
+
+    @property
+    def llm(self):
+        # The Groq client is created on first use and shared by every persona
+        if self._llm is None:
+            from langchain_groq import ChatGroq
+            from config import GROQ_API_KEY, GROQ_MODEL_NAME
+
+            self.model_name = self.model_name or GROQ_MODEL_NAME
+            self._llm = ChatGroq(model_name=self.model_name, api_key=GROQ_API_KEY)
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+        # A replacement LLM (e.g. a mock) also serves the fast tier unless one is set explicitly
+        self._fast_llm = self._fast_llm or llm
+
+    @property
+    def fast_llm(self):
+        """Smaller, faster model for easy turns; None when GROQ_FAST_MODEL_NAME is not configured"""
+        if self._fast_llm is None:
+            import config
+
+            self.fast_model_name = self.fast_model_name or getattr(config, "GROQ_FAST_MODEL_NAME", None)
+            if self.fast_model_name:
+                from langchain_groq import ChatGroq
+
+                self._fast_llm = ChatGroq(model_name=self.fast_model_name, api_key=config.GROQ_API_KEY)
+        return self._fast_llm
+
+    @fast_llm.setter
+    def fast_llm(self, llm):
+        self._fast_llm = llm
+
+    def _tier(self, tier):
+        """(LLM, model name) serving a tier"""
+        if tier == "fast":
+            return self.fast_llm, self.fast_model_name or self.model_name
+        return self.llm, self.model_name
+
+    def route(self, persona, message, history, result):
+        """Choose the model tier for a turn and note the decision on the result"""
+        if self.router is None or self.fast_llm is None:
+            return
+        result.route = self.router.route(persona.name, message, history)
+        result.tier = result.route["tier"]
+
+    def add_persona(self, persona):
+        """Register a persona so servers can host it; returns the persona"""
+        self.personas[persona.name] = persona
+        self._summarizers[persona.name] = RollingSummarizer(
+            lambda prompt: self.invoke_llm(prompt, "background"), persona.summarize_system_prompt,
+            name=persona.name, model=self.model_name, executor=self.executor,
+        )
+        return persona
+
+    def summarizer(self, persona):
+        return self._summarizers[persona.name]
+
+    # --- LLM calls ---
+
+    def llm_slot(self, priority, messages):
+        """Scheduler slot for one LLM call of the given priority class (interactive, voice or background)"""
+        if self.scheduler is None:
+            return contextlib.nullcontext(llm_scheduler.Ticket(priority, 0))
+        tokens = llm_scheduler.messages_tokens(messages) + llm_scheduler.EXPECTED_OUTPUT_TOKENS
+        return self.scheduler.slot(priority, tokens)
+
+    def invoke_llm(self, messages, priority="interactive", llm=None):
+        """Call the LLM (the large model unless given) once the scheduler admits the call"""
+        llm = llm or self.llm
+        with self.llm_slot(priority, messages) as ticket:
+            response = llm.invoke(messages)
+            ticket.record(response)
+        return response
+
+    # --- Search ---
+
+    def search(self, persona, query, max_results=None):
+        """Web search in the persona's style, reusing recent identical searches"""
+        full_query = query + persona.search_suffix
+        max_results = max_results or persona.max_search_results
+        key = (full_query, max_results, persona.safesearch)
+        now = time.time()
+        with self._search_lock:
+            cached = self._search_cache.get(key)
+            if cached is not None and cached[0] > now:
+                tracing.record_cache("search", True)
+                return cached[1]
+        tracing.record_cache("search", False)
+        results = self.search_backend(full_query, max_results, persona.safesearch)
+        failed = len(results) == 1 and results[0].startswith("[")
+        if self.search_cache_ttl > 0 and not failed:
+            with self._search_lock:
+                self._search_cache[key] = (now + self.search_cache_ttl, results)
+                if len(self._search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+                    self._search_cache.pop(next(iter(self._search_cache)))
+        return results
+
+    def fetch_count(self, persona):
+        """Web results fetched per search: more when they will be compressed"""
+        if self.snippet_compressor is None:
+            return persona.max_search_results
+        return max(persona.max_search_results, self.snippet_compressor.fetch_results)
+
+    def lookup(self, persona, query):
+        """Sources for a search as (results, provider): the knowledge base when it is confident, else the web"""
+        kb = self.knowledge_base if persona.knowledge_base_enabled else None
+        if kb is not None:
+            with tracing.span("knowledge_base"):
+                local = kb.retrieve(query, persona.name)
+            if local:
+                return local, "Knowledge Base"
+        with tracing.span("search"):
+            results = self.search(persona, query, self.fetch_count(persona))
+        if kb is not None:
+            self.executor.submit(self._keep_web_results, kb, persona, query, results)
+        return results, "DuckDuckGo"
+
+    def _keep_web_results(self, kb, persona, query, results):
+        # Written back per persona so the next similar question is answered locally
+        try:
+            if kb.add_web_results(query, results, persona.name):
+                kb.save()
+        except Exception as e:
+            print(f"Error saving web results to the knowledge base: {e}")
+
+    # --- Memory ---
+
+    def memory_path(self, persona, partition=DEFAULT_PARTITION):
+        """Memory file for one user partition; the default partition is the persona's memory file itself"""
+        return memory_store.partition_path(persona.memory_file, partition)
+
+    def load_memory(self, persona, partition=DEFAULT_PARTITION):
+        """Load memory from file"""
+        return memory_store.load(self.memory_path(persona, partition))
+
+    def save_memory(self, persona, memory_data, partition=DEFAULT_PARTITION):
+        """Save memory to file"""
+        memory_store.save(self.memory_path(persona, partition), memory_data)
+
+    def add_to_memory(self, persona, summary, partition=DEFAULT_PARTITION):
+        """Add a new memory while deduplicating similar content"""
+        if not summary or not persona.memory_file:
+            return
+
+        path = self.memory_path(persona, partition)
+        with memory_lifecycle.file_lock(path):
+            memory_data = memory_lifecycle.apply_pending_access(path, self.load_memory(persona, partition))
+
+            # Exact repeats make a memory more important; near-duplicates are merged by the policy
+            existing_memory = memory_store.content_index(path).get(summary.lower())
+            if existing_memory is not None:
+                existing_memory["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                existing_memory["importance"] += memory_lifecycle.DEFAULT_IMPORTANCE
+                self.save_memory(persona, memory_data, partition)
+                return
+
+            # Add new memory, merging or evicting low-value ones if this goes over capacity
+            memory_data["memories"].append(memory_lifecycle.new_memory(summary))
+            if len(memory_data["memories"]) > memory_lifecycle.MEMORY_CAPACITY:
+                memory_lifecycle.apply_policy(memory_data)
+
+            self.save_memory(persona, memory_data, partition)
+
+    def get_memory_context(self, persona, partition=DEFAULT_PARTITION):
+        """Get memory context formatted for the LLM"""
+        if not persona.memory_file:
+            return ""
+        path = self.memory_path(persona, partition)
+        # The loaded dict is shared and changed in place by add_to_memory and the policy
+        with memory_lifecycle.file_lock(path):
+            memories = self.load_memory(persona, partition)["memories"]
+            if not memories:
+                return ""
+
+            # Format memories into a context string
+            memory_context = persona.memory_context_template
+            for i, memory in enumerate(memories):
+                # No timestamps or counters here: the block must stay byte-identical between saves
+                memory_context += f"Memory {i+1}: {memory['content']}\n\n"
+
+            # Count the use; written with the next save rather than on every turn
+            memory_lifecycle.note_access(path, memories)
+        return memory_context
+
+    def display_memory(self, persona, partition=DEFAULT_PARTITION):
+        """Display memory in a formatted way"""
+        if not persona.memory_file:
+            return NO_MEMORIES_TEXT
+        with memory_lifecycle.file_lock(self.memory_path(persona, partition)):
+            memories = self.load_memory(persona, partition)["memories"]
+            if not memories:
+                return NO_MEMORIES_TEXT
+
+            memory_text = f"{persona.memory_display_title}\n\n"
+            for i, memory in enumerate(memories):
+                memory_text += f"### Memory {i+1}\n"
+                memory_text += f"*Saved on: {memory['timestamp']} · used {memory.get('access_count', 0)} times*\n\n"
+                memory_text += f"{memory['content']}\n\n"
+                memory_text += "---\n\n"
+
+        return memory_text
+
+    def summarize_conversation(self, persona, history):
+        """Summarize the conversation history using the LLM"""
+        if not history:
+            return None
+
+        summarize_prompt = [
+            SystemMessage(content=persona.summarize_system_prompt),
+            HumanMessage(content=SUMMARIZE_HUMAN_PROMPT_TEMPLATE.format(history_to_text(history))),
+        ]
+
+        try:
+            with tracing.trace("summarize", bot=persona.name):
+                with tracing.span("summarize"):
+                    summary_response = self.invoke_llm(summarize_prompt, "background")
+                tracing.record_llm_call("summarize", summary_response, self.model_name)
+            return summary_response.content
+        except Exception as e:
+            print(f"Error summarizing conversation: {e}")
+            # Return a basic timestamp-based summary as fallback
+            return SUMMARIZE_ERROR_TEMPLATE.format(datetime.now().strftime("%Y-%m-%d %H:%M"))
+
+    def clear_and_save_memory(self, persona, history, session_id=DEFAULT_SESSION, partition=DEFAULT_PARTITION):
+        """Clear chat history and save memory"""
+        if self.conversations is not None:
+            self.conversations.close(persona.name, session_id)
+        if history and persona.memory_file:
+            # Finish the running summary in the background so the button returns at once;
+            # the new memory shows up on the next refresh
+            self.summarizer(persona).finalize(
+                session_id, history, lambda summary: self.add_to_memory(persona, summary, partition),
+                fallback_summary=SUMMARIZE_ERROR_TEMPLATE.format(datetime.now().strftime("%Y-%m-%d %H:%M")),
+            )
+
+        # Display updated memory
+        return [], DEFAULT_DEBUG_TEXT, self.display_memory(persona, partition)
+
+    def initialize_memory_file(self, persona):
+        """Initialize memory file if it doesn't exist"""
+        if not persona.memory_file:
+            return
+        if not os.path.exists(persona.memory_file):
+            self.save_memory(persona, {"memories": []})
+            print(f"Created new memory file at {os.path.abspath(persona.memory_file)}")
+        else:
+            print(f"Using existing memory file at {os.path.abspath(persona.memory_file)}")
+
+    def start_background(self, persona):
+        """Create the memory file and start its background memory policy"""
+        if persona.memory_file:
+            self.initialize_memory_file(persona)
+            memory_lifecycle.start_background_policy(persona.memory_file)
+
+    # --- Chat ---
+
+    def chat(self, persona, message, history, debug_output=None, debug_sink=None, session_id=DEFAULT_SESSION,
+             partition=DEFAULT_PARTITION):
+        """Answer one message; returns (response, debug markdown) when debug output is requested.
+
+        Debug text is only built when a sink is attached: `debug_sink` (e.g. a streaming
+        MarkdownSink), a sink created here for `debug_output`, or a process-wide file sink.
+        """
+        sinks = []
+        if DEBUG_MODE and (debug_output is not None or debug_sink is not None):
+            debug_sink = debug_sink or debuglog.MarkdownSink()
+            sinks.append(debug_sink)
+        result = self.respond(persona, message, history, session_id, partition, debuglog.DebugLog(sinks))
+
+        if DEBUG_MODE and debug_output is not None:
+            return result.response, debug_sink.render()
+        return result.response
+
+    def stream_debug(self, persona, history, session_id=DEFAULT_SESSION, partition=DEFAULT_PARTITION):
+        """Answer the last message of a Gradio messages history, yielding (history, debug markdown)
+        as debug events arrive; the turn runs in a worker thread so the debug tab updates live."""
+        user_message = history[-1]["content"]
+        sink = debuglog.MarkdownSink()
+        result = {}
+
+        def run_turn():
+            try:
+                result["response"] = self.chat(persona, user_message, history[:-1], debug_sink=sink,
+                                               session_id=session_id, partition=partition)
+            except Exception as e:
+                result["error"] = e
+            finally:
+                sink.close()
+
+        threading.Thread(target=run_turn, daemon=True).start()
+        for debug_text in sink.stream():
+            yield history, debug_text
+        if "error" in result:
+            raise result["error"]
+        history.append({"role": "assistant", "content": result["response"]})
+        yield history, sink.render()
+
+    def respond(self, persona, message, history, session_id=DEFAULT_SESSION, partition=DEFAULT_PARTITION,
+                debug=None, priority="interactive"):
+        """Run one turn and return a TurnResult with the response, search/cache flags and token usage.
+
+        Pass session_id=None for a one-off turn that keeps no running summary, and
+        priority="background" for bulk work that must not compete with live users.
+        """
+        debug = debug or debuglog.DebugLog()
+        start = time.perf_counter()
+        with tracing.trace("chat", bot=persona.name):
+            result = self._turn(persona, message, history, debug, session_id, partition, priority)
+        if result.route is not None:
+            self.router.log(persona.name, message, result.route, result, time.perf_counter() - start)
+        self._account(persona, message, history, session_id, result, debug)
+
+        # Let the running summary catch up in the background
+        if persona.memory_file and session_id is not None:
+            self.summarizer(persona).observe(session_id, append_turn(history, message, result.response))
+        return result
+
+    def _account(self, persona, message, history, session_id, result, debug):
+        """Add the turn to its session's token counts and cost, and show the totals in the debug tab"""
+        if self.conversations is None or session_id is None:
+            return
+        session = self.conversations.get(persona.name, session_id)
+        # Only messages the session has not seen yet are counted
+        session.sync(history)
+        model = (self.fast_model_name or self.model_name) if result.tier == "fast" else self.model_name
+        session.record_turn(message, result, model)
+        debug.event("token_accounting", conversation.format_totals, session)
+
+    def _cache_namespace(self, persona, memory_context):
+        """Answer cache namespace: the persona's, or one per distinct memory block when memories
+        were injected (they can change the answer), so users without memories share answers"""
+        if not memory_context:
+            return persona.name
+        return persona.name, hashlib.sha1(memory_context.encode("utf-8")).hexdigest()
+
+    def _turn(self, persona, message, history, debug, session_id, partition, priority="interactive"):
+        # Questions that don't depend on the conversation can be answered from the cache
+        cacheable = persona.semantic_cache_enabled and semantic_cache.is_cacheable(message, history)
+        memory_context = None
+        if cacheable:
+            memory_context = self._memory_context(persona, partition, debug)
+            namespace = self._cache_namespace(persona, memory_context)
+            with tracing.span("semantic_cache"):
+                cached_response = self.answer_cache.lookup(namespace, message)
+            if cached_response is not None:
+                debug.event("cached_response", lambda: f"**Cached Response**\n{cached_response}")
+                return TurnResult(cached_response, cached=True)
+
+        result = self._answer(persona, message, history, debug, session_id, partition, memory_context, priority)
+        if cacheable:
+            ttl = semantic_cache.SEARCH_ANSWER_TTL_SECONDS if result.used_search else None
+            self.answer_cache.store(namespace, message, result.response, ttl)
+        return result
+
+    def _invoke(self, stage, messages, result, priority="interactive"):
+        llm, model_name = self._tier(result.tier)
+        with self.llm_slot(priority, messages) as ticket, tracing.span(stage):
+            response = llm.invoke(messages)
+            ticket.record(response)
+        tracing.record_llm_call(stage, response, model_name)
+        usage = getattr(response, "usage_metadata", None) or {}
+        result.input_tokens += usage.get("input_tokens", 0)
+        result.output_tokens += usage.get("output_tokens", 0)
+        return response.content
+
+    def _memory_context(self, persona, partition, debug):
+        with tracing.span("memory_load"):
+            memory_context = self.get_memory_context(persona, partition)
+        if memory_context:
+            debug.event("memory_context", lambda: f"**Memory Context**\n{memory_context}")
+        return memory_context
+
+    def _prepare(self, persona, message, history, debug, session_id, partition, memory_context=None):
+        """Build the prompt for a turn: persona, memories, running summary, recent turns, message"""
+        if memory_context is None:
+            memory_context = self._memory_context(persona, partition, debug)
+
+        with tracing.span("prompt_assembly"):
+            # The running summary stands in for older turns it already covers; a session_id
+            # of None means a stateless caller that sends its own history and has no summary
+            summary = None
+            if session_id is not None:
+                summary, history = self.summarizer(persona).compact_history(session_id, history)
+            if summary:
+                debug.event("running_summary", lambda: f"**Running Summary**\n{summary}")
+
+            # Stable-to-volatile layout: persona, memories, summary, turns, new message
+            messages = prompt_layout.build_messages(
+                persona.system_prompt,
+                memory_block=f"{memory_context}{persona.memory_usage_instruction}" if memory_context else "",
+                summary_block=SUMMARY_CONTEXT_TEMPLATE.format(summary) if summary else "",
+                history=history,
+                message=message,
+            )
+            self.prefix_tracker.observe((persona.name, session_id), messages)
+
+        debug.event("initial_messages", format_messages, messages, "Initial Messages")
+        return messages
+
+    def _search_messages(self, persona, message, messages, debug, result):
+        """Look the message up (knowledge base, then web) and return the prompt extended with the results"""
+        # Perform search
+        search_results, provider = self.lookup(persona, message)
+        debug.event("search", lambda: f"**Performing Search**\n- Query: \"{message}\"\n"
+                                      f"- Max Results: {self.fetch_count(persona)}\n- Search Provider: {provider}")
+
+        # Keep only the sentences that help answer the question
+        if self.snippet_compressor is not None:
+            with tracing.span("compress_search"):
+                search_results, stats = self.snippet_compressor.compress(message, search_results)
+            snippet_compressor.record_savings(stats, persona.name)
+            result.search_tokens_saved = stats["saved_tokens"]
+            debug.event("search_compression", snippet_compressor.format_stats, stats)
+        debug.event("search_results", format_search_results, search_results)
+
+        # Create search context for the model
+        search_context = "\n\n".join([f"Source {i+1}: {r}" for i, r in enumerate(search_results)])
+
+        # Create new message list with search results
+        search_messages = messages.copy()
+        search_messages.append(AIMessage(content=SEARCH_TRIGGER_PHRASE))
+        search_messages.append(SystemMessage(content=persona.search_context_template.format(message, search_context)))
+        debug.event("search_messages", format_messages, search_messages, "Messages With Search Results")
+        return search_messages
+
+    def _answer(self, persona, message, history, debug, session_id, partition, memory_context=None,
+                priority="interactive"):
+        result = TurnResult("")
+        messages = self._prepare(persona, message, history, debug, session_id, partition, memory_context)
+        self.route(persona, message, history, result)
+        if result.route is not None:
+            debug.event("route", lambda: f"**Route**\n{result.tier} model (score {result.route['score']:.2f})")
+
+        # First, try to answer without search
+        initial_response = self._invoke("llm_initial", messages, result, priority)
+        debug.event("initial_response", lambda: f"**Initial Response**\n{initial_response}")
+
+        # If no search needed, return the initial response
+        if persona.search_context_template is None or SEARCH_TRIGGER_PHRASE not in initial_response:
+            result.response = initial_response
+            return result
+
+        search_messages = self._search_messages(persona, message, messages, debug, result)
+
+        # Get final response with search results
+        final_response = self._invoke("llm_search", search_messages, result, priority)
+        debug.event("final_response", lambda: f"**Final Response**\n{final_response}")
+        result.response, result.used_search = final_response, True
+        return result
+
+    # --- Streaming ---
+
+    def stream(self, persona, message, history, session_id=DEFAULT_SESSION, partition=DEFAULT_PARTITION,
+               result=None, debug=None, priority="interactive"):
+        """Run one turn, yielding the response text as the LLM produces it.
+
+        `result` (a TurnResult) is filled in once the generator is exhausted. Consume the
+        whole generator on one thread: traces are kept per thread.
+        """
+        debug = debug or debuglog.DebugLog()
+        result = result if result is not None else TurnResult("")
+        start = time.perf_counter()
+        first = True
+        with tracing.trace("chat", bot=persona.name):
+            for piece in self._stream_turn(persona, message, history, debug, session_id, partition, result,
+                                           priority):
+                if first:
+                    tracing.observe("time_to_first_token_seconds", time.perf_counter() - start, bot=persona.name)
+                    first = False
+                yield piece
+        if result.route is not None:
+            self.router.log(persona.name, message, result.route, result, time.perf_counter() - start)
+        self._account(persona, message, history, session_id, result, debug)
+
+        if persona.memory_file and session_id is not None:
+            self.summarizer(persona).observe(session_id, append_turn(history, message, result.response))
+
+    def _stream_turn(self, persona, message, history, debug, session_id, partition, result, priority="interactive"):
+        cacheable = persona.semantic_cache_enabled and semantic_cache.is_cacheable(message, history)
+        memory_context = None
+        if cacheable:
+            memory_context = self._memory_context(persona, partition, debug)
+            namespace = self._cache_namespace(persona, memory_context)
+            with tracing.span("semantic_cache"):
+                cached_response = self.answer_cache.lookup(namespace, message)
+            if cached_response is not None:
+                debug.event("cached_response", lambda: f"**Cached Response**\n{cached_response}")
+                result.response, result.cached = cached_response, True
+                yield cached_response
+                return
+
+        yield from self._stream_answer(persona, message, history, debug, session_id, partition, result,
+                                       memory_context, priority)
+        if cacheable:
+            ttl = semantic_cache.SEARCH_ANSWER_TTL_SECONDS if result.used_search else None
+            self.answer_cache.store(namespace, message, result.response, ttl)
+
+    def _stream_llm(self, stage, messages, result, priority="interactive"):
+        """Yield text chunks from the LLM, recording token usage even if the caller stops early"""
+        usage = {"input_tokens": 0, "output_tokens": 0}
+        llm, model_name = self._tier(result.tier)
+        try:
+            with self.llm_slot(priority, messages) as ticket, tracing.span(stage):
+                for chunk in llm.stream(messages):
+                    # Groq reports usage on the final chunk only
+                    chunk_usage = getattr(chunk, "usage_metadata", None) or {}
+                    usage["input_tokens"] += chunk_usage.get("input_tokens", 0)
+                    usage["output_tokens"] += chunk_usage.get("output_tokens", 0)
+                    if chunk.content:
+                        yield chunk.content
+                ticket.record(SimpleNamespace(usage_metadata=usage))
+        finally:
+            tracing.record_llm_call(stage, SimpleNamespace(usage_metadata=usage), model_name)
+            result.input_tokens += usage["input_tokens"]
+            result.output_tokens += usage["output_tokens"]
+
+    def _stream_answer(self, persona, message, history, debug, session_id, partition, result, memory_context=None,
+                       priority="interactive"):
+        messages = self._prepare(persona, message, history, debug, session_id, partition, memory_context)
+        self.route(persona, message, history, result)
+
+        # The start of the reply is held back until it is clearly not a request to search;
+        # a trigger phrase that only appears after that is streamed like any other text
+        holding = persona.search_context_template is not None
+        pieces = []
+        stream = self._stream_llm("llm_initial", messages, result, priority)
+        for piece in stream:
+            pieces.append(piece)
+            if not holding:
+                yield piece
+                continue
+            text = "".join(pieces)
+            if SEARCH_TRIGGER_PHRASE in text:
+                stream.close()
+                break
+            if len(text) >= SEARCH_TRIGGER_WINDOW:
+                holding = False
+                yield text
+        initial_response = "".join(pieces)
+        debug.event("initial_response", lambda: f"**Initial Response**\n{initial_response}")
+
+        if not holding or SEARCH_TRIGGER_PHRASE not in initial_response:
+            if holding and initial_response:
+                yield initial_response
+            result.response = initial_response
+            return
+
+        search_messages = self._search_messages(persona, message, messages, debug, result)
+        pieces = []
+        for piece in self._stream_llm("llm_search", search_messages, result, priority):
+            pieces.append(piece)
+            yield piece
+        final_response = "".join(pieces)
+        debug.event("final_response", lambda: f"**Final Response**\n{final_response}")
+        result.response, result.used_search = final_response, True
+
+
+# The engine shared by every persona in this process
+engine = ChatEngine()
@@ -0,0 +1,157 @@
+import argparse
+import os
+import sqlite3
+import time
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# Configuration
+CHECKPOINT_DB_FILE = os.environ.get("CHECKPOINT_DB_FILE", "agent_checkpoints.sqlite")
+MAX_CHECKPOINTS_PER_THREAD = 10  # Older checkpoints of a thread are dropped; the newest holds the full state
+MAX_THREAD_BYTES = 2 * 1024 * 1024  # A thread whose newest checkpoint alone is bigger than this is reset
+MAX_THREADS = 1000  # Least recently used threads beyond this are evicted
+MAX_IDLE_DAYS = 30  # Threads not used for this long are evicted
+COMPACT_EVERY_PUTS = 200  # Run thread eviction and VACUUM after this many checkpoint writes
+
+
+class BoundedSqliteSaver(SqliteSaver):
+    """SQLite checkpointer that keeps agent state on disk and bounded in size.
+
+    Each put trims its own thread to the newest `max_checkpoints` checkpoints (and
+    `max_thread_bytes`); every `compact_every` puts, idle and least recently used
+    threads are evicted and the file is vacuumed. Several worker processes can share
+    one database file, so every worker sees the same sessions and they survive restarts.
+    """
+
+    def __init__(self, path=CHECKPOINT_DB_FILE, max_checkpoints=MAX_CHECKPOINTS_PER_THREAD,
+                 max_thread_bytes=MAX_THREAD_BYTES, max_threads=MAX_THREADS, max_idle_days=MAX_IDLE_DAYS,
+                 compact_every=COMPACT_EVERY_PUTS):
+        super().__init__(sqlite3.connect(path, check_same_thread=False, timeout=30))
+        self.path = path
+        self.max_checkpoints = max_checkpoints
+        self.max_thread_bytes = max_thread_bytes
+        self.max_threads = max_threads
+        self.max_idle_days = max_idle_days
+        self.compact_every = compact_every
+        self._puts = 0
+
+    def setup(self):
+        if self.is_setup:
+            return
+        super().setup()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thread_access (thread_id TEXT PRIMARY KEY, last_access REAL NOT NULL)"
+        )
+        self.conn.commit()
+
+    def _touch(self, cur, thread_id):
+        cur.execute(
+            "INSERT INTO thread_access (thread_id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(thread_id) DO UPDATE SET last_access = excluded.last_access",
+            (str(thread_id), time.time()),
+        )
+
+    def get_tuple(self, config):
+        result = super().get_tuple(config)
+        if result is not None:
+            with self.cursor() as cur:
+                self._touch(cur, config["configurable"]["thread_id"])
+        return result
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(saved_config["configurable"]["thread_id"])
+        with self.cursor() as cur:
+            self._touch(cur, thread_id)
+            self._trim_thread(cur, thread_id, saved_config["configurable"]["checkpoint_ns"])
+        self._puts += 1
+        if self._puts % self.compact_every == 0:
+            self.compact()
+        return saved_config
+
+    def _trim_thread(self, cur, thread_id, checkpoint_ns):
+        # Checkpoint ids are time-ordered, so the newest ones sort last
+        cur.execute(
+            "SELECT checkpoint_id, length(checkpoint) FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC",
+            (thread_id, checkpoint_ns),
+        )
+        rows = cur.fetchall()
+        keep, total = 0, 0
+        for _, size in rows[:self.max_checkpoints]:
+            if keep and total + (size or 0) > self.max_thread_bytes:
+                break
+            total += size or 0
+            keep += 1
+        if rows and (rows[0][1] or 0) > self.max_thread_bytes:
+            print(f"Checkpoint thread {thread_id} exceeds {self.max_thread_bytes} bytes; resetting it")
+            keep = 0
+        if keep == len(rows):
+            return
+        oldest_kept = rows[keep - 1][0] if keep else None
+        for table in ("checkpoints", "writes"):
+            if oldest_kept is None:
+                cur.execute(f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ?", (thread_id, checkpoint_ns))
+            else:
+                cur.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                    (thread_id, checkpoint_ns, oldest_kept),
+                )
+
+    def delete_thread(self, thread_id):
+        super().delete_thread(thread_id)
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM thread_access WHERE thread_id = ?", (str(thread_id),))
+
+    def evict_threads(self):
+        """Delete threads idle for longer than max_idle_days, then the least recently used beyond max_threads"""
+        cutoff = time.time() - self.max_idle_days * 86400
+        with self.cursor() as cur:
+            cur.execute("SELECT thread_id FROM thread_access WHERE last_access < ?", (cutoff,))
+            stale = [row[0] for row in cur.fetchall()]
+            cur.execute(
+                "SELECT thread_id FROM thread_access WHERE last_access >= ? ORDER BY last_access DESC LIMIT -1 OFFSET ?",
+                (cutoff, self.max_threads),
+            )
+            stale += [row[0] for row in cur.fetchall()]
+        for thread_id in stale:
+            self.delete_thread(thread_id)
+        return len(stale)
+
+    def compact(self):
+        """Evict old threads and give the freed pages back to the file system"""
+        evicted = self.evict_threads()
+        with self.lock:
+            self.conn.execute("VACUUM")
+        return evicted
+
+    def stats(self):
+        """Return thread/checkpoint counts and the database size in bytes"""
+        with self.cursor(transaction=False) as cur:
+            cur.execute("SELECT COUNT(*) FROM thread_access")
+            threads = cur.fetchone()[0]
+            cur.execute("SELECT COUNT(*), COALESCE(SUM(length(checkpoint)), 0) FROM checkpoints")
+            checkpoints, checkpoint_bytes = cur.fetchone()
+        return {
+            "threads": threads,
+            "checkpoints": checkpoints,
+            "checkpoint_bytes": checkpoint_bytes,
+            "file_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or compact the agent checkpoint database")
+    parser.add_argument("--db", default=CHECKPOINT_DB_FILE, help=f"SQLite file (default: {CHECKPOINT_DB_FILE})")
+    parser.add_argument("--compact", action="store_true", help="Evict idle threads and vacuum the file")
+    args = parser.parse_args()
+
+    saver = BoundedSqliteSaver(args.db)
+    if args.compact:
+        print(f"Evicted {saver.compact()} threads")
+    for key, value in saver.stats().items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import argparse
+import hashlib
+import json
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+
+from token_utils import estimate_tokens
+
+# Configuration
+TOKEN_COUNT_MODEL = None  # Tokenizer from tokenizer.py used for counts; None uses its default (Phi-4)
+USE_TOKENIZER = True  # False counts with the 4-characters-per-token estimate only
+MAX_CACHED_COUNTS = 50000  # Memoized message counts kept (least recently used dropped)
+MAX_CONVERSATIONS = 10000  # Sessions tracked at once (least recently used dropped)
+COST_LOG_FILE = "session_costs.jsonl"  # One JSON line per finished session; set to None to disable
+# USD per million (input, output) tokens by model; other models use DEFAULT_PRICE
+PRICES = {
+    "llama3-70b-8192": (0.59, 0.79),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama3-8b-8192": (0.05, 0.08),
+    "llama-3.1-8b-instant": (0.05, 0.08),
+}
+DEFAULT_PRICE = (0.59, 0.79)
+
+
+class TokenCounter:
+    """Counts tokens with a local tokenizer, once per distinct text (memoized by content hash).
+
+    The tokenizer loads in a background thread on first use, so a chat turn never waits
+    for a download; until it is ready, or when transformers or the tokenizer files are not
+    available, counts fall back to token_utils.estimate_tokens (these are not memoized).
+    """
+
+    def __init__(self, model_name=TOKEN_COUNT_MODEL, use_tokenizer=USE_TOKENIZER, max_cached=MAX_CACHED_COUNTS):
+        self.model_name = model_name
+        self.use_tokenizer = use_tokenizer
+        self.max_cached = max_cached
+        self._tokenizer = None
+        self._loading = False
+        self._counts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def source(self):
+        return "tokenizer" if self._tokenizer is not None else "estimate"
+
+    def _load(self):
+        try:
+            import tokenizer
+
+            self._tokenizer = tokenizer.load_tokenizer(self.model_name) if self.model_name else tokenizer.load_tokenizer()
+        except Exception as e:
+            print(f"Error loading tokenizer, estimating token counts instead: {e}")
+            self.use_tokenizer = False
+
+    def _start_loading(self):
+        with self._lock:
+            if self._loading or not self.use_tokenizer:
+                return
+            self._loading = True
+        threading.Thread(target=self._load, name="token-counter-load", daemon=True).start()
+
+    def count(self, text):
+        if not text:
+            return 0
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return cached
+        tok = self._tokenizer
+        if tok is None:
+            self._start_loading()
+            return estimate_tokens(text)
+        tokens = len(tok.encode(text, add_special_tokens=False))
+        with self._lock:
+            self.misses += 1
+            self._counts[key] = tokens
+            if len(self._counts) > self.max_cached:
+                self._counts.popitem(last=False)
+        return tokens
+
+
+def price_for(model):
+    return PRICES.get(model, DEFAULT_PRICE)
+
+
+def _entries(history):
+    """(role, content) of each message in a Gradio history (message dicts or [user, assistant] pairs)"""
+    for message in history:
+        if isinstance(message, dict):
+            yield message.get("role", ""), message.get("content") or ""
+        else:
+            yield "user", message[0] or ""
+            yield "assistant", message[1] or ""
+
+
+class Conversation:
+    """Messages of one session with their token counts and running totals.
+
+    Each message is counted once when it is added; totals are updated in O(1) per
+    message, so a turn costs the same however long the chat is.
+    """
+
+    def __init__(self, counter, bot="", session_id=""):
+        self.counter = counter
+        self.bot = bot
+        self.session_id = session_id
+        self.messages = []  # (role, content, tokens)
+        self.tokens_by_role = defaultdict(int)
+        self.total_tokens = 0
+        self.turns = 0
+        self.billed = {"input_tokens": 0, "output_tokens": 0, "cost": 0.0}
+        self.started = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def append(self, role, content):
+        tokens = self.counter.count(content)
+        self.messages.append((role, content, tokens))
+        self.tokens_by_role[role] += tokens
+        self.total_tokens += tokens
+        return tokens
+
+    def sync(self, history):
+        """Catch up with the caller's history; only messages not seen before are counted"""
+        entries = list(_entries(history))
+        known = len(self.messages)
+        if len(entries) < known or (known and entries[known - 1][1] != self.messages[known - 1][1]):
+            # Cleared, edited or retried chat: keep the longest common prefix, drop the rest
+            same = 0
+            for (_, content), (_, seen, _) in zip(entries, self.messages):
+                if content != seen:
+                    break
+                same += 1
+            for role, _, tokens in self.messages[same:]:
+                self.tokens_by_role[role] -= tokens
+                self.total_tokens -= tokens
+            del self.messages[same:]
+            known = same
+        for role, content in entries[known:]:
+            self.append(role, content)
+
+    def record_turn(self, message, result, model):
+        """Add a finished turn and the tokens the provider billed for it"""
+        self.append("user", message)
+        self.append("assistant", result.response)
+        self.turns += 1
+        input_price, output_price = price_for(model)
+        self.billed["input_tokens"] += result.input_tokens
+        self.billed["output_tokens"] += result.output_tokens
+        self.billed["cost"] += (result.input_tokens * input_price + result.output_tokens * output_price) / 1e6
+
+    def report(self):
+        return {
+            "bot": self.bot,
+            "session": self.session_id,
+            "started": self.started,
+            "ended": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "turns": self.turns,
+            "messages": len(self.messages),
+            "context_tokens": self.total_tokens,
+            "tokens_by_role": dict(self.tokens_by_role),
+            "billed_input_tokens": self.billed["input_tokens"],
+            "billed_output_tokens": self.billed["output_tokens"],
+            "cost_usd": round(self.billed["cost"], 6),
+            "counted_with": self.counter.source,
+        }
+
+
+def format_totals(conversation):
+    """Token accounting for the debug display"""
+    by_role = ", ".join(f"{role} {tokens}" for role, tokens in sorted(conversation.tokens_by_role.items()))
+    return (f"**Token Accounting** ({conversation.counter.source})\n"
+            f"- Conversation: {len(conversation.messages)} messages, {conversation.total_tokens} tokens ({by_role})\n"
+            f"- Billed this session: {conversation.billed['input_tokens']} in / "
+            f"{conversation.billed['output_tokens']} out over {conversation.turns} turns, "
+            f"${conversation.billed['cost']:.4f}")
+
+
+class ConversationStore:
+    """Conversations by (bot, session id), sharing one memoized token counter"""
+
+    def __init__(self, counter=None, max_conversations=MAX_CONVERSATIONS, cost_log_file=COST_LOG_FILE):
+        self.counter = counter or TokenCounter()
+        self.max_conversations = max_conversations
+        self.cost_log_file = cost_log_file
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, bot, session_id):
+        key = (bot, session_id)
+        with self._lock:
+            conversation = self._conversations.get(key)
+            if conversation is None:
+                conversation = self._conversations[key] = Conversation(self.counter, bot, session_id)
+                if len(self._conversations) > self.max_conversations:
+                    _, evicted = self._conversations.popitem(last=False)
+                    self._log(evicted)
+            self._conversations.move_to_end(key)
+        return conversation
+
+    def find(self, bot, session_id):
+        """The session's conversation, or None if it is not being tracked (never creates one)"""
+        with self._lock:
+            return self._conversations.get((bot, session_id))
+
+    def close(self, bot, session_id):
+        """End a session and append its cost report to the cost log; returns the report or None"""
+        with self._lock:
+            conversation = self._conversations.pop((bot, session_id), None)
+        if conversation is None:
+            return None
+        return self._log(conversation)
+
+    def _log(self, conversation):
+        report = conversation.report()
+        if self.cost_log_file and conversation.turns:
+            try:
+                with open(self.cost_log_file, "a") as f:
+                    f.write(json.dumps(report) + "\n")
+            except Exception as e:
+                print(f"Error writing session cost log: {e}")
+        return report
+
+
+def print_costs(path):
+    """Per-bot totals of a session cost log"""
+    totals = defaultdict(lambda: defaultdict(float))
+    with open(path, "r") as f:
+        for line in f:
+            report = json.loads(line)
+            bot = totals[report["bot"]]
+            bot["sessions"] += 1
+            bot["turns"] += report["turns"]
+            bot["input"] += report["billed_input_tokens"]
+            bot["output"] += report["billed_output_tokens"]
+            bot["cost"] += report["cost_usd"]
+    print(f"{'bot':<12}{'sessions':>10}{'turns':>8}{'input tok':>12}{'output tok':>12}{'cost $':>10}{'$/session':>11}")
+    for name, bot in sorted(totals.items()):
+        print(f"{name:<12}{bot['sessions']:>10.0f}{bot['turns']:>8.0f}{bot['input']:>12.0f}{bot['output']:>12.0f}"
+              f"{bot['cost']:>10.4f}{bot['cost'] / bot['sessions']:>11.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-session token usage and cost")
+    parser.add_argument("log", nargs="?", default=COST_LOG_FILE, help="Session cost log JSONL")
+    args = parser.parse_args()
+    print_costs(args.log)
+
+
+if __name__ == "__main__":
+    main()
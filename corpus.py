@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+# Configuration
+CORPUS_CACHE_DIR = ".corpus_cache"  # Downloaded texts, their metadata and sentence indexes
+DOWNLOAD_TIMEOUT = 30  # Seconds
+
+# Same sentence definition the prediction game has always used
+SENTENCE_PATTERN = re.compile(r'[A-Z][^.!?]*[.!?]')
+
+# Sentence index file layout (little-endian):
+#   magic (6 bytes) | sha256 of the text (32 bytes) | record count (uint32)
+#   then `count` records of start offset (uint32), length (uint32), word count (uint16),
+#   sorted by word count so length filters are two binary searches.
+INDEX_MAGIC = b"SIDX01"
+INDEX_HEADER = struct.Struct("<6s32sI")
+MAX_WORD_COUNT = 0xFFFF
+NEEDS_BYTESWAP = sys.byteorder != "little"
+
+
+def is_url(source):
+    return source.startswith(("http://", "https://"))
+
+
+def _cache_base(source, cache_dir):
+    name = hashlib.sha1(source.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(cache_dir, name)
+
+
+def _sha256(data):
+    return hashlib.sha256(data).digest()
+
+
+def _read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _load_meta(path):
+    if os.path.exists(path):
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading corpus metadata: {e}")
+    return {}
+
+
+def fetch_text_bytes(source, cache_dir=CORPUS_CACHE_DIR):
+    """Return the raw bytes of a corpus from a local path or a cached download.
+
+    URLs are cached on disk next to a metadata file holding the ETag and SHA-256 of the
+    body. A cached copy is revalidated with If-None-Match, checked against its checksum,
+    and used as-is when the network is unavailable.
+    """
+    if not is_url(source):
+        return _read_bytes(source)
+
+    import requests
+
+    os.makedirs(cache_dir, exist_ok=True)
+    base = _cache_base(source, cache_dir)
+    text_path, meta_path = base + ".txt", base + ".json"
+    meta = _load_meta(meta_path)
+
+    cached = None
+    if os.path.exists(text_path):
+        cached = _read_bytes(text_path)
+        if meta.get("sha256") != _sha256(cached).hex():
+            print("Cached corpus failed checksum validation, downloading again")
+            cached, meta = None, {}
+
+    headers = {"If-None-Match": meta["etag"]} if cached is not None and meta.get("etag") else {}
+    try:
+        response = requests.get(source, headers=headers, timeout=DOWNLOAD_TIMEOUT)
+        if response.status_code == 304 and cached is not None:
+            return cached
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if cached is not None:
+            print(f"Could not revalidate corpus ({e}), using cached copy")
+            return cached
+        raise
+
+    data = response.content
+    with open(text_path, "wb") as f:
+        f.write(data)
+    with open(meta_path, "w") as f:
+        json.dump({"source": source, "etag": response.headers.get("ETag"), "sha256": _sha256(data).hex()}, f, indent=2)
+    return data
+
+
+def build_sentence_index(text):
+    """Scan text once, returning (starts, lengths, word_counts) arrays sorted by word count"""
+    records = []
+    for match in SENTENCE_PATTERN.finditer(text):
+        words = len(match.group().split())
+        records.append((min(words, MAX_WORD_COUNT), match.start(), match.end() - match.start()))
+    records.sort()
+    starts = array("I", (r[1] for r in records))
+    lengths = array("I", (r[2] for r in records))
+    word_counts = array("H", (r[0] for r in records))
+    return starts, lengths, word_counts
+
+
+def save_sentence_index(path, digest, starts, lengths, word_counts):
+    """Write the sentence index in the compact binary layout described above"""
+    with open(path, "wb") as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, digest, len(starts)))
+        for column in (starts, lengths, word_counts):
+            # array.tofile writes native byte order; normalise to little-endian
+            if NEEDS_BYTESWAP:
+                column = array(column.typecode, column)
+                column.byteswap()
+            column.tofile(f)
+
+
+def load_sentence_index(path, digest):
+    """Read a sentence index, returning None if it is missing, corrupt or built for other text"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            magic, stored_digest, count = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC or stored_digest != digest:
+                return None
+            columns = []
+            for typecode in ("I", "I", "H"):
+                column = array(typecode)
+                column.fromfile(f, count)
+                if NEEDS_BYTESWAP:
+                    column.byteswap()
+                columns.append(column)
+            return tuple(columns)
+    except (OSError, EOFError, struct.error) as e:
+        print(f"Error loading sentence index: {e}")
+        return None
+
+
+class Corpus:
+    """A text plus its sentence index; sentences are sliced out of the text on demand"""
+
+    def __init__(self, text, starts, lengths, word_counts):
+        self.text = text
+        self.starts = starts
+        self.lengths = lengths
+        self.word_counts = word_counts
+
+    def __len__(self):
+        return len(self.starts)
+
+    def sentence(self, i):
+        start = self.starts[i]
+        return self.text[start:start + self.lengths[i]]
+
+    def sentences(self, min_length=15, max_length=30):
+        """Sentences with min_length..max_length words, in the order they appear in the text"""
+        lo = bisect_left(self.word_counts, min_length)
+        hi = bisect_right(self.word_counts, max_length)
+        positions = sorted(range(lo, hi), key=self.starts.__getitem__)
+        return [self.sentence(i) for i in positions]
+
+
+def load_corpus(source, cache_dir=CORPUS_CACHE_DIR):
+    """Load a corpus from a URL or local path, building its sentence index only when needed"""
+    data = fetch_text_bytes(source, cache_dir)
+    digest = _sha256(data)
+    text = data.decode("utf-8", errors="replace")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = _cache_base(source if is_url(source) else os.path.abspath(source), cache_dir) + ".idx"
+    index = load_sentence_index(index_path, digest)
+    if index is None:
+        index = build_sentence_index(text)
+        save_sentence_index(index_path, digest, *index)
+    return Corpus(text, *index)
@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+# Configuration
+DEBUG_LOG_FILE = os.environ.get("DEBUG_LOG_FILE")  # Optional JSONL file receiving every debug event
+
+_global_sinks = []
+_global_sinks_lock = threading.Lock()
+
+
+def attach_sink(sink):
+    """Attach a sink that receives debug events from every request"""
+    with _global_sinks_lock:
+        _global_sinks.append(sink)
+
+
+def detach_sink(sink):
+    """Stop sending debug events to a process-wide sink"""
+    with _global_sinks_lock:
+        if sink in _global_sinks:
+            _global_sinks.remove(sink)
+
+
+class DebugLog:
+    """Debug events for one request.
+
+    Events are given as a render function plus its arguments, and the function is only
+    called when at least one sink is attached, so a request nobody is watching pays
+    nothing for building debug text.
+    """
+
+    def __init__(self, sinks=()):
+        with _global_sinks_lock:
+            self.sinks = list(sinks) + list(_global_sinks)
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def event(self, name, render, *args):
+        """Emit a debug event whose markdown text is `render(*args)`"""
+        if not self.sinks:
+            return
+        text = render(*args)
+        for sink in self.sinks:
+            try:
+                sink.emit(name, text)
+            except Exception as e:
+                print(f"Error writing debug event: {e}")
+
+
+class MarkdownSink:
+    """Collects events as markdown for the Gradio debug tab; can be streamed while a request runs"""
+
+    def __init__(self):
+        self.entries = []
+        self.closed = False
+        self._changed = threading.Condition()
+
+    def emit(self, name, text):
+        with self._changed:
+            self.entries.append(text)
+            self._changed.notify_all()
+
+    def close(self):
+        with self._changed:
+            self.closed = True
+            self._changed.notify_all()
+
+    def render(self):
+        with self._changed:
+            return "\n\n".join(self.entries)
+
+    def stream(self):
+        """Yield the rendered markdown each time new events arrive, until close()"""
+        seen = 0
+        while True:
+            with self._changed:
+                while len(self.entries) == seen and not self.closed:
+                    self._changed.wait()
+                if len(self.entries) == seen and self.closed:
+                    return
+                seen = len(self.entries)
+                text = "\n\n".join(self.entries)
+            yield text
+
+
+class FileSink:
+    """Appends events as JSON lines to a file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, name, text):
+        line = json.dumps({"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "event": name, "text": text})
+        with self._lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+
+if DEBUG_LOG_FILE:
+    attach_sink(FileSink(DEBUG_LOG_FILE))
@@ -0,0 +1,141 @@
+import argparse
+import json
+import re
+import time
+
+import router
+from trace_report import percentile
+
+# Configuration
+DEFAULT_LIMIT = 100  # Distinct logged messages evaluated
+THRESHOLDS = (0.0, 0.15, 0.25, 0.35, 0.45, 0.55, 0.7, 1.01)  # 0 = always large, above 1 = always fast
+JUDGE_PROMPT = (
+    "Rate how good answer B is compared with reference answer A for the user's message, "
+    "from 1 (much worse) to 5 (as good or better). Reply with the number only.\n\n"
+    "Message: {}\n\nAnswer A: {}\n\nAnswer B: {}"
+)
+
+
+def load_messages(path, limit):
+    """Distinct (bot, message, features) from the route log, most recent first
+
+    Only entries logged with ROUTE_LOG_MESSAGE_TEXT on carry the message text.
+    """
+    seen, items = set(), []
+    with open(path, "r") as f:
+        lines = f.readlines()
+    for line in reversed(lines):
+        entry = json.loads(line)
+        if "message" not in entry:
+            continue
+        key = (entry["bot"], entry["message"])
+        if key not in seen:
+            seen.add(key)
+            items.append((entry["bot"], entry["message"], entry["features"]))
+        if len(items) >= limit:
+            break
+    return items
+
+
+def timed_answer(llm, system_prompt, message):
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    start = time.perf_counter()
+    response = llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=message)])
+    return response.content, time.perf_counter() - start
+
+
+def judge(llm, message, reference, answer):
+    from langchain_core.messages import HumanMessage
+
+    reply = llm.invoke([HumanMessage(content=JUDGE_PROMPT.format(message, reference, answer))]).content
+    match = re.search(r"[1-5]", reply)
+    return int(match.group()) if match else None
+
+
+def evaluate(items, engine, use_judge):
+    """Answer every message with both tiers; returns one record per message"""
+    import semantic_cache
+
+    embedder = semantic_cache.default_embedder()
+    scorer = router.QueryRouter(log_file=None)
+    records = []
+    for bot, message, features in items:
+        persona = engine.personas.get(bot)
+        if persona is None:
+            continue
+        large, large_seconds = timed_answer(engine.llm, persona.system_prompt, message)
+        fast, fast_seconds = timed_answer(engine.fast_llm, persona.system_prompt, message)
+        record = {
+            "bot": bot,
+            "message": message,
+            # Re-scored from the logged features, so changed weights can be evaluated on old logs
+            "score": scorer.score(features),
+            "large_seconds": large_seconds,
+            "fast_seconds": fast_seconds,
+            # Agreement with the large model's answer stands in for quality
+            "similarity": float(embedder.encode(large) @ embedder.encode(fast)),
+        }
+        if use_judge:
+            record["judge"] = judge(engine.llm, message, large, fast)
+        records.append(record)
+    return records
+
+
+def print_tradeoffs(records):
+    all_large = sum(r["large_seconds"] for r in records)
+    print(f"{len(records)} messages; large model p50 {percentile([r['large_seconds'] for r in records], 50):.2f}s, "
+          f"fast model p50 {percentile([r['fast_seconds'] for r in records], 50):.2f}s\n")
+    judged = any("judge" in r for r in records)
+    print(f"{'threshold':>9}{'% fast':>8}{'time saved':>12}{'similarity':>12}" + (f"{'judge':>8}" if judged else ""))
+    for threshold in THRESHOLDS:
+        fast = [r for r in records if r["score"] < threshold]
+        routed = sum(r["fast_seconds"] if r["score"] < threshold else r["large_seconds"] for r in records)
+        # Quality over all turns: fast-routed turns score their own agreement, large-routed turns score 1
+        similarity = (sum(r["similarity"] for r in fast) + len(records) - len(fast)) / len(records)
+        line = (f"{threshold:>9.2f}{100 * len(fast) / len(records):>8.1f}"
+                f"{100 * (all_large - routed) / all_large if all_large else 0.0:>11.1f}%{similarity:>12.3f}")
+        if judged:
+            scores = [r.get("judge") if r["score"] < threshold else 5 for r in records]
+            scores = [score for score in scores if score is not None]
+            line += f"{sum(scores) / len(scores) if scores else 0.0:>8.2f}"
+        marker = "  <- current" if abs(threshold - router.ROUTE_THRESHOLD) < 1e-9 else ""
+        print(line + marker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged turns on both model tiers to weigh latency "
+                                                 "saved by routing against answer quality")
+    parser.add_argument("log", nargs="?", default=router.ROUTE_LOG_FILE, help="Route log JSONL")
+    parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="Messages to evaluate")
+    parser.add_argument("--judge", action="store_true", help="Also have the large model grade the fast answers 1-5")
+    parser.add_argument("--output", help="Write per-message results to this JSONL file")
+    parser.add_argument("--mock", action="store_true", help="Mock models (large 0.8s, fast 0.2s) instead of Groq")
+    args = parser.parse_args()
+
+    from chat_engine import engine
+    from persona_server import PERSONA_APPS, load_apps
+
+    load_apps(sorted(PERSONA_APPS))
+    if args.mock:
+        from mocks import MockLLM
+
+        engine.llm = MockLLM(latency=0.8)
+        engine.fast_llm = MockLLM(latency=0.2, response_words=40)
+    if engine.fast_llm is None:
+        print("No fast model configured: set GROQ_FAST_MODEL_NAME in config.py")
+        return
+
+    records = evaluate(load_messages(args.log, args.limit), engine, args.judge)
+    if not records:
+        print(f"No logged turns with message text in {args.log}: set ROUTE_LOG_MESSAGE_TEXT = True in router.py")
+        return
+    if args.output:
+        with open(args.output, "w") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+    print_tradeoffs(records)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,40 @@
-from langchain_groq import ChatGroq
-from langchain_core.messages import HumanMessage, SystemMessage
-from config import GROQ_API_KEY, GROQ_MODEL_NAME
-llm_groq = ChatGroq(model_name=GROQ_MODEL_NAME, api_key=GROQ_API_KEY)
+import memory_store
+from memory_store import DEFAULT_PARTITION
+from chat_engine import engine, Persona, DEFAULT_SESSION, session_id_for
 
-import gradio as gr
+# Configuration
+BOT_NAME = "chatbot"  # Persona name, also used as the label for traces and metrics
+CHATBOT_TITLE = "Simple Chatbot"
+CHATBOT_DESCRIPTION = "This is a chatbot built using gradio"
+SYSTEM_PROMPT = "You are a helpful assistant."
 
-def chat(message, history):
-    return llm_groq.invoke(message).content
+# No memory file and no search template: a plain LLM chat on the shared engine
+PERSONA = engine.add_persona(Persona(
+    name=BOT_NAME,
+    system_prompt=SYSTEM_PROMPT,
+    title=CHATBOT_TITLE,
+    description=CHATBOT_DESCRIPTION,
+))
 
+def chat(message, history, session_id=DEFAULT_SESSION, partition=DEFAULT_PARTITION):
+    return engine.chat(PERSONA, message, history, session_id=session_id, partition=partition)
 
-demo = gr.ChatInterface(
-    fn=chat,
-    title="Simple Chatbot",
-    description="This is a chatbot built using gradio",
-)
+def build_demo():
+    import gradio as gr
 
+    # Each browser gets its own session (token accounting) and memory partition
+    def session_chat(message, history, request: gr.Request):
+        return chat(message, history, session_id=session_id_for(request),
+                    partition=memory_store.partition_for(request))
 
+    return gr.ChatInterface(
+        fn=session_chat,
+        title=CHATBOT_TITLE,
+        description=CHATBOT_DESCRIPTION,
+    )
 
-demo.launch(debug=True)
+def main():
+    build_demo().launch(debug=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+import argparse
+import asyncio
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+
+import tokenprediction
+import tracing
+from trace_report import percentile
+
+# Configuration
+MAX_BATCH_SIZE = 8  # Sequences decoded together in one forward pass
+MAX_WAIT_MS = 10  # An idle server waits this long for more requests before starting a batch
+DEFAULT_MAX_NEW_TOKENS = 64
+STATS_INTERVAL_SECONDS = 1.0  # Window for the tokens/sec gauge
+SERVER_HOST = "127.0.0.1"
+SERVER_PORT = 8001
+
+
+def cache_layers(cache):
+    """(keys, values) per layer of a transformers KV cache, across cache layouts"""
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [tuple(layer) for layer in cache]
+
+
+def make_cache(layers):
+    from transformers import DynamicCache
+
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
+
+
+def left_pad(tensor, length, dim):
+    """Pad `tensor` with zeros at the start of `dim` up to `length`"""
+    import torch
+
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+class GenerationRequest:
+    """One prompt being generated; text pieces are passed to `emit` as they are decoded, then None"""
+
+    def __init__(self, prompt_ids, max_new_tokens, emit):
+        self.id = uuid.uuid4().hex
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.emit = emit
+        self.generated = []
+        self.sent_text = ""
+        self.submitted = time.perf_counter()
+        self.first_token = None
+        self.finished = None
+
+
+class Batch:
+    """Running sequences with one left-padded KV cache; `mask` marks real (non-padding) positions"""
+
+    def __init__(self, requests, layers, mask, next_ids):
+        self.requests = requests
+        self.layers = layers
+        self.mask = mask
+        self.next_ids = next_ids
+
+    def merge(self, other):
+        """Add sequences from another batch, padding the shorter cache on the left"""
+        import torch
+
+        length = max(self.mask.shape[1], other.mask.shape[1])
+        self.layers = [
+            (torch.cat([left_pad(k, length, 2), left_pad(ok, length, 2)]),
+             torch.cat([left_pad(v, length, 2), left_pad(ov, length, 2)]))
+            for (k, v), (ok, ov) in zip(self.layers, other.layers)
+        ]
+        self.mask = torch.cat([left_pad(self.mask, length, 1), left_pad(other.mask, length, 1)])
+        self.next_ids = torch.cat([self.next_ids, other.next_ids])
+        self.requests += other.requests
+
+    def keep(self, rows):
+        """Drop every sequence not in `rows`, and the padding columns no remaining sequence uses"""
+        import torch
+
+        index = torch.tensor(rows)
+        mask = self.mask[index]
+        start = int(mask.any(dim=0).int().argmax())
+        self.mask = mask[:, start:]
+        self.layers = [(k[index, :, start:], v[index, :, start:]) for k, v in self.layers]
+        self.next_ids = self.next_ids[index]
+        self.requests = [self.requests[i] for i in rows]
+
+
+class BatchingServer:
+    """Serves the local model to many callers with continuous batching.
+
+    A background thread decodes one token for every running sequence per forward pass.
+    New requests are prefilled together and join the running batch between steps;
+    finished sequences leave it at once, so short requests never wait for long ones.
+    """
+
+    def __init__(self, model=None, tokenizer=None, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batch = None
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._window = deque()
+        self.tokens_generated = 0
+        self.steps = 0
+        self.occupancy_sum = 0
+
+    def start(self):
+        if self.model is None:
+            self.model, self.tokenizer = tokenprediction.load_model()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        self._thread.join()
+
+    # --- Client side ---
+
+    def submit(self, prompt, max_new_tokens=DEFAULT_MAX_NEW_TOKENS, emit=None):
+        """Queue a prompt (text or token ids); returns its GenerationRequest"""
+        prompt_ids = self.tokenizer.encode(prompt) if isinstance(prompt, str) else list(prompt)
+        if not prompt_ids:
+            raise ValueError("prompt is empty")
+        request = GenerationRequest(prompt_ids, max_new_tokens, emit)
+        with self._condition:
+            self._pending.append(request)
+            tracing.set_gauge("inference_queue_depth", len(self._pending))
+            self._condition.notify_all()
+        return request
+
+    def stream(self, prompt, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+        """Yield the generated text piece by piece"""
+        pieces = queue.Queue()
+        self.submit(prompt, max_new_tokens, pieces.put)
+        while True:
+            piece = pieces.get()
+            if piece is None:
+                return
+            yield piece
+
+    def generate(self, prompt, max_new_tokens=DEFAULT_MAX_NEW_TOKENS):
+        return "".join(self.stream(prompt, max_new_tokens))
+
+    # --- Decode loop ---
+
+    def _run(self):
+        while True:
+            admitted = self._admit()
+            if admitted is None:
+                return
+            if admitted:
+                try:
+                    self._prefill(admitted)
+                except Exception as e:
+                    # Only the new prompts failed; the running batch keeps decoding
+                    print(f"Error in inference prefill: {e}")
+                    for request in admitted:
+                        self._finish(request)
+            try:
+                if self.batch is not None:
+                    self._step()
+            except Exception as e:
+                print(f"Error in inference batch: {e}")
+                for request in self.batch.requests:
+                    self._finish(request)
+                self.batch = None
+            self._report()
+
+    def _admit(self):
+        """Take waiting requests that fit in the batch; returns None when the server stops"""
+        with self._condition:
+            if self.batch is None:
+                # Idle: wait for a request, then briefly for others so they share the prefill
+                while self._running and not self._pending:
+                    self._condition.wait()
+                deadline = time.perf_counter() + self.max_wait
+                while self._running and len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+            if not self._running:
+                return None
+            running = len(self.batch.requests) if self.batch else 0
+            admitted = []
+            while self._pending and running + len(admitted) < self.max_batch_size:
+                admitted.append(self._pending.popleft())
+            tracing.set_gauge("inference_queue_depth", len(self._pending))
+        return admitted
+
+    def _prefill(self, requests):
+        """Run the new prompts as one left-padded batch and merge them into the running batch"""
+        import torch
+
+        length = max(len(r.prompt_ids) for r in requests)
+        ids = torch.tensor([[0] * (length - len(r.prompt_ids)) + r.prompt_ids for r in requests])
+        mask = torch.tensor([[0] * (length - len(r.prompt_ids)) + [1] * len(r.prompt_ids) for r in requests])
+        positions = (mask.cumsum(dim=1) - 1).clamp(min=0)
+        with torch.no_grad():
+            output = self.model(ids, attention_mask=mask, position_ids=positions, use_cache=True)
+        # Padding rows attend to nothing and can hold NaNs; zero them so they stay inert under the mask
+        keep = mask.bool()[:, None, :, None]
+        layers = [(torch.where(keep, k, 0.0), torch.where(keep, v, 0.0))
+                  for k, v in cache_layers(output.past_key_values)]
+        new = Batch(list(requests), layers, mask, output.logits[:, -1].argmax(dim=-1, keepdim=True))
+        if self.batch is None:
+            self.batch = new
+        else:
+            self.batch.merge(new)
+        self._emit_tokens(list(range(len(self.batch.requests) - len(requests), len(self.batch.requests))))
+
+    def _step(self):
+        """Decode one token for every running sequence"""
+        import torch
+
+        batch = self.batch
+        mask = torch.cat([batch.mask, torch.ones_like(batch.mask[:, :1])], dim=1)
+        positions = batch.mask.sum(dim=1, keepdim=True)
+        with torch.no_grad():
+            output = self.model(batch.next_ids, attention_mask=mask, position_ids=positions,
+                                past_key_values=make_cache(batch.layers), use_cache=True)
+        batch.layers = cache_layers(output.past_key_values)
+        batch.mask = mask
+        batch.next_ids = output.logits[:, -1].argmax(dim=-1, keepdim=True)
+        self.steps += 1
+        self.occupancy_sum += len(batch.requests)
+        self._emit_tokens(range(len(batch.requests)))
+
+    def _emit_tokens(self, rows):
+        """Hand each row's newest token to its caller and retire finished sequences"""
+        batch = self.batch
+        finished = set()
+        for row in rows:
+            request = batch.requests[row]
+            token = int(batch.next_ids[row])
+            if request.first_token is None:
+                request.first_token = time.perf_counter()
+                tracing.observe("inference_time_to_first_token_seconds", request.first_token - request.submitted)
+            if token == self.tokenizer.eos_token_id:
+                finished.add(row)
+                continue
+            request.generated.append(token)
+            self.tokens_generated += 1
+            self._window.append(time.perf_counter())
+            tracing.inc_counter("inference_tokens_total")
+            text = self.tokenizer.decode(request.generated, skip_special_tokens=True)
+            # Hold back a partly decoded multi-byte character until its last token arrives
+            if not text.endswith("�") and len(text) > len(request.sent_text):
+                if request.emit:
+                    request.emit(text[len(request.sent_text):])
+                request.sent_text = text
+            if len(request.generated) >= request.max_new_tokens:
+                finished.add(row)
+        if finished:
+            for row in finished:
+                self._finish(batch.requests[row])
+            remaining = [row for row in range(len(batch.requests)) if row not in finished]
+            if remaining:
+                batch.keep(remaining)
+            else:
+                self.batch = None
+
+    def _finish(self, request):
+        if request.finished is not None:
+            return
+        request.finished = time.perf_counter()
+        tracing.inc_counter("inference_requests_total")
+        if request.emit:
+            text = self.tokenizer.decode(request.generated, skip_special_tokens=True)
+            if len(text) > len(request.sent_text):
+                request.emit(text[len(request.sent_text):])
+            request.emit(None)
+
+    def _report(self):
+        now = time.perf_counter()
+        while self._window and self._window[0] < now - STATS_INTERVAL_SECONDS:
+            self._window.popleft()
+        running = len(self.batch.requests) if self.batch else 0
+        tracing.set_gauge("inference_batch_size", running)
+        tracing.set_gauge("inference_batch_occupancy", running / self.max_batch_size)
+        tracing.set_gauge("inference_tokens_per_second", len(self._window) / STATS_INTERVAL_SECONDS)
+
+    def stats(self):
+        return {"tokens_generated": self.tokens_generated, "steps": self.steps,
+                "mean_batch_size": self.occupancy_sum / self.steps if self.steps else 0.0}
+
+
+def build_app(server):
+    """FastAPI app with OpenAI-style /v1/completions and /v1/chat/completions (SSE when stream=true)"""
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI(title="Local SmolLM2 inference server")
+
+    async def complete(prompt, body, object_name):
+        loop = asyncio.get_running_loop()
+        pieces = asyncio.Queue()
+        try:
+            request = server.submit(prompt, int(body.get("max_tokens") or DEFAULT_MAX_NEW_TOKENS),
+                                    lambda piece: loop.call_soon_threadsafe(pieces.put_nowait, piece))
+        except ValueError as e:
+            return JSONResponse({"error": {"message": str(e), "type": "invalid_request_error"}}, status_code=400)
+        created = int(time.time())
+        chat = object_name == "chat.completion"
+
+        def choice(text, finish_reason):
+            if chat:
+                key = "delta" if body.get("stream") else "message"
+                return {"index": 0, key: {"role": "assistant", "content": text} if text is not None else {},
+                        "finish_reason": finish_reason}
+            return {"index": 0, "text": text or "", "finish_reason": finish_reason}
+
+        def payload(text, finish_reason, suffix=""):
+            return {"id": request.id, "object": object_name + suffix, "created": created,
+                    "model": tokenprediction.model_name, "choices": [choice(text, finish_reason)]}
+
+        def finish_reason():
+            return "length" if len(request.generated) >= request.max_new_tokens else "stop"
+
+        if not body.get("stream"):
+            text = []
+            while (piece := await pieces.get()) is not None:
+                text.append(piece)
+            result = payload("".join(text), finish_reason())
+            result["usage"] = {"prompt_tokens": len(request.prompt_ids), "completion_tokens": len(request.generated),
+                               "total_tokens": len(request.prompt_ids) + len(request.generated)}
+            return JSONResponse(result)
+
+        async def events():
+            suffix = ".chunk" if chat else ""
+            while (piece := await pieces.get()) is not None:
+                yield f"data: {json.dumps(payload(piece, None, suffix))}\n\n"
+            yield f"data: {json.dumps(payload(None, finish_reason(), suffix))}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        return await complete(body.get("prompt", ""), body, "text_completion")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        prompt = server.tokenizer.apply_chat_template(body.get("messages", []), tokenize=False,
+                                                      add_generation_prompt=True)
+        return await complete(prompt, body, "chat.completion")
+
+    return app
+
+
+def benchmark(server, prompts, max_new_tokens):
+    """Tokens/sec one request at a time versus all requests submitted at once"""
+    server.max_batch_size, batch_size = 1, server.max_batch_size
+    start = time.perf_counter()
+    for prompt in prompts:
+        server.generate(prompt, max_new_tokens)
+    sequential = time.perf_counter() - start
+    tokens_sequential = server.tokens_generated
+
+    server.max_batch_size = batch_size
+    server.tokens_generated = server.steps = server.occupancy_sum = 0
+    requests, done = [], threading.Semaphore(0)
+    start = time.perf_counter()
+    for prompt in prompts:
+        requests.append(server.submit(prompt, max_new_tokens, lambda piece: piece is None and done.release()))
+    for _ in prompts:
+        done.acquire()
+    batched = time.perf_counter() - start
+
+    latencies = [r.finished - r.submitted for r in requests]
+    ttfts = [r.first_token - r.submitted for r in requests]
+    print(f"{len(prompts)} requests, up to {max_new_tokens} new tokens each")
+    print(f"One at a time: {tokens_sequential / sequential:.1f} tokens/s ({sequential:.2f}s)")
+    print(f"Batched:       {server.tokens_generated / batched:.1f} tokens/s ({batched:.2f}s), "
+          f"mean batch size {server.stats()['mean_batch_size']:.1f}")
+    print(f"Batched latency p50 {percentile(latencies, 50) * 1000:.0f} ms, "
+          f"time to first token p50 {percentile(ttfts, 50) * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the local SmolLM2 model with continuous batching")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS, help="Idle wait for requests to batch")
+    parser.add_argument("--bench", type=int, metavar="N", help="Instead of serving, compare N batched and "
+                                                               "sequential requests")
+    parser.add_argument("--max-new-tokens", type=int, default=32, help="Tokens per request in --bench")
+    args = parser.parse_args()
+
+    server = BatchingServer(max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms).start()
+    if args.bench:
+        topics = ["the ocean", "a friendly dog", "the moon", "a busy city", "the rain", "a long train ride"]
+        benchmark(server, [f"Write a short story about {topics[i % len(topics)]}." for i in range(args.bench)],
+                  args.max_new_tokens)
+        return
+
+    import uvicorn
+
+    tracing.start_metrics_server()
+    uvicorn.run(build_app(server), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
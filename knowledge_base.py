@@ -0,0 +1,334 @@
+import argparse
+import glob
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import tracing
+
+# Configuration
+KB_FILE = "knowledge_base.json"  # Chunks and the BM25 inverted index
+KB_VECTORS_FILE = "knowledge_base_vectors.npy"  # Dense vectors, only with sentence-transformers
+DEFAULT_SOURCES = "Compete/*.markdown"
+CHUNK_WORDS = 120  # Paragraphs are grouped into chunks of about this many words
+TOP_K = 3  # Chunks returned per query
+CONFIDENCE_THRESHOLD = 0.6  # Below this, the local answer is not trusted and the web is searched
+WEB_RESULT_TTL_SECONDS = 3600  # Web results written back to the index expire after this; keep it no longer
+# than semantic_cache.SEARCH_ANSWER_TTL_SECONDS, since confidence cannot tell fresh news from stale
+BM25_K1 = 1.5
+BM25_B = 0.75
+DENSE_WEIGHT = 0.5  # Share of the dense similarity in the hybrid score
+
+STOPWORDS = set(
+    "a an and are as at be by can do does for from has have how i in is it its me my of on or so tell "
+    "that the their them there these they this to was what when where which who why will with you your "
+    "about please any some more most than then into over also".split()
+)
+
+
+def tokenize(text):
+    """Lowercase words without stopwords, with a light suffix strip ("released" and "releases" match "release")"""
+    terms = []
+    for word in re.findall(r"[a-z0-9]+", text.lower()):
+        if word in STOPWORDS:
+            continue
+        for suffix in ("ing", "ed", "es", "s", "e"):
+            if len(word) > len(suffix) + 3 and word.endswith(suffix) and not word.endswith("ss"):
+                word = word[:-len(suffix)]
+                break
+        terms.append(word)
+    return terms
+
+
+def bm25_scores(query, texts):
+    """BM25 score of each text for the query, with IDF taken over the texts themselves"""
+    terms = set(tokenize(query))
+    documents = [Counter(tokenize(text)) for text in texts]
+    if not terms or not documents:
+        return [0.0] * len(documents)
+    average = sum(sum(doc.values()) for doc in documents) / len(documents) or 1.0
+    scores = []
+    for doc in documents:
+        length = sum(doc.values())
+        score = 0.0
+        for term in terms:
+            tf = doc.get(term, 0)
+            if tf:
+                df = sum(1 for other in documents if term in other)
+                idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average))
+        scores.append(score)
+    return scores
+
+
+def _clean(text):
+    # Markdown links become "text (url)", emphasis and code marks are dropped
+    text = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", r"\1 (\2)", text)
+    return re.sub(r"[*`]+", "", text).strip()
+
+
+def chunk_markdown(text, max_words=CHUNK_WORDS):
+    """Split a markdown document into (title, text) chunks.
+
+    Each table row becomes a chunk labelled with the table's column names; other
+    paragraphs are grouped up to `max_words` under their nearest heading.
+    """
+    chunks = []
+    heading = ""
+    header = None
+    paragraph = []
+
+    def flush():
+        if paragraph:
+            chunks.append((heading, _clean(" ".join(paragraph))))
+            paragraph.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            flush()
+            heading = _clean(stripped.lstrip("#"))
+            header = None
+        elif stripped.startswith("|"):
+            flush()
+            cells = [_clean(cell) for cell in stripped.strip("|").split("|")]
+            if all(re.fullmatch(r":?-+:?", cell) for cell in cells if cell):
+                continue
+            if header is None:
+                header = cells
+            else:
+                fields = "; ".join(f"{name}: {value}" for name, value in zip(header, cells) if value)
+                chunks.append((heading, f"{heading}. {fields}" if heading else fields))
+        elif not stripped:
+            flush()
+            header = None
+        else:
+            paragraph.append(stripped)
+            if sum(len(p.split()) for p in paragraph) >= max_words:
+                flush()
+    flush()
+    return chunks
+
+
+class KnowledgeBase:
+    """Local documents searched with BM25 (and dense vectors when available) before the web.
+
+    Chunks from files are shared by every persona; web results written back are kept
+    per persona (`namespace`) so one bot's search style never leaks into another's.
+    """
+
+    def __init__(self, path=KB_FILE, vectors_path=KB_VECTORS_FILE, dense=None):
+        self.path = path
+        self.vectors_path = vectors_path
+        self.chunks = {}
+        self.postings = {}
+        self.next_id = 0
+        self.total_length = 0
+        self._lock = threading.RLock()
+        self._embedder = None
+        self.vectors = {}
+        self._load()
+        # Dense retrieval follows what was built on disk unless asked for explicitly
+        self.dense = bool(self.vectors) if dense is None else dense
+
+    # --- Storage ---
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self.chunks = {int(chunk_id): chunk for chunk_id, chunk in data["chunks"].items()}
+            self.postings = {term: {int(chunk_id): tf for chunk_id, tf in docs.items()}
+                             for term, docs in data["postings"].items()}
+            self.next_id = data["next_id"]
+            self.total_length = sum(chunk["length"] for chunk in self.chunks.values())
+        except Exception as e:
+            print(f"Error loading knowledge base: {e}")
+        if os.path.exists(self.vectors_path):
+            try:
+                import numpy as np
+
+                matrix = np.load(self.vectors_path)
+                self.vectors = {int(row[0]): row[1:] for row in matrix if int(row[0]) in self.chunks}
+            except Exception as e:
+                print(f"Error loading knowledge base vectors: {e}")
+
+    def save(self):
+        with self._lock:
+            self._expire()
+            data = {"next_id": self.next_id, "chunks": self.chunks, "postings": self.postings}
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+            if self.vectors:
+                import numpy as np
+
+                np.save(self.vectors_path, np.array([[chunk_id, *vector] for chunk_id, vector in self.vectors.items()]))
+
+    # --- Indexing ---
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            from semantic_cache import SentenceTransformerEmbedder
+
+            self._embedder = SentenceTransformerEmbedder()
+        return self._embedder
+
+    def add(self, text, source, title="", namespace=None, origin="file", ttl_seconds=None):
+        """Index one chunk; returns its id, or None if the same text is already indexed"""
+        terms = tokenize(text)
+        if not terms:
+            return None
+        digest = hashlib.sha1(f"{namespace}:{text}".encode("utf-8")).hexdigest()
+        with self._lock:
+            if any(chunk["hash"] == digest for chunk in self.chunks.values()):
+                return None
+            chunk_id = self.next_id
+            self.next_id += 1
+            self.chunks[chunk_id] = {
+                "text": text, "source": source, "title": title, "namespace": namespace, "origin": origin,
+                "hash": digest, "length": len(terms), "added": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "expires": time.time() + ttl_seconds if ttl_seconds else None,
+            }
+            for term, tf in Counter(terms).items():
+                self.postings.setdefault(term, {})[chunk_id] = tf
+            self.total_length += len(terms)
+            if self.dense:
+                self.vectors[chunk_id] = self.embedder.encode(text)
+        return chunk_id
+
+    def remove(self, chunk_id):
+        with self._lock:
+            chunk = self.chunks.pop(chunk_id, None)
+            if chunk is None:
+                return
+            for term in set(tokenize(chunk["text"])):
+                docs = self.postings.get(term)
+                if docs is not None:
+                    docs.pop(chunk_id, None)
+                    if not docs:
+                        del self.postings[term]
+            self.total_length -= chunk["length"]
+            self.vectors.pop(chunk_id, None)
+
+    def ingest_file(self, path):
+        """(Re)index a markdown file; returns the number of chunks"""
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        with self._lock:
+            for chunk_id in [i for i, chunk in self.chunks.items() if chunk["source"] == path]:
+                self.remove(chunk_id)
+            return sum(self.add(chunk, path, title) is not None for title, chunk in chunk_markdown(text))
+
+    def add_web_results(self, query, results, namespace):
+        """Keep successful web results so the next similar question is answered locally"""
+        added = 0
+        for result in results:
+            if result.startswith("[") or result == "No search results found.":
+                continue
+            added += self.add(result, f"web: {query}", query, namespace, "web", WEB_RESULT_TTL_SECONDS) is not None
+        return added
+
+    def _expire(self):
+        now = time.time()
+        for chunk_id in [i for i, chunk in self.chunks.items() if chunk["expires"] and chunk["expires"] < now]:
+            self.remove(chunk_id)
+
+    # --- Retrieval ---
+
+    def search(self, query, namespace=None, top_k=TOP_K):
+        """Return (hits, confidence): the best chunks for the query and how well the top one covers it.
+
+        Confidence is the IDF-weighted share of the query's terms found in the top chunk (or
+        its dense similarity, if higher), from 0 to 1.
+        """
+        terms = set(tokenize(query))
+        now = time.time()
+        with self._lock:
+            visible = lambda chunk: (chunk["namespace"] in (None, namespace)
+                                     and not (chunk["expires"] and chunk["expires"] < now))
+            count = len(self.chunks)
+            if not terms or not count:
+                return [], 0.0
+            average = self.total_length / count
+            idf = {}
+            scores = Counter()
+            for term in terms:
+                docs = self.postings.get(term, {})
+                idf[term] = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for chunk_id, tf in docs.items():
+                    length = self.chunks[chunk_id]["length"]
+                    scores[chunk_id] += idf[term] * tf * (BM25_K1 + 1) / (
+                        tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average))
+            scores = Counter({i: s for i, s in scores.items() if visible(self.chunks[i])})
+
+            similarity = {}
+            if self.dense and self.vectors:
+                vector = self.embedder.encode(query)
+                similarity = {i: float(v @ vector) for i, v in self.vectors.items() if visible(self.chunks[i])}
+                best = max(scores.values(), default=0.0) or 1.0
+                for i in set(scores) | set(similarity):
+                    scores[i] = (1 - DENSE_WEIGHT) * scores[i] / best + DENSE_WEIGHT * similarity.get(i, 0.0)
+
+            ranked = [i for i, s in scores.most_common(top_k) if s > 0]
+            if not ranked:
+                return [], 0.0
+            top_terms = set(tokenize(self.chunks[ranked[0]]["text"]))
+            coverage = sum(idf[t] for t in terms if t in top_terms) / sum(idf.values())
+            confidence = max(coverage, similarity.get(ranked[0], 0.0))
+            hits = [dict(self.chunks[i], id=i, score=scores[i]) for i in ranked]
+        return hits, confidence
+
+    def retrieve(self, query, namespace=None, threshold=CONFIDENCE_THRESHOLD):
+        """Chunk texts to answer from, or None when local recall is not confident enough"""
+        hits, confidence = self.search(query, namespace)
+        found = confidence >= threshold
+        tracing.record_cache("knowledge_base", found)
+        return [f"{hit['text']} (from {hit['source']})" for hit in hits] if found else None
+
+    def stats(self):
+        origins = Counter(chunk["origin"] for chunk in self.chunks.values())
+        return {"chunks": len(self.chunks), "terms": len(self.postings), "file_chunks": origins["file"],
+                "web_chunks": origins["web"], "dense_vectors": len(self.vectors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query the local knowledge base")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ingest = sub.add_parser("ingest", help="Index markdown files")
+    ingest.add_argument("files", nargs="*", help=f"Files to index (default: {DEFAULT_SOURCES})")
+    ingest.add_argument("--dense", action="store_true", help="Also build dense vectors (needs sentence-transformers)")
+    query = sub.add_parser("query", help="Show the best chunks for a question")
+    query.add_argument("text")
+    query.add_argument("--namespace", help="Include web results saved by this persona")
+    sub.add_parser("stats", help="Show index size")
+    parser.add_argument("--kb", default=KB_FILE, help=f"Knowledge base file (default: {KB_FILE})")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        kb = KnowledgeBase(args.kb, dense=args.dense or None)
+        for path in args.files or sorted(glob.glob(DEFAULT_SOURCES)):
+            print(f"{path}: {kb.ingest_file(path)} chunks")
+        kb.save()
+        print(f"Knowledge base saved to {args.kb}: {kb.stats()['chunks']} chunks")
+    elif args.command == "query":
+        hits, confidence = KnowledgeBase(args.kb).search(args.text, args.namespace)
+        print(f"Confidence {confidence:.2f} ({'answer locally' if confidence >= CONFIDENCE_THRESHOLD else 'search the web'})")
+        for hit in hits:
+            print(f"\n[{hit['score']:.2f}] {hit['source']}\n{hit['text'][:300]}")
+    else:
+        print(json.dumps(KnowledgeBase(args.kb).stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import tracing
+from token_utils import estimate_tokens
+
+# Configuration
+PRIORITIES = ("interactive", "voice", "background")  # Highest first
+CLASS_CONCURRENCY = {"interactive": 8, "voice": 4, "background": 2}  # LLM calls in flight per class
+MAX_CONCURRENCY = 8  # LLM calls in flight in total
+TOKENS_PER_MINUTE = 30000  # Provider token budget shared by every class; 0 disables
+BACKGROUND_TPM_SHARE = 0.7  # Background calls only start while the last minute used less than this share
+MAX_QUEUE = {"interactive": 64, "voice": 32, "background": 256}  # Callers waiting per class before rejecting
+QUEUE_TIMEOUT_SECONDS = {"interactive": 30.0, "voice": 30.0, "background": 300.0}
+EXPECTED_OUTPUT_TOKENS = 300  # Reserved for the reply until the real usage is known
+WINDOW_SECONDS = 60.0
+
+
+class SchedulerBusy(Exception):
+    """Raised when a call cannot be admitted: its class queue is full or it waited too long"""
+
+
+def messages_tokens(messages):
+    """Estimated input tokens of a prompt (a string or a list of messages)"""
+    if isinstance(messages, str):
+        return estimate_tokens(messages)
+    if hasattr(messages, "to_messages"):  # A prompt value from a prompt template
+        messages = messages.to_messages()
+    return sum(estimate_tokens(getattr(message, "content", str(message))) for message in messages)
+
+
+class Ticket:
+    """One admitted LLM call; set `tokens` to the real usage before the slot is released"""
+
+    def __init__(self, priority, tokens):
+        self.priority = priority
+        self.tokens = tokens
+        self.granted = False
+        self.enqueued = time.monotonic()
+
+    def record(self, response):
+        """Replace the estimate with the usage reported on an LLM response"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        tokens = usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+        if tokens:
+            self.tokens = tokens
+
+
+class LLMScheduler:
+    """Admission control for the LLM calls of one process.
+
+    Calls wait in one queue per priority class. The highest class with a waiter goes
+    first; a class at its own concurrency limit lets lower classes through, but the
+    total concurrency and the token-per-minute budget are never jumped by a lower class.
+    Background calls also keep `1 - BACKGROUND_TPM_SHARE` of the budget free for live chat.
+    """
+
+    def __init__(self, class_concurrency=None, max_concurrency=MAX_CONCURRENCY, tokens_per_minute=TOKENS_PER_MINUTE,
+                 max_queue=None, queue_timeout=None):
+        self.class_concurrency = dict(class_concurrency or CLASS_CONCURRENCY)
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue = dict(max_queue or MAX_QUEUE)
+        self.queue_timeout = dict(queue_timeout or QUEUE_TIMEOUT_SECONDS)
+        self.background_tpm_share = BACKGROUND_TPM_SHARE
+        self._cond = threading.Condition()
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._running = {priority: 0 for priority in PRIORITIES}
+        self._window = deque()  # (admitted at, ticket) for the last WINDOW_SECONDS
+
+    def _window_tokens(self, now):
+        while self._window and now - self._window[0][0] >= WINDOW_SECONDS:
+            self._window.popleft()
+        return sum(ticket.tokens for _, ticket in self._window)
+
+    def _budget_allows(self, ticket, used):
+        if not self.tokens_per_minute:
+            return True
+        limit = self.tokens_per_minute * (self.background_tpm_share if ticket.priority == "background" else 1.0)
+        # A call bigger than the whole budget still runs once the window is empty
+        return used + ticket.tokens <= limit or not self._window
+
+    def _admit(self, now):
+        """Grant queued tickets in priority order; called with the condition held"""
+        used = self._window_tokens(now)
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue:
+                if sum(self._running.values()) >= self.max_concurrency:
+                    return
+                if self._running[priority] >= self.class_concurrency[priority]:
+                    break  # Only this class is full: lower classes may still go
+                ticket = queue[0]
+                if not self._budget_allows(ticket, used):
+                    if priority == "background":
+                        break
+                    return  # Wait for the budget rather than let a lower class take it
+                queue.popleft()
+                ticket.granted = True
+                self._running[priority] += 1
+                self._window.append((now, ticket))
+                used += ticket.tokens
+                tracing.observe("llm_queue_wait_seconds", now - ticket.enqueued, priority=priority)
+                self._cond.notify_all()
+
+    def _next_expiry(self, now):
+        return WINDOW_SECONDS - (now - self._window[0][0]) if self._window else None
+
+    def _publish(self):
+        for priority in PRIORITIES:
+            tracing.set_gauge("llm_queue_depth", len(self._queues[priority]), priority=priority)
+            tracing.set_gauge("llm_in_flight", self._running[priority], priority=priority)
+        tracing.set_gauge("llm_tokens_last_minute", self._window_tokens(time.monotonic()))
+
+    def acquire(self, priority, tokens):
+        """Block until a call of `priority` using about `tokens` tokens may start; returns its Ticket"""
+        ticket = Ticket(priority, tokens)
+        with self._cond:
+            if len(self._queues[priority]) >= self.max_queue[priority]:
+                tracing.inc_counter("llm_rejected_total", priority=priority, reason="queue_full")
+                raise SchedulerBusy(f"Too many {priority} LLM calls waiting")
+            self._queues[priority].append(ticket)
+            deadline = ticket.enqueued + self.queue_timeout[priority]
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._admit(now)
+                    if ticket.granted:
+                        return ticket
+                    if now >= deadline:
+                        tracing.inc_counter("llm_rejected_total", priority=priority, reason="timeout")
+                        raise SchedulerBusy(f"{priority} LLM call waited over {self.queue_timeout[priority]:.0f}s")
+                    # Wake up for a released slot, or when budget frees up as the window slides
+                    expiry = self._next_expiry(now)
+                    timeout = min(deadline - now, expiry if expiry is not None else math.inf)
+                    self._cond.wait(timeout if timeout != math.inf else None)
+            finally:
+                if not ticket.granted:
+                    self._queues[priority].remove(ticket)
+                    self._cond.notify_all()
+                self._publish()
+
+    def release(self, ticket):
+        with self._cond:
+            self._running[ticket.priority] -= 1
+            self._admit(time.monotonic())
+            self._cond.notify_all()
+            self._publish()
+
+    @contextmanager
+    def slot(self, priority, tokens):
+        """Hold an admission slot for the duration of one LLM call"""
+        ticket = self.acquire(priority, tokens)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def dedicate(self, priority, concurrency):
+        """Give one class `concurrency` slots, the whole token budget and no queue timeout.
+
+        For a command-line process whose only LLM calls are bulk work of that class: the
+        scheduler is per process, so there are no live users here to hold capacity back for.
+        """
+        with self._cond:
+            self.class_concurrency[priority] = concurrency
+            self.max_concurrency = max(self.max_concurrency, concurrency)
+            self.queue_timeout[priority] = math.inf
+            if priority == "background":
+                self.background_tpm_share = 1.0
+
+    def stats(self):
+        with self._cond:
+            return {"queued": {p: len(q) for p, q in self._queues.items()}, "running": dict(self._running),
+                    "tokens_last_minute": self._window_tokens(time.monotonic())}
+
+
+# Shared by every LLM caller in the process
+scheduler = LLMScheduler()
+
+
+class ScheduledLLM:
+    """Wraps a chat model so each invoke/stream call goes through the scheduler at a fixed priority.
+
+    `bind_tools` keeps the wrapper, and calling it invokes the model, so it can be piped
+    after a prompt (`prompt | llm`) or handed to a LangGraph agent.
+    """
+
+    def __init__(self, llm, priority, scheduler=scheduler):
+        self.llm = llm
+        self.priority = priority
+        self.scheduler = scheduler
+
+    def invoke(self, messages, *args, **kwargs):
+        with self.scheduler.slot(self.priority, messages_tokens(messages) + EXPECTED_OUTPUT_TOKENS) as ticket:
+            response = self.llm.invoke(messages, *args, **kwargs)
+            ticket.record(response)
+        return response
+
+    def stream(self, messages, *args, **kwargs):
+        with self.scheduler.slot(self.priority, messages_tokens(messages) + EXPECTED_OUTPUT_TOKENS) as ticket:
+            usage = {}
+            for chunk in self.llm.stream(messages, *args, **kwargs):
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                yield chunk
+            ticket.record(SimpleNamespace(usage_metadata=usage))
+
+    def __call__(self, messages):
+        return self.invoke(messages)
+
+    def bind_tools(self, tools, **kwargs):
+        return ScheduledLLM(self.llm.bind_tools(tools, **kwargs), self.priority, self.scheduler)
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+
+def simulate(args):
+    """Run a burst of background and voice calls against live chat on the mock LLM and report queue waits"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from mocks import MockLLM
+    from trace_report import percentile
+
+    llm = MockLLM(latency=args.llm_latency)
+    counter = itertools.count()
+    waits = {priority: [] for priority in PRIORITIES}
+    rejected = {priority: 0 for priority in PRIORITIES}
+
+    def call(sched, priority, scheduled):
+        prompt = f"Request {next(counter)}: " + "word " * args.prompt_words
+        start = time.monotonic()
+        try:
+            # Without the scheduler every call shares one first-come, first-served queue
+            with sched.slot(priority if scheduled else "interactive", messages_tokens(prompt) + EXPECTED_OUTPUT_TOKENS):
+                waits[priority].append(time.monotonic() - start)
+                llm.invoke(prompt)
+        except SchedulerBusy:
+            rejected[priority] += 1
+
+    for label, sched in (("unscheduled", None), ("scheduled", LLMScheduler(tokens_per_minute=args.tpm))):
+        for priority in PRIORITIES:
+            waits[priority].clear()
+            rejected[priority] = 0
+        scheduled = sched is not None
+        sched = sched or LLMScheduler(class_concurrency={p: args.provider_concurrency for p in PRIORITIES},
+                                      max_concurrency=args.provider_concurrency, tokens_per_minute=0,
+                                      max_queue={p: 10 ** 6 for p in PRIORITIES},
+                                      queue_timeout={p: 10 ** 6 for p in PRIORITIES})
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=args.background + args.voice + args.interactive) as pool:
+            # The bulk jobs arrive first, then live traffic lands on top of them
+            for _ in range(args.background):
+                pool.submit(call, sched, "background", scheduled)
+            time.sleep(0.05)
+            for i in range(max(args.voice, args.interactive)):
+                if i < args.voice:
+                    pool.submit(call, sched, "voice", scheduled)
+                if i < args.interactive:
+                    pool.submit(call, sched, "interactive", scheduled)
+                time.sleep(args.arrival_gap)
+        elapsed = time.monotonic() - start
+        print(f"\n{label} ({elapsed:.1f}s)")
+        print(f"{'class':<13}{'calls':>7}{'rejected':>10}{'wait p50 ms':>13}{'wait p95 ms':>13}")
+        for priority in PRIORITIES:
+            values = waits[priority] or [0.0]
+            print(f"{priority:<13}{len(waits[priority]):>7}{rejected[priority]:>10}"
+                  f"{percentile(values, 50) * 1000:>13.1f}{percentile(values, 95) * 1000:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the LLM scheduler on the mock LLM: a burst of background "
+                                                 "jobs with live chat and voice arriving on top")
+    parser.add_argument("--background", type=int, default=30, help="Background calls (summaries, news jobs)")
+    parser.add_argument("--interactive", type=int, default=20, help="Live chat calls")
+    parser.add_argument("--voice", type=int, default=10, help="Voice agent calls")
+    parser.add_argument("--arrival-gap", type=float, default=0.05, help="Seconds between live arrivals")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Mock LLM seconds per call")
+    parser.add_argument("--prompt-words", type=int, default=50)
+    parser.add_argument("--tpm", type=int, default=TOKENS_PER_MINUTE, help="Token-per-minute budget")
+    parser.add_argument("--provider-concurrency", type=int, default=MAX_CONCURRENCY,
+                        help="Calls the provider serves at once (first come, first served without the scheduler)")
+    simulate(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
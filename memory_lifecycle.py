@@ -0,0 +1,304 @@
+import argparse
+import atexit
+import copy
+import json
+import math
+import os
+import re
+import threading
+from datetime import datetime
+
+import memory_store
+import tracing
+from token_utils import estimate_tokens
+
+# Configuration
+MEMORY_CAPACITY = 200  # Maximum memories kept per memory file (per user partition)
+MERGE_SIMILARITY = 0.6  # Word-set Jaccard similarity at which two memories are merged
+COMMON_WORD_FRACTION = 0.2  # Words in more than this share of memories are ignored when looking for merges
+IMPORTANCE_WEIGHT = 1.0
+ACCESS_WEIGHT = 0.5
+RECENCY_WEIGHT = 2.0
+RECENCY_HALF_LIFE_DAYS = 14  # A memory's recency score halves after this many days without use
+DEFAULT_IMPORTANCE = 1.0  # Importance of a new memory; repeats and merges add to it
+POLICY_INTERVAL_SECONDS = 600  # How often the background policy runs
+SESSION_PARTITION_TTL_HOURS = 24  # Anonymous session partitions not saved for this long are deleted
+MEMORY_STATS_FILE = "memory_stats.jsonl"  # One line per policy run with memory count and total tokens
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Memory file -> {content key -> [access count, last accessed]} not yet written to disk
+_pending_access = {}
+_pending_lock = threading.Lock()
+_file_locks = {}
+
+
+def file_lock(memory_file):
+    """Lock held around load-modify-save of one memory file"""
+    with _pending_lock:
+        return _file_locks.setdefault(memory_file, threading.RLock())
+
+
+def memory_key(memory):
+    """Key used to recognize the same memory across loads"""
+    return memory["content"].lower()
+
+
+def new_memory(content, now=None):
+    """Create a memory record with lifecycle fields"""
+    now = now or datetime.now().strftime(TIMESTAMP_FORMAT)
+    return {"content": content, "timestamp": now, "last_accessed": now, "access_count": 0,
+            "importance": DEFAULT_IMPORTANCE}
+
+
+def ensure_fields(memory):
+    """Fill in lifecycle fields on memories saved before they existed"""
+    memory.setdefault("last_accessed", memory.get("timestamp"))
+    memory.setdefault("access_count", 0)
+    memory.setdefault("importance", DEFAULT_IMPORTANCE)
+    return memory
+
+
+def note_access(memory_file, memories):
+    """Count that these memories were injected into a prompt.
+
+    Counts are kept in process and written the next time the file is saved anyway
+    (a new memory, a policy run, or exit), so reading memories never rewrites the file.
+    """
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    with _pending_lock:
+        pending = _pending_access.setdefault(memory_file, {})
+        for memory in memories:
+            entry = pending.setdefault(memory_key(memory), [0, now])
+            entry[0] += 1
+            entry[1] = now
+
+
+def apply_pending_access(memory_file, memory_data):
+    """Merge access counts noted since the last save into memory_data"""
+    with _pending_lock:
+        pending = _pending_access.pop(memory_file, {})
+    for memory in memory_data["memories"]:
+        ensure_fields(memory)
+        entry = pending.get(memory_key(memory))
+        if entry:
+            memory["access_count"] += entry[0]
+            memory["last_accessed"] = max(memory["last_accessed"] or entry[1], entry[1])
+    return memory_data
+
+
+def score(memory, now=None):
+    """Value of keeping a memory: importance, how often it is used and how recently"""
+    now = now or datetime.now()
+    ensure_fields(memory)
+    try:
+        last_used = datetime.strptime(memory["last_accessed"] or memory["timestamp"], TIMESTAMP_FORMAT)
+        age_days = max(0.0, (now - last_used).total_seconds() / 86400)
+    except (TypeError, ValueError):
+        age_days = RECENCY_HALF_LIFE_DAYS * 10
+    recency = 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+    return (IMPORTANCE_WEIGHT * memory["importance"]
+            + ACCESS_WEIGHT * math.log1p(memory["access_count"])
+            + RECENCY_WEIGHT * recency)
+
+
+def _words(text):
+    return set(re.findall(r"[a-z0-9']+", text.lower()))
+
+
+def merge_memories(keep, other):
+    """Fold `other` into `keep`: the longer text wins, counts and importance add up"""
+    if len(other["content"]) > len(keep["content"]):
+        keep["content"] = other["content"]
+    keep["access_count"] += other["access_count"]
+    keep["importance"] += other["importance"]
+    keep["timestamp"] = max(keep["timestamp"], other["timestamp"])
+    keep["last_accessed"] = max(keep["last_accessed"] or "", other["last_accessed"] or "")
+    return keep
+
+
+def merge_similar(memories, threshold=MERGE_SIMILARITY):
+    """Merge near-duplicate memories; returns (memories, number merged).
+
+    Candidates are found through an inverted index of uncommon words, so only memories
+    that share vocabulary are compared instead of every pair.
+    """
+    word_sets = [_words(m["content"]) for m in memories]
+    index = {}
+    for i, words in enumerate(word_sets):
+        for word in words:
+            index.setdefault(word, []).append(i)
+    max_postings = max(50, int(len(memories) * COMMON_WORD_FRACTION))
+
+    merged_into = {}
+    for i, words in enumerate(word_sets):
+        if i in merged_into or not words:
+            continue
+        candidates = set()
+        for word in words:
+            postings = index[word]
+            if len(postings) <= max_postings:
+                candidates.update(j for j in postings if j > i and j not in merged_into)
+        for j in sorted(candidates):
+            union = len(words | word_sets[j])
+            if union and len(words & word_sets[j]) / union >= threshold:
+                merge_memories(memories[i], memories[j])
+                merged_into[j] = i
+    return [m for k, m in enumerate(memories) if k not in merged_into], len(merged_into)
+
+
+def apply_policy(memory_data, capacity=MEMORY_CAPACITY, merge_threshold=MERGE_SIMILARITY):
+    """Merge near-duplicates, then drop the lowest-scoring memories beyond capacity"""
+    memories = [ensure_fields(m) for m in memory_data["memories"]]
+    memories, merged = merge_similar(memories, merge_threshold)
+    evicted = 0
+    if len(memories) > capacity:
+        now = datetime.now()
+        ranked = sorted(memories, key=lambda m: score(m, now), reverse=True)
+        keep = {id(m) for m in ranked[:capacity]}
+        evicted = len(memories) - capacity
+        # Keep the surviving memories in their original (chronological) order
+        memories = [m for m in memories if id(m) in keep]
+    memory_data["memories"] = memories
+    return {"merged": merged, "evicted": evicted}
+
+
+def memory_stats(memory_data):
+    """Return memory count and total estimated tokens"""
+    memories = memory_data["memories"]
+    return {"count": len(memories), "total_tokens": sum(estimate_tokens(m["content"]) for m in memories)}
+
+
+def log_stats(memory_file, stats, stats_file=MEMORY_STATS_FILE):
+    """Append a stats line and update the memory gauges"""
+    name = os.path.basename(memory_file)
+    tracing.set_gauge("memory_count", stats["count"], memory_file=name)
+    tracing.set_gauge("memory_tokens", stats["total_tokens"], memory_file=name)
+    if not stats_file:
+        return
+    line = {"timestamp": datetime.now().strftime(TIMESTAMP_FORMAT), "memory_file": name, **stats}
+    try:
+        with open(stats_file, "a") as f:
+            f.write(json.dumps(line) + "\n")
+    except Exception as e:
+        print(f"Error writing memory stats: {e}")
+
+
+def has_pending_access(memory_file):
+    with _pending_lock:
+        return bool(_pending_access.get(memory_file))
+
+
+def run_policy(path, capacity=MEMORY_CAPACITY, dry_run=False):
+    """Apply pending accesses and the policy to one memory file; saves only if something changed"""
+    with file_lock(path):
+        memory_data = memory_store.load(path)
+        accessed = False
+        if dry_run:
+            # The loaded dict is shared with readers, so preview on a copy
+            memory_data = copy.deepcopy(memory_data)
+        else:
+            accessed = has_pending_access(path)
+            apply_pending_access(path, memory_data)
+        result = apply_policy(memory_data, capacity)
+        if not dry_run and (accessed or result["merged"] or result["evicted"]):
+            memory_store.save(path, memory_data)
+    return {**memory_stats(memory_data), **result}
+
+
+def expire_sessions(memory_file, ttl_hours=SESSION_PARTITION_TTL_HOURS, dry_run=False):
+    """Delete anonymous session partitions idle for `ttl_hours`; returns how many.
+
+    A session partition is only reachable from its browser session, which ends on reload,
+    so an idle one can never be read again. Sessions still in use are saved whenever the
+    policy flushes their access counts, which keeps them fresh.
+    """
+    expired = 0
+    for path in memory_store.session_partition_files(memory_file):
+        with file_lock(path):
+            idle = memory_store.idle_seconds(path)
+            if idle is None or idle < ttl_hours * 3600 or has_pending_access(path):
+                continue
+            if not dry_run:
+                memory_store.delete(path)
+        expired += 1
+    return expired
+
+
+def run_policy_all(memory_file, capacity=MEMORY_CAPACITY, dry_run=False):
+    """Expire idle session partitions, then run the policy on a bot's memory file and all its
+    partitions; log combined stats"""
+    totals = {"partitions": 0, "count": 0, "total_tokens": 0, "merged": 0, "evicted": 0,
+              "expired": expire_sessions(memory_file, dry_run=dry_run)}
+    for path in memory_store.partition_files(memory_file):
+        stats = run_policy(path, capacity, dry_run)
+        totals["partitions"] += 1
+        for key in ("count", "total_tokens", "merged", "evicted"):
+            totals[key] += stats[key]
+    if not dry_run:
+        log_stats(memory_file, totals)
+    return totals
+
+
+def flush_access():
+    """Write access counts noted since the last save, for every memory file"""
+    with _pending_lock:
+        paths = [path for path, pending in _pending_access.items() if pending]
+    for path in paths:
+        with file_lock(path):
+            memory_store.save(path, apply_pending_access(path, memory_store.load(path)))
+
+
+def start_background_policy(memory_file, capacity=MEMORY_CAPACITY, interval=POLICY_INTERVAL_SECONDS):
+    """Run the policy now and then every `interval` seconds in a daemon thread; flush accesses at exit"""
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            try:
+                run_policy_all(memory_file, capacity)
+            except Exception as e:
+                print(f"Error running memory policy: {e}")
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=loop, name="memory-policy", daemon=True).start()
+    atexit.register(flush_access)
+    return stop
+
+
+def print_stats_history(stats_file=MEMORY_STATS_FILE, memory_file=None):
+    """Print memory count and total tokens over time"""
+    if not os.path.exists(stats_file):
+        print(f"No stats recorded yet in {stats_file}")
+        return
+    print(f"{'Time':<21}{'File':<24}{'Users':>7}{'Count':>7}{'Tokens':>9}{'Merged':>8}{'Evicted':>9}{'Expired':>9}")
+    with open(stats_file, "r") as f:
+        for line in f:
+            entry = json.loads(line)
+            if memory_file and entry["memory_file"] != os.path.basename(memory_file):
+                continue
+            print(f"{entry['timestamp']:<21}{entry['memory_file']:<24}{entry.get('partitions', 1):>7}{entry['count']:>7}"
+                  f"{entry['total_tokens']:>9}{entry.get('merged', 0):>8}{entry.get('evicted', 0):>9}"
+                  f"{entry.get('expired', 0):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge and evict memories to keep each memory partition within capacity")
+    parser.add_argument("memory_file", nargs="?", help="Memory JSON file, e.g. bluey_memory.json")
+    parser.add_argument("--capacity", type=int, default=MEMORY_CAPACITY, help="Maximum memories to keep")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would change without saving")
+    parser.add_argument("--history", action="store_true", help=f"Print stats over time from {MEMORY_STATS_FILE}")
+    args = parser.parse_args()
+
+    if args.history or not args.memory_file:
+        print_stats_history(memory_file=args.memory_file)
+        return
+
+    stats = run_policy_all(args.memory_file, args.capacity, args.dry_run)
+    prefix = "Would keep" if args.dry_run else "Kept"
+    print(f"{prefix} {stats['count']} memories in {stats['partitions']} partitions ({stats['total_tokens']} tokens); "
+          f"merged {stats['merged']}, evicted {stats['evicted']}, expired {stats['expired']} idle sessions")
+
+
+if __name__ == "__main__":
+    main()
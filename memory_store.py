@@ -0,0 +1,137 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+import tracing
+
+# Configuration
+DEFAULT_PARTITION = "default"  # Partition used outside Gradio; stored in the bot's main memory file
+PARTITION_DIR_SUFFIX = "_users"  # bluey_memory.json -> bluey_memory_users/<partition hash>.json
+SESSION_DIR_SUFFIX = "_sessions"  # Anonymous browser sessions; expired by memory_lifecycle when idle
+
+# Memory file -> (mtime, memory data, content index)
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def partition_for(request):
+    """Memory partition for a Gradio request: the logged-in user if auth is on, else the browser session"""
+    if request is None:
+        return DEFAULT_PARTITION
+    return partition_for_ids(getattr(request, "username", None), getattr(request, "session_hash", None))
+
+
+def partition_for_ids(username=None, session_id=None):
+    """Memory partition for a user name or, failing that, a session id"""
+    if username:
+        return f"user:{username}"
+    return f"session:{session_id}" if session_id else DEFAULT_PARTITION
+
+
+def partition_path(memory_file, partition=DEFAULT_PARTITION):
+    """File holding one partition's memories"""
+    if partition == DEFAULT_PARTITION:
+        return memory_file
+    stem, ext = os.path.splitext(memory_file)
+    digest = hashlib.sha256(partition.encode("utf-8")).hexdigest()[:24]
+    suffix = SESSION_DIR_SUFFIX if partition.startswith("session:") else PARTITION_DIR_SUFFIX
+    return os.path.join(stem + suffix, digest + (ext or ".json"))
+
+
+def session_partition_files(memory_file):
+    """Partition files of anonymous browser sessions"""
+    stem, ext = os.path.splitext(memory_file)
+    return sorted(glob.glob(os.path.join(stem + SESSION_DIR_SUFFIX, "*" + (ext or ".json"))))
+
+
+def partition_files(memory_file):
+    """The main memory file plus every per-user and per-session partition file that exists"""
+    stem, ext = os.path.splitext(memory_file)
+    files = [memory_file] if os.path.exists(memory_file) else []
+    users = sorted(glob.glob(os.path.join(stem + PARTITION_DIR_SUFFIX, "*" + (ext or ".json"))))
+    return files + users + session_partition_files(memory_file)
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def idle_seconds(path):
+    """Seconds since a memory file was last saved, or None if it does not exist"""
+    mtime = _mtime(path)
+    return None if mtime is None else time.time() - mtime / 1e9
+
+
+def _build_index(memory_data):
+    return {memory["content"].lower(): memory for memory in memory_data["memories"]}
+
+
+def load(path):
+    """Load a memory file, reusing the parsed copy while the file is unchanged on disk.
+
+    The returned dict is shared with other readers; mutate it only while holding
+    memory_lifecycle.file_lock(path) and save() it afterwards.
+    """
+    mtime = _mtime(path)
+    with _cache_lock:
+        cached = _cache.get(path)
+        hit = cached is not None and cached[0] == mtime
+    tracing.record_cache("memory_file", hit)
+    if hit:
+        return cached[1]
+    memory_data = {"memories": []}
+    if mtime is not None:
+        try:
+            with open(path, "r") as f:
+                memory_data = json.load(f)
+        except Exception as e:
+            print(f"Error loading memory: {e}")
+    with _cache_lock:
+        _cache[path] = (mtime, memory_data, None)
+    return memory_data
+
+
+def content_index(path):
+    """Map of lowercased content -> memory for a file, built once per loaded version"""
+    memory_data = load(path)
+    with _cache_lock:
+        mtime, cached_data, index = _cache[path]
+        if cached_data is memory_data and index is not None:
+            return index
+        index = _build_index(memory_data)
+        if cached_data is memory_data:
+            _cache[path] = (mtime, memory_data, index)
+        return index
+
+
+def save(path, memory_data):
+    """Save a memory file and keep the saved copy cached"""
+    try:
+        # Ensure the directory exists
+        memory_dir = os.path.dirname(path)
+        if memory_dir and not os.path.exists(memory_dir):
+            os.makedirs(memory_dir)
+
+        with open(path, "w") as f:
+            json.dump(memory_data, f, indent=2)
+        with _cache_lock:
+            _cache[path] = (_mtime(path), memory_data, None)
+        print(f"Memory saved to {os.path.abspath(path)}")
+    except Exception as e:
+        print(f"Error saving memory: {e}")
+
+
+def delete(path):
+    """Delete a memory file and forget its cached copy"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    with _cache_lock:
+        _cache.pop(path, None)
@@ -0,0 +1,114 @@
+import random
+import threading
+import time
+
+from token_utils import estimate_tokens
+
+# Offline stand-ins for the Groq LLM and DuckDuckGo search, used by the benchmarks
+# and load tests. Latencies are simulated with sleep so concurrency behaves realistically.
+
+SEARCH_TRIGGER_PHRASE = "I need to search for this information"
+DEFAULT_SEARCH_KEYWORDS = ("latest", "news", "today", "search", "current")
+
+
+class MockResponse:
+    """Mimics the parts of a LangChain AIMessage the bots use"""
+
+    def __init__(self, content, input_tokens=0, output_tokens=0):
+        self.content = content
+        self.usage_metadata = {"input_tokens": input_tokens, "output_tokens": output_tokens,
+                               "total_tokens": input_tokens + output_tokens}
+
+
+def _message_text(message):
+    return message if isinstance(message, str) else getattr(message, "content", str(message))
+
+
+class _Latency:
+    """Sleeps for latency +/- jitter and keeps a running total of simulated time"""
+
+    def __init__(self, latency, jitter, seed):
+        self.latency = latency
+        self.jitter = jitter
+        self.simulated_seconds = 0.0
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self):
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            self.simulated_seconds += delay
+            self.calls += 1
+        if delay:
+            time.sleep(delay)
+
+
+class MockLLM:
+    """Stand-in for ChatGroq.
+
+    Replies with the search trigger phrase when the latest user message contains one of
+    `search_keywords` and no search results have been provided yet; otherwise replies
+    with `response_words` words of filler text.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, search_keywords=DEFAULT_SEARCH_KEYWORDS,
+                 response_words=60, token_latency=0.0, seed=0):
+        self.search_keywords = tuple(k.lower() for k in search_keywords)
+        self.response_words = response_words
+        self.token_latency = token_latency
+        self._latency = _Latency(latency, jitter, seed)
+
+    @property
+    def simulated_seconds(self):
+        return self._latency.simulated_seconds
+
+    @property
+    def calls(self):
+        return self._latency.calls
+
+    def _reply(self, messages):
+        if isinstance(messages, str):
+            return " ".join(["Mock"] + ["analysis"] * (self.response_words - 1))
+        last = messages[-1]
+        last_type = type(last).__name__
+        text = _message_text(last).lower()
+        if last_type == "HumanMessage" and any(k in text for k in self.search_keywords):
+            return SEARCH_TRIGGER_PHRASE
+        return " ".join(["Mock"] + ["answer"] * (self.response_words - 1))
+
+    def invoke(self, messages, *args, **kwargs):
+        self._latency.sleep()
+        content = self._reply(messages)
+        prompt = messages if isinstance(messages, str) else "\n".join(_message_text(m) for m in messages)
+        return MockResponse(content, estimate_tokens(prompt), estimate_tokens(content))
+
+    def stream(self, messages, *args, **kwargs):
+        response = self.invoke(messages)
+        words = response.content.split(" ")
+        for i, word in enumerate(words):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            chunk = MockResponse(word if i == 0 else " " + word)
+            if i == len(words) - 1:
+                # Like Groq, usage arrives on the final chunk
+                chunk.usage_metadata = response.usage_metadata
+            yield chunk
+
+
+class MockSearch:
+    """Stand-in for a bot's search_ddg: returns `num_results` snippets after a simulated delay"""
+
+    def __init__(self, latency=0.0, jitter=0.0, num_results=3, snippet_words=40, seed=0):
+        self.num_results = num_results
+        self.snippet_words = snippet_words
+        self._latency = _Latency(latency, jitter, seed)
+
+    @property
+    def simulated_seconds(self):
+        return self._latency.simulated_seconds
+
+    def __call__(self, query, *args, **kwargs):
+        self._latency.sleep()
+        filler = " ".join(["detail"] * self.snippet_words)
+        return [f"Result {i+1} about {query}: {filler}." for i in range(self.num_results)]
@@ -1,45 +1,417 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
 from duckduckgo_search import DDGS
 from duckduckgo_search.exceptions import RatelimitException
 from langchain_groq import ChatGroq
 from config import GROQ_API_KEY, GROQ_MODEL_NAME
+import tracing
+import llm_scheduler
+from llm_scheduler import ScheduledLLM
+from token_utils import estimate_tokens, truncate_to_tokens
+
+# Configuration
+NEWS_REGION = 'us-en'
+BATCH_MAX_WORKERS = 4  # Upper bound on concurrent searches + LLM analyses
+SEARCH_REQUESTS_PER_SECOND = 1.0  # DuckDuckGo rate-limits bursts quickly
+MAP_REDUCE_CHUNK_TOKENS = 3000  # Token budget for the articles in one map-stage call
+CHUNK_CACHE_FILE = "news_chunk_cache.json"  # Map-stage summaries, reused across styles and runs
+CHUNK_CACHE_MAX_ENTRIES = 2000  # Least recently used summaries are dropped beyond this
+NEWS_INDEX_FILE = "news_index.json"  # Per-topic seen articles and last digest for "what's new" runs
+SEEN_RETENTION_DAYS = 30  # Seen-article entries older than this are pruned from the index
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+NO_ARTICLES_TEXT = "No news articles found. Please try a different query or try again later."
+NO_NEW_ARTICLES_TEXT = "All articles for this topic were already covered by another topic in this batch."
+NOTHING_NEW_TEXT = "No new articles since the last briefing."
+RATE_LIMIT_TEMPLATE = "Rate limit exceeded: {}. DuckDuckGo has rate-limited your request. Try again later or use a different search provider."
+
+# Map stage prompt: neutral, style-free notes so they can be reused for any style
+MAP_PROMPT_TEMPLATE = (
+    "Summarize the key facts, figures, names and developments in these news items that are relevant to the question: {}. "
+    "Be neutral and concise; do not add opinions or styling.\n\nNews items:\n{}"
+)
+
+# Merges the analysis of only the new articles into the previous digest for a topic
+DIGEST_MERGE_PROMPT_TEMPLATE = (
+    "You maintain a running news digest about: {query}. Write in this style: {style}.\n\n"
+    "Previous digest:\n{previous}\n\n"
+    "Analysis of new articles since the previous digest:\n{update}\n\n"
+    "Produce the updated digest. Lead with what is new, keep earlier points that are still relevant, "
+    "and drop anything the new articles supersede."
+)
+
+# Background class of this process's scheduler: it paces calls against the token budget, but the
+# scheduler is per process, so it does not coordinate with chat servers running elsewhere
+llm_groq = ScheduledLLM(ChatGroq(model_name=GROQ_MODEL_NAME, api_key=GROQ_API_KEY), "background")
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls at least 1/rate seconds apart"""
+
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second if rate_per_second > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self):
+        # Reserve the next free slot under the lock, then sleep outside it
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+search_limiter = RateLimiter(SEARCH_REQUESTS_PER_SECOND)
+
+
+def fetch_news(query, region=NEWS_REGION, timelimit=None):
+    """Fetch news articles for a query, respecting the shared search rate limit"""
+    search_limiter.wait()
+    return list(DDGS().news(query, region=region, timelimit=timelimit) or [])
+
+
+def _hash_text(text):
+    return hashlib.sha1(text.strip().lower().encode('utf-8')).hexdigest()
+
+
+def article_keys(article):
+    """Hashes identifying an article: its URL and its title (either may match a duplicate)"""
+    keys = []
+    if article.get('url'):
+        keys.append("url:" + _hash_text(article['url']))
+    if article.get('title'):
+        keys.append("title:" + _hash_text(article['title']))
+    return keys
+
+
+def dedupe_articles(articles, seen=None):
+    """Drop articles whose URL or title hash is already in `seen` (updated in place)"""
+    if seen is None:
+        seen = set()
+    unique = []
+    for article in articles:
+        keys = article_keys(article)
+        if any(key in seen for key in keys):
+            continue
+        seen.update(keys)
+        unique.append(article)
+    return unique
+
+
+def format_articles(articles):
+    """Join article titles and bodies into the text block sent to the LLM"""
+    return "".join(f"{article.get('title', '')}\n{article.get('body', '')}\n\n" for article in articles)
+
+
+def build_news_prompt(style, query, news_text):
+    """Build the analysis prompt for a set of formatted news items"""
+    return ("Give a detailed news analysis in this style: " + style +
+            ". You will be given news items to analyze and apply that style. Here is the user question" + query +
+            "\n\n. The news items are : " + news_text)
+
+
+def chunk_articles(articles, token_budget=MAP_REDUCE_CHUNK_TOKENS):
+    """Greedily pack articles into groups whose formatted text fits the token budget"""
+    chunks = []
+    current, current_tokens = [], 0
+    for article in articles:
+        text = format_articles([article])
+        tokens = estimate_tokens(text)
+        if tokens > token_budget:
+            # A single oversized article gets its own, truncated, chunk
+            article = dict(article, body=truncate_to_tokens(article.get('body', ''), token_budget))
+            tokens = token_budget
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(article)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+_chunk_cache = None
+_chunk_cache_lock = threading.Lock()
+# Map-stage LLM calls in flight across every analysis, so batch workers each running
+# a map-reduce cannot multiply the concurrency
+_map_slots = threading.BoundedSemaphore(BATCH_MAX_WORKERS)
+
+
+def _load_chunk_cache():
+    global _chunk_cache
+    if _chunk_cache is None:
+        _chunk_cache = OrderedDict()
+        if os.path.exists(CHUNK_CACHE_FILE):
+            try:
+                with open(CHUNK_CACHE_FILE, 'r') as f:
+                    _chunk_cache = json.load(f, object_pairs_hook=OrderedDict)
+            except Exception as e:
+                print(f"Error loading chunk cache: {e}")
+    return _chunk_cache
+
+
+def _save_chunk_cache():
+    try:
+        with _chunk_cache_lock:
+            snapshot = dict(_chunk_cache)
+        with open(CHUNK_CACHE_FILE, 'w') as f:
+            json.dump(snapshot, f)
+    except Exception as e:
+        print(f"Error saving chunk cache: {e}")
+
+
+def summarize_chunk(query, chunk):
+    """Map stage: summarize one chunk of articles, cached by query + chunk content"""
+    chunk_text = format_articles(chunk)
+    key = _hash_text(query + "\n" + chunk_text)
+    with _chunk_cache_lock:
+        cache = _load_chunk_cache()
+        hit = key in cache
+        tracing.record_cache("news_chunk", hit)
+        if hit:
+            cache.move_to_end(key)
+            return cache[key]
+    with _map_slots:
+        summary = llm_groq.invoke(MAP_PROMPT_TEMPLATE.format(query, chunk_text)).content
+    with _chunk_cache_lock:
+        cache[key] = summary
+        while len(cache) > CHUNK_CACHE_MAX_ENTRIES:
+            cache.popitem(last=False)
+    return summary
 
-llm_groq = ChatGroq(model_name=GROQ_MODEL_NAME, api_key=GROQ_API_KEY)
 
-# Create an instance of DDGS first
-ddgs = DDGS()
+def map_reduce_analyze(style, query, articles, token_budget=MAP_REDUCE_CHUNK_TOKENS, max_workers=BATCH_MAX_WORKERS):
+    """Summarize token-budgeted chunks in parallel, then write one styled analysis of the summaries.
 
-# Call the news method on the instance with correct parameters and handle rate limiting
-try:
-    test = ddgs.news(keywords="Latest Gold and silver metal news", region='us-in', timelimit='d')
-    print("Successfully retrieved news")
-except RatelimitException as e:
-    print(f"Rate limit exceeded: {e}")
-    print("DuckDuckGo has rate-limited your request. Try again later or use a different search provider.")
+    Only the final (reduce) call depends on `style`, so re-running with another style
+    reuses the cached chunk summaries.
+    """
+    chunks = chunk_articles(articles, token_budget)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        summaries = list(pool.map(lambda chunk: summarize_chunk(query, chunk), chunks))
+    _save_chunk_cache()
+    notes = "\n\n".join(f"Summary of news batch {i+1}:\n{summary}" for i, summary in enumerate(summaries))
+    return llm_groq.invoke(build_news_prompt(style, query, notes)).content
 
-def news_analyzer(style, query):
-  text = ""
-  try:
-    r = DDGS().news(query, region='us-en')
-    for article in r:
-      text +=  article.get('title')+ "\n"+ article.get('body')+"\n\n"
 
-    if not text:
-      return "No news articles found. Please try a different query or try again later."
+def analyze_articles(style, query, articles, mode="auto"):
+    """Run the LLM analysis over an already fetched list of articles.
 
-    prompt = "Give a detailed news analysis in this style: "+style+". You will be given news items to analyze and apply that style. Here is the user question" + query + \
-              "\n\n. The news items are : " + text
+    mode: "single" sends every article in one prompt, "map_reduce" always chunks,
+    "auto" chunks only when the articles exceed MAP_REDUCE_CHUNK_TOKENS.
+    """
+    if not articles:
+        return NO_ARTICLES_TEXT
+    news_text = format_articles(articles)
+    if mode == "map_reduce" or (mode == "auto" and estimate_tokens(news_text) > MAP_REDUCE_CHUNK_TOKENS):
+        return map_reduce_analyze(style, query, articles)
+    return llm_groq.invoke(build_news_prompt(style, query, news_text)).content
 
-    #print(prompt)
+
+def news_analyzer(style, query, mode="auto"):
+    try:
+        articles = dedupe_articles(fetch_news(query))
+        return analyze_articles(style, query, articles, mode)
+    except RatelimitException as e:
+        return RATE_LIMIT_TEMPLATE.format(e)
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+
+def load_news_index():
+    """Load the per-topic seen-article index from file"""
+    if os.path.exists(NEWS_INDEX_FILE):
+        try:
+            with open(NEWS_INDEX_FILE, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading news index: {e}")
+    return {"topics": {}}
+
+
+def save_news_index(index):
+    """Save the per-topic seen-article index to file"""
+    try:
+        with open(NEWS_INDEX_FILE, 'w') as f:
+            json.dump(index, f, indent=2)
+    except Exception as e:
+        print(f"Error saving news index: {e}")
+
+
+_news_index_lock = threading.Lock()
+
+
+def record_topic_run(query, timestamp, digest=None, new_articles=()):
+    """Apply one topic's run to the news index file.
+
+    The index is reloaded under a lock, so concurrent digests and batches in this
+    process never overwrite each other's updates.
+    """
+    with _news_index_lock:
+        index = load_news_index()
+        topic = get_topic_entry(index, query)
+        if digest is not None:
+            topic["digest"] = digest
+        mark_seen(topic, new_articles, timestamp)
+        topic["last_run"] = timestamp
+        save_news_index(index)
+    return topic
+
+
+def get_topic_entry(index, query):
+    """Return (creating if needed) the index entry for a topic"""
+    key = " ".join(query.lower().split())
+    return index["topics"].setdefault(key, {"seen": {}, "digest": "", "last_run": None})
+
+
+def timelimit_since(last_run):
+    """Narrowest DuckDuckGo timelimit that still covers everything since the last run"""
+    if not last_run:
+        return None
+    elapsed = datetime.now() - datetime.strptime(last_run, TIMESTAMP_FORMAT)
+    if elapsed < timedelta(days=1):
+        return 'd'
+    if elapsed < timedelta(days=7):
+        return 'w'
+    if elapsed < timedelta(days=30):
+        return 'm'
+    return None
+
+
+def unseen_articles(topic, articles):
+    """Articles none of whose URL/title hashes are in the topic's seen index"""
+    return [a for a in articles if not any(key in topic["seen"] for key in article_keys(a))]
+
+
+def mark_seen(topic, articles, timestamp):
+    """Record articles as seen and prune entries past the retention window"""
+    for article in articles:
+        for key in article_keys(article):
+            topic["seen"][key] = timestamp
+    cutoff = (datetime.now() - timedelta(days=SEEN_RETENTION_DAYS)).strftime(TIMESTAMP_FORMAT)
+    topic["seen"] = {key: ts for key, ts in topic["seen"].items() if ts >= cutoff}
+
+
+def update_digest(style, query, previous_digest, new_articles, mode="auto"):
+    """Analyze only the new articles and merge the result into the previous digest"""
+    update = analyze_articles(style, query, new_articles, mode)
+    if not previous_digest:
+        return update
+    prompt = DIGEST_MERGE_PROMPT_TEMPLATE.format(query=query, style=style, previous=previous_digest, update=update)
     return llm_groq.invoke(prompt).content
-  except RatelimitException as e:
-    return f"Rate limit exceeded: {e}. DuckDuckGo has rate-limited your request. Try again later or use a different search provider."
-  except Exception as e:
-    return f"An error occurred: {str(e)}"
 
-if __name__ == "__main__":
-    # Set defaults
-    newstopic = input("Enter the news topic you want to know more about (default: Today's news): ") or "Today's news"
-    stylechoice = input("Enter the style in which you would like to read the news (default: CNN News Anchor): ") or "CNN News Anchor"
-    print(f"Here is the latest update about: {newstopic} \n")
-    print(news_analyzer(f"Write in the style of {stylechoice}", newstopic))
 
+def news_digest(style, query, mode="auto"):
+    """"What's new" mode: search and analyze only articles not seen in earlier runs for this topic"""
+    topic = get_topic_entry(load_news_index(), query)
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    try:
+        articles = dedupe_articles(fetch_news(query, timelimit=timelimit_since(topic["last_run"])))
+        new_articles = unseen_articles(topic, articles)
+        digest = update_digest(style, query, topic["digest"], new_articles, mode) if new_articles else None
+        topic = record_topic_run(query, now, digest, new_articles)
+        return topic["digest"] or NOTHING_NEW_TEXT
+    except RatelimitException as e:
+        return RATE_LIMIT_TEMPLATE.format(e)
+    except Exception as e:
+        return f"An error occurred: {str(e)}"
+
+
+def batch_news_analyzer(style, queries, max_workers=BATCH_MAX_WORKERS, mode="auto", incremental=False):
+    """Analyze many topics concurrently, yielding (query, analysis) as each briefing finishes.
+
+    Searches and LLM calls share one bounded worker pool; searches are additionally
+    throttled by `search_limiter`. Articles already used for an earlier topic in the
+    batch (same URL or title) are not analyzed again. With `incremental=True` each
+    topic instead only analyzes articles missing from its own seen index, and yields
+    the merged digest.
+    """
+    seen = set()
+    index = load_news_index() if incremental else None
+    now = datetime.now().strftime(TIMESTAMP_FORMAT)
+    new_by_query = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {}
+        for query in dict.fromkeys(queries):
+            timelimit = timelimit_since(get_topic_entry(index, query)["last_run"]) if incremental else None
+            pending[pool.submit(fetch_news, query, timelimit=timelimit)] = ("fetch", query)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, query = pending.pop(future)
+                try:
+                    result = future.result()
+                except RatelimitException as e:
+                    yield query, RATE_LIMIT_TEMPLATE.format(e)
+                    continue
+                except Exception as e:
+                    yield query, f"An error occurred: {str(e)}"
+                    continue
+
+                if stage == "analyze":
+                    if incremental:
+                        record_topic_run(query, now, result, new_by_query.pop(query))
+                    yield query, result
+                    continue
+
+                if incremental:
+                    # Each topic reports its own news, even articles another topic also found
+                    topic = get_topic_entry(index, query)
+                    articles = unseen_articles(topic, dedupe_articles(result))
+                    if not articles:
+                        record_topic_run(query, now)
+                        yield query, topic["digest"] or NOTHING_NEW_TEXT
+                        continue
+                    new_by_query[query] = articles
+                    future = pool.submit(update_digest, style, query, topic["digest"], articles, mode)
+                else:
+                    # Cross-topic dedupe runs in this (single) consumer thread, so `seen` needs no lock
+                    articles = dedupe_articles(result, seen)
+                    if not articles:
+                        yield query, NO_NEW_ARTICLES_TEXT if result else NO_ARTICLES_TEXT
+                        continue
+                    future = pool.submit(analyze_articles, style, query, articles, mode)
+                pending[future] = ("analyze", query)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze news with an LLM in a chosen style")
+    parser.add_argument("--topics", nargs="+", help="Analyze several topics concurrently instead of prompting")
+    parser.add_argument("--style", default="CNN News Anchor", help="Style for batch mode (default: CNN News Anchor)")
+    parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS, help="Max concurrent searches/analyses")
+    parser.add_argument("--mode", choices=["auto", "single", "map_reduce"], default="auto",
+                        help="Prompt strategy: one prompt, map-reduce over chunks, or map-reduce only when too large")
+    parser.add_argument("--whats-new", action="store_true",
+                        help="Only analyze articles not seen in earlier runs and merge them into the previous digest")
+    args = parser.parse_args()
+
+    # Nothing else in this process calls the LLM: let the workers (and the shared map-stage
+    # slots) use every slot and the whole token budget, and queue instead of timing out
+    llm_scheduler.scheduler.dedicate("background", max(args.workers, BATCH_MAX_WORKERS))
+
+    if args.topics:
+        for topic, analysis in batch_news_analyzer(f"Write in the style of {args.style}", args.topics, args.workers,
+                                                   args.mode, incremental=args.whats_new):
+            print(f"=== {topic} ===\n{analysis}\n")
+    else:
+        # Set defaults
+        newstopic = input("Enter the news topic you want to know more about (default: Today's news): ") or "Today's news"
+        stylechoice = input("Enter the style in which you would like to read the news (default: CNN News Anchor): ") or "CNN News Anchor"
+        print(f"Here is the latest update about: {newstopic} \n")
+        analyzer = news_digest if args.whats_new else news_analyzer
+        print(analyzer(f"Write in the style of {stylechoice}", newstopic, args.mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,19 @@
-import requests
-import random
+import argparse
 import re
+import time
 
-def get_book_text():
-    #load Ramayana book text from Project Gutenberg
-    url='https://www.gutenberg.org/cache/epub/73417/pg73417.txt'
-    response = requests.get(url)
-    text = response.text
-    return text
+from corpus import load_corpus, fetch_text_bytes
+
+# Ramayana book text from Project Gutenberg
+BOOK_URL = 'https://www.gutenberg.org/cache/epub/73417/pg73417.txt'
+
+def get_book_text(source=BOOK_URL):
+    #load book text (cached on disk after the first download, or from a local file path)
+    return fetch_text_bytes(source).decode('utf-8', errors='replace')
+
+def load_good_sentences(source=BOOK_URL, min_length=15, max_length=30):
+    #Get Sentences with appropriate length from the cached sentence index
+    return load_corpus(source).sentences(min_length, max_length)
 
 def get_good_sentences(text, min_length=15, max_length=30):
     #Get Sentences with appropriate length
@@ -20,6 +26,100 @@ def get_good_sentences(text, min_length=15, max_length=30):
             good_sentences.append(s)
     return good_sentences
 
+def clean_word(word):
+    #Normalise a word the same way human guesses are scored
+    return re.sub(r'[^\w\']', '', word.lower())
+
+def evaluate_model(sentences, batch_size=16, top_k=5, min_context=5):
+    """Benchmark the local language model on the same task as the game.
+
+    For every sentence, each word after the first `min_context` words is predicted from
+    the words before it. A sentence needs only one forward pass: the logits at the last
+    token before a word are the model's prediction given exactly that prefix. The model
+    predicts one token, so a word counts as correct when a predicted token, cleaned like
+    a human guess, equals the word's first token cleaned the same way (for single-token
+    words that is the whole word).
+    """
+    from tokenprediction import load_model
+    model, tokenizer = load_model()
+
+    # Offsets below assume right padding; the shared tokenizer is restored afterwards
+    padding_side = tokenizer.padding_side
+    tokenizer.padding_side = "right"
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    try:
+        return _evaluate(model, tokenizer, sentences, batch_size, top_k, min_context)
+    finally:
+        tokenizer.padding_side = padding_side
+
+def _evaluate(model, tokenizer, sentences, batch_size, top_k, min_context):
+    import torch
+
+    decoded_cache = {}
+    def candidate_word(token_id):
+        if token_id not in decoded_cache:
+            decoded_cache[token_id] = clean_word(tokenizer.decode([token_id]))
+        return decoded_cache[token_id]
+
+    top1_correct = topk_correct = first_token_correct = total_predictions = 0
+    start_time = time.perf_counter()
+
+    with torch.no_grad():
+        for batch_start in range(0, len(sentences), batch_size):
+            batch = sentences[batch_start:batch_start + batch_size]
+            encoded = tokenizer(batch, return_tensors="pt", padding=True, return_offsets_mapping=True)
+            offsets = encoded.pop("offset_mapping").tolist()
+            logits = model(**encoded).logits
+            top_ids = torch.topk(logits, top_k, dim=-1).indices.tolist()
+            del logits
+            input_ids = encoded["input_ids"].tolist()
+            attention = encoded["attention_mask"].tolist()
+
+            for row, sentence in enumerate(batch):
+                word_matches = list(re.finditer(r'\S+', sentence))
+                token_pos = 0
+                for word_index, match in enumerate(word_matches):
+                    # Advance to the first real token that reaches into this word
+                    while token_pos < len(offsets[row]) and (
+                            attention[row][token_pos] == 0 or offsets[row][token_pos][1] <= match.start()):
+                        token_pos += 1
+                    if word_index < min_context or token_pos == 0 or token_pos >= len(offsets[row]):
+                        continue
+
+                    actual = input_ids[row][token_pos]
+                    target = candidate_word(actual)
+                    predicted = top_ids[row][token_pos - 1]
+                    candidates = [candidate_word(token_id) for token_id in predicted]
+                    if target:
+                        top1_correct += candidates[0] == target
+                        topk_correct += target in candidates
+                    else:
+                        # The first token is only a space or punctuation: compare token ids
+                        top1_correct += predicted[0] == actual
+                        topk_correct += actual in predicted
+                    first_token_correct += predicted[0] == actual
+                    total_predictions += 1
+
+    elapsed = time.perf_counter() - start_time
+    results = {
+        "sentences": len(sentences),
+        "predictions": total_predictions,
+        "top1_accuracy": top1_correct / total_predictions if total_predictions else 0.0,
+        "topk_accuracy": topk_correct / total_predictions if total_predictions else 0.0,
+        "first_token_accuracy": first_token_correct / total_predictions if total_predictions else 0.0,
+        "top_k": top_k,
+        "seconds": elapsed,
+        "sentences_per_second": len(sentences) / elapsed if elapsed > 0 else 0.0,
+    }
+
+    print(f"Evaluated {results['predictions']} predictions over {results['sentences']} sentences")
+    print(f"Top-1 word accuracy: {results['top1_accuracy'] * 100:.1f}%")
+    print(f"Top-{top_k} word accuracy: {results['topk_accuracy'] * 100:.1f}%")
+    print(f"Top-1 first-token accuracy: {results['first_token_accuracy'] * 100:.1f}%")
+    print(f"Throughput: {results['sentences_per_second']:.1f} sentences/sec ({elapsed:.1f}s total)")
+    return results
+
 def play_continuous_game(sentences, num_sentences=3):
     """Play continuous prediction within each sentence"""
     print("Welcome to Continuous Next Token Prediction!")
@@ -95,11 +195,27 @@ def play_continuous_game(sentences, num_sentences=3):
     else:
         print("Keep practicing! Next-token prediction is challenging.")
 
-# Load the text and get good sentences
-print("Loading text...")
-text = get_book_text()
-sentences = get_good_sentences(text)
-print(f"Found {len(sentences)} good sentences!")
+def main():
+    parser = argparse.ArgumentParser(description="Continuous next token prediction game")
+    parser.add_argument("--source", default=BOOK_URL, help="Corpus URL or local text file path")
+    parser.add_argument("--min-length", type=int, default=15, help="Minimum sentence length in words")
+    parser.add_argument("--max-length", type=int, default=30, help="Maximum sentence length in words")
+    parser.add_argument("--evaluate", action="store_true", help="Score the local model instead of playing")
+    parser.add_argument("--batch-size", type=int, default=16, help="Sentences per forward pass in --evaluate mode")
+    parser.add_argument("--top-k", type=int, default=5, help="Candidates considered for top-k accuracy")
+    parser.add_argument("--limit", type=int, help="Only evaluate the first N sentences")
+    args = parser.parse_args()
+
+    # Load the text and get good sentences
+    print("Loading text...")
+    sentences = load_good_sentences(args.source, args.min_length, args.max_length)
+    print(f"Found {len(sentences)} good sentences!")
+
+    if args.evaluate:
+        evaluate_model(sentences[:args.limit], batch_size=args.batch_size, top_k=args.top_k)
+    else:
+        # Start the game with 3 rounds
+        play_continuous_game(sentences, 3)
 
-# Start the game with 5 rounds
-play_continuous_game(sentences, 3)
+if __name__ == "__main__":
+    main()
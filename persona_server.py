@@ -0,0 +1,40 @@
+import argparse
+import importlib
+
+import tracing
+from chat_engine import engine
+
+# Configuration
+PERSONA_APPS = {"bluey": "bluebot", "goswami": "tvanchorbot", "chatbot": "gradiochatbot"}
+TAB_NAMES = {"bluey": "Bluey", "goswami": "Goswami Bot", "chatbot": "Chatbot"}
+
+
+def load_apps(names):
+    """Import each persona's app module; importing registers its persona on the shared engine"""
+    return {name: importlib.import_module(PERSONA_APPS[name]) for name in names}
+
+
+def build_demo(apps):
+    """One Gradio app with a tab per persona"""
+    import gradio as gr
+
+    return gr.TabbedInterface([app.build_demo() for app in apps.values()], [TAB_NAMES[name] for name in apps])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve every chat persona from one process on a shared engine")
+    parser.add_argument("--personas", nargs="+", choices=sorted(PERSONA_APPS), default=list(PERSONA_APPS))
+    parser.add_argument("--port", type=int, default=7860)
+    args = parser.parse_args()
+
+    apps = load_apps(args.personas)
+    for name in args.personas:
+        engine.start_background(engine.personas[name])
+
+    # One metrics endpoint for all personas; series are labelled bot=<persona>
+    tracing.start_metrics_server()
+    build_demo(apps).launch(server_port=args.port)
+
+
+if __name__ == "__main__":
+    main()
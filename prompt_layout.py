@@ -0,0 +1,85 @@
+import hashlib
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+import tracing
+
+# Configuration
+MAX_TRACKED_SESSIONS = 10000  # PrefixTracker forgets the oldest sessions beyond this
+
+# Prompts are laid out from most to least stable, so consecutive turns share the longest
+# possible byte-identical prefix and prefix caches (provider prompt caching or a local KV
+# cache) can reuse it:
+#   1. persona prompt      - never changes
+#   2. memory block        - changes only when a memory is added, merged or evicted
+#   3. running summary     - changes every few turns
+#   4. conversation turns  - append-only
+#   5. current message
+# Volatile data such as timestamps or access counts must never go into 1-3.
+
+
+def history_messages(history):
+    """Convert Gradio history (message dicts or [user, assistant] pairs) to LangChain messages"""
+    messages = []
+    for h in history:
+        if isinstance(h, dict):
+            # Handle message-style format (role/content)
+            if h["role"] == "user":
+                messages.append(HumanMessage(content=h["content"]))
+            elif h["role"] == "assistant":
+                messages.append(AIMessage(content=h["content"]))
+        else:
+            # Handle tuple-style format [user_msg, ai_msg]
+            messages.append(HumanMessage(content=h[0]))
+            messages.append(AIMessage(content=h[1]))
+    return messages
+
+
+def build_messages(persona_prompt, memory_block="", summary_block="", history=(), message=None):
+    """Assemble a chat prompt in stable-to-volatile order"""
+    messages = [SystemMessage(content=persona_prompt)]
+    if memory_block:
+        messages.append(SystemMessage(content=memory_block))
+    if summary_block:
+        messages.append(SystemMessage(content=summary_block))
+    messages.extend(history_messages(history))
+    if message is not None:
+        messages.append(HumanMessage(content=message))
+    return messages
+
+
+def static_prefix(messages):
+    """The leading system messages, which are shared by every turn until memories or the summary change"""
+    prefix = []
+    for msg in messages:
+        if not isinstance(msg, SystemMessage):
+            break
+        prefix.append(msg)
+    return prefix
+
+
+def to_chat_dicts(messages):
+    """Convert LangChain messages to role/content dicts for chat templates"""
+    roles = {SystemMessage: "system", HumanMessage: "user", AIMessage: "assistant"}
+    return [{"role": roles.get(type(msg), "user"), "content": msg.content} for msg in messages]
+
+
+class PrefixTracker:
+    """Counts, per session, how often a turn's static prefix is identical to the previous turn's"""
+
+    def __init__(self):
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def observe(self, session_id, messages):
+        digest = hashlib.sha256(
+            "\x00".join(msg.content for msg in static_prefix(messages)).encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            hit = self._last.pop(session_id, None) == digest
+            self._last[session_id] = digest
+            if len(self._last) > MAX_TRACKED_SESSIONS:
+                self._last.pop(next(iter(self._last)))
+        tracing.record_cache("prompt_prefix", hit)
+        return hit
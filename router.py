@@ -0,0 +1,134 @@
+import hashlib
+import json
+import math
+import re
+import threading
+from datetime import datetime
+
+import tracing
+from semantic_cache import CONTEXT_DEPENDENT_PATTERN
+
+# Configuration
+ROUTE_THRESHOLD = 0.35  # Turns scoring below this go to the fast model
+ROUTE_LOG_FILE = "route_log.jsonl"  # One JSON line per routed turn; set to None to disable
+ROUTE_LOG_MESSAGE_TEXT = False  # Also log the raw message (needed by eval_router.py); off logs only its hash
+ROUTE_LOG_MESSAGE_CHARS = 500  # Message text kept when ROUTE_LOG_MESSAGE_TEXT is on
+USE_PERPLEXITY = False  # Also score how unusual the message is for the local SmolLM2 model (loads torch)
+PERPLEXITY_SCALE = 200.0  # Perplexity at which the perplexity feature is maxed out
+
+SMALL_TALK_PATTERN = re.compile(
+    r"^\W*(hi|hello|hey|hiya|thanks|thank you|ok|okay|bye|goodbye|good (morning|night|evening)|wackadoo|yay|"
+    r"cool|wow|lol|haha|yes|no|sure|great|nice|awesome)\b",
+    re.IGNORECASE,
+)
+HARD_KEYWORDS = (
+    "why", "how", "explain", "compare", "difference", "analy", "calculate", "solve", "code", "program",
+    "write", "story", "plan", "summar", "news", "latest", "history", "science", "translate", "step",
+    "debate", "opinion", "policy", "economy", "election",
+)
+
+# Weight of each feature in the difficulty score
+WEIGHTS = {
+    "length": 0.4,  # Scaled by words / 40
+    "hard_keywords": 0.2,  # Per keyword, at most two counted
+    "question": 0.1,
+    "digits": 0.1,
+    "sentences": 0.1,  # More than two sentences
+    "follow_up": 0.15,  # Leans on earlier turns
+    "small_talk": -0.5,
+    "perplexity": 0.3,  # Scaled by log(perplexity) / log(PERPLEXITY_SCALE)
+}
+
+_log_lock = threading.Lock()
+
+
+def message_perplexity(message):
+    """Perplexity of the message under the local small model"""
+    import torch
+
+    import tokenprediction
+
+    model, tokenizer = tokenprediction.load_model()
+    ids = tokenizer.encode(message, return_tensors="pt")
+    if ids.shape[1] < 2:
+        return 1.0
+    with torch.no_grad():
+        loss = model(ids, labels=ids).loss
+    return math.exp(float(loss))
+
+
+class QueryRouter:
+    """Picks a model tier per turn from cheap features of the message: "fast" or "large".
+
+    Greetings and short chit-chat go to the fast model; long, multi-part, analytical or
+    follow-up questions go to the large one.
+    """
+
+    def __init__(self, threshold=ROUTE_THRESHOLD, use_perplexity=USE_PERPLEXITY, log_file=ROUTE_LOG_FILE,
+                 log_message_text=ROUTE_LOG_MESSAGE_TEXT):
+        self.threshold = threshold
+        self.use_perplexity = use_perplexity
+        self.log_file = log_file
+        self.log_message_text = log_message_text
+
+    def features(self, message, history=None):
+        text = message.lower()
+        words = len(text.split())
+        features = {
+            "words": words,
+            "hard_keywords": sum(1 for keyword in HARD_KEYWORDS if re.search(rf"\b{keyword}", text)),
+            "question": "?" in text,
+            "digits": bool(re.search(r"\d", text)),
+            "sentences": len([s for s in re.split(r"[.!?]+", text) if s.strip()]),
+            "follow_up": bool(history) and bool(CONTEXT_DEPENDENT_PATTERN.search(message)),
+            "small_talk": bool(SMALL_TALK_PATTERN.match(message)) and words <= 6,
+        }
+        if self.use_perplexity:
+            features["perplexity"] = message_perplexity(message)
+        return features
+
+    def score(self, features):
+        """Difficulty score in [0, 1]"""
+        score = WEIGHTS["length"] * min(features["words"] / 40, 1.0)
+        score += WEIGHTS["hard_keywords"] * min(features["hard_keywords"], 2)
+        score += WEIGHTS["question"] * features["question"]
+        score += WEIGHTS["digits"] * features["digits"]
+        score += WEIGHTS["sentences"] * (features["sentences"] > 2)
+        score += WEIGHTS["follow_up"] * features["follow_up"]
+        score += WEIGHTS["small_talk"] * features["small_talk"]
+        if "perplexity" in features:
+            scaled = math.log(max(features["perplexity"], 1.0)) / math.log(PERPLEXITY_SCALE)
+            score += WEIGHTS["perplexity"] * min(scaled, 1.0)
+        return max(0.0, min(score, 1.0))
+
+    def route(self, bot, message, history=None):
+        """Return the decision for a turn: {"tier", "score", "features"}"""
+        features = self.features(message, history)
+        score = self.score(features)
+        tier = "fast" if score < self.threshold else "large"
+        tracing.inc_counter("route_decisions_total", tier=tier, bot=bot)
+        return {"tier": tier, "score": score, "features": features}
+
+    def log(self, bot, message, decision, result, latency):
+        """Append a routed turn, with its latency and token usage, to the route log"""
+        if not self.log_file:
+            return
+        entry = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "bot": bot,
+            "message_hash": hashlib.sha1(message.encode("utf-8")).hexdigest(),
+            "tier": decision["tier"],
+            "score": round(decision["score"], 4),
+            "features": decision["features"],
+            "latency": latency,
+            "used_search": result.used_search,
+            "input_tokens": result.input_tokens,
+            "output_tokens": result.output_tokens,
+        }
+        if self.log_message_text:
+            entry["message"] = message[:ROUTE_LOG_MESSAGE_CHARS]
+        try:
+            with _log_lock, open(self.log_file, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except Exception as e:
+            print(f"Error writing route log: {e}")
@@ -0,0 +1,164 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import tracing
+
+# Configuration
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"  # Used when sentence-transformers is installed
+SIMILARITY_THRESHOLD = 0.92  # Cosine similarity needed for a hit with sentence-transformers
+CACHE_TTL_SECONDS = 24 * 3600  # How long a cached answer is served
+SEARCH_ANSWER_TTL_SECONDS = 3600  # Shorter lifetime for answers that needed a web search
+MAX_ENTRIES_PER_NAMESPACE = 2000  # Oldest entries are dropped beyond this
+MAX_NAMESPACES = 10000  # Least recently used namespaces are dropped beyond this (one per distinct memory block)
+
+# Follow-up questions whose meaning depends on earlier turns are never served from the cache
+CONTEXT_DEPENDENT_PATTERN = re.compile(
+    r"\b(it|its|that|this|those|these|he|she|him|her|they|them|their|there|again|more|else|"
+    r"also|too|why|previous|earlier|before|above|same)\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_question(text):
+    return " ".join(re.findall(r"[a-z0-9']+", text.lower().replace("’", "'")))
+
+
+def is_cacheable(message, history):
+    """A question can use the cache unless it is a follow-up that leans on the conversation"""
+    if not normalize_question(message):
+        return False
+    return not history or not CONTEXT_DEPENDENT_PATTERN.search(message)
+
+
+class ExactMatcher:
+    """Fallback without sentence-transformers: only the same question after normalization hits.
+
+    Word-hashing embeddings score different questions with the same wording pattern
+    ("a story about a dog" / "a story about a cat") as near-identical, so they are not used.
+    """
+
+    exact = True
+    threshold = None
+
+
+class SentenceTransformerEmbedder:
+    """Local sentence-transformers model; only used when the package is installed"""
+
+    exact = False
+    threshold = SIMILARITY_THRESHOLD
+
+    def __init__(self, model_name=EMBEDDING_MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def encode(self, text):
+        return self.model.encode(text, normalize_embeddings=True)
+
+
+def default_embedder():
+    """sentence-transformers when available, otherwise exact matching of normalized questions"""
+    try:
+        return SentenceTransformerEmbedder()
+    except Exception as e:
+        print(f"Answer cache will only match repeated questions exactly ({e})")
+        return ExactMatcher()
+
+
+class SemanticCache:
+    """Answers keyed by question embedding, in separate namespaces (one per persona and injected memory block).
+
+    Lookups compare the question against every live entry of its namespace with one
+    matrix-vector product and return the best answer above the similarity threshold;
+    with an exact embedder the normalized question must match instead.
+    """
+
+    def __init__(self, embedder=None, threshold=None, ttl=CACHE_TTL_SECONDS, max_entries=MAX_ENTRIES_PER_NAMESPACE,
+                 max_namespaces=MAX_NAMESPACES):
+        self._embedder = embedder
+        self._threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_namespaces = max_namespaces
+        self._namespaces = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def embedder(self):
+        # Created on first use so importing a bot does not load an embedding model
+        if self._embedder is None:
+            self._embedder = default_embedder()
+        return self._embedder
+
+    @property
+    def threshold(self):
+        return self._threshold if self._threshold is not None else self.embedder.threshold
+
+    def _namespace(self, namespace):
+        space = self._namespaces.setdefault(namespace, {"entries": [], "matrix": None})
+        self._namespaces.move_to_end(namespace)
+        while len(self._namespaces) > self.max_namespaces:
+            self._namespaces.popitem(last=False)
+        return space
+
+    def lookup(self, namespace, question):
+        """Return the cached answer for a near-identical question, or None"""
+        if self.embedder.exact:
+            return self._lookup_exact(namespace, question)
+        import numpy as np
+
+        vector = self.embedder.encode(question)
+        now = time.time()
+        answer = None
+        with self._lock:
+            space = self._namespace(namespace)
+            self._expire(space, now)
+            if space["entries"]:
+                if space["matrix"] is None:
+                    space["matrix"] = np.vstack([entry["vector"] for entry in space["entries"]])
+                scores = space["matrix"] @ vector
+                best = int(scores.argmax())
+                if scores[best] >= self.threshold:
+                    answer = space["entries"][best]["answer"]
+        tracing.record_cache("semantic_answer", answer is not None)
+        return answer
+
+    def _lookup_exact(self, namespace, question):
+        key = normalize_question(question)
+        answer = None
+        with self._lock:
+            space = self._namespace(namespace)
+            self._expire(space, time.time())
+            for entry in reversed(space["entries"]):
+                if entry["key"] == key:
+                    answer = entry["answer"]
+                    break
+        tracing.record_cache("semantic_answer", answer is not None)
+        return answer
+
+    def store(self, namespace, question, answer, ttl=None):
+        """Cache an answer; the entry expires after `ttl` seconds (default: the cache TTL)"""
+        vector = None if self.embedder.exact else self.embedder.encode(question)
+        expires = time.time() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            space = self._namespace(namespace)
+            space["entries"].append({"question": question, "key": normalize_question(question), "answer": answer,
+                                     "vector": vector, "expires": expires})
+            if len(space["entries"]) > self.max_entries:
+                del space["entries"][:len(space["entries"]) - self.max_entries]
+            space["matrix"] = None
+
+    def _expire(self, space, now):
+        live = [entry for entry in space["entries"] if entry["expires"] > now]
+        if len(live) != len(space["entries"]):
+            space["entries"] = live
+            space["matrix"] = None
+
+    def clear(self, namespace=None):
+        with self._lock:
+            if namespace is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace, None)
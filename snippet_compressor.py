@@ -0,0 +1,154 @@
+import argparse
+import re
+
+import tracing
+from knowledge_base import bm25_scores
+from token_utils import estimate_tokens
+
+# Configuration
+FETCH_RESULTS = 12  # Web results fetched per search before compression
+TOKEN_BUDGET = 200  # Tokens of search context sent to the model
+DUPLICATE_THRESHOLD = 0.6  # Word-trigram overlap (Jaccard) above which a snippet repeats an earlier one
+SNIPPET_WEIGHT = 0.5  # How much a sentence's snippet rank adds to the sentence's own relevance
+USE_CROSS_ENCODER = False  # Rerank with a local cross-encoder instead of BM25 (needs sentence-transformers)
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+_cross_encoder = None
+
+
+def is_failure(results):
+    """True for the single error/no-result entry search backends return"""
+    return len(results) == 1 and (results[0].startswith("[") or results[0] == "No search results found.")
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+
+def shingles(text, size=3):
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def dedupe(snippets, threshold=DUPLICATE_THRESHOLD):
+    """Drop snippets whose word trigrams mostly repeat an earlier snippet's"""
+    kept, seen = [], []
+    for snippet in snippets:
+        grams = shingles(snippet)
+        if any(len(grams & other) / len(grams | other) >= threshold for other in seen):
+            continue
+        kept.append(snippet)
+        seen.append(grams)
+    return kept
+
+
+def cross_encoder_scores(query, texts):
+    global _cross_encoder
+    if _cross_encoder is None:
+        from sentence_transformers import CrossEncoder
+
+        _cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL)
+    return [float(score) for score in _cross_encoder.predict([(query, text) for text in texts])]
+
+
+def relevance(query, texts, use_cross_encoder=USE_CROSS_ENCODER):
+    """Relevance of each text to the query, scaled so the best is 1"""
+    scores = None
+    if use_cross_encoder:
+        try:
+            scores = cross_encoder_scores(query, texts)
+            low = min(scores)
+            scores = [score - low for score in scores]  # Cross-encoder logits can be negative
+        except Exception as e:
+            print(f"Error loading cross-encoder, falling back to BM25: {e}")
+    if scores is None:
+        scores = bm25_scores(query, texts)
+    best = max(scores, default=0.0)
+    return [score / best if best > 0 else 0.0 for score in scores]
+
+
+class SnippetCompressor:
+    """Turns many raw search snippets into a few relevant sentences within a token budget.
+
+    Near-duplicate snippets are dropped, the rest are ranked against the question, and the
+    best sentences are kept (grouped back under their snippet, in their original order)
+    until `token_budget` is reached.
+    """
+
+    def __init__(self, token_budget=TOKEN_BUDGET, fetch_results=FETCH_RESULTS, use_cross_encoder=USE_CROSS_ENCODER):
+        self.token_budget = token_budget
+        self.fetch_results = fetch_results
+        self.use_cross_encoder = use_cross_encoder
+
+    def compress(self, query, snippets):
+        """Return (compressed snippets, stats) where stats has the token counts before and after"""
+        raw_tokens = sum(estimate_tokens(snippet) for snippet in snippets)
+        if not snippets or is_failure(snippets):
+            return snippets, {"snippets": len(snippets), "unique": len(snippets), "kept": len(snippets),
+                              "raw_tokens": raw_tokens, "tokens": raw_tokens, "saved_tokens": 0}
+
+        unique = dedupe(snippets)
+        snippet_scores = relevance(query, unique, self.use_cross_encoder)
+        sentences = [(i, j, sentence) for i, snippet in enumerate(unique)
+                     for j, sentence in enumerate(split_sentences(snippet))]
+        sentence_scores = relevance(query, [sentence for _, _, sentence in sentences], self.use_cross_encoder)
+        ranked = sorted(
+            ((score + SNIPPET_WEIGHT * snippet_scores[i], i, j, sentence)
+             for (i, j, sentence), score in zip(sentences, sentence_scores) if score > 0),
+            reverse=True,
+        )
+        if not ranked:
+            # Nothing matches the question's words: keep the top results' opening sentences
+            ranked = [(snippet_scores[i], i, j, sentence) for i, j, sentence in sentences if j == 0]
+            ranked.sort(reverse=True)
+
+        chosen, used = {}, 0
+        for _, i, j, sentence in ranked:
+            tokens = estimate_tokens(sentence)
+            if used + tokens > self.token_budget and chosen:
+                continue
+            chosen.setdefault(i, []).append((j, sentence))
+            used += tokens
+
+        # Most relevant snippet first; sentences keep their order within a snippet
+        order = sorted(chosen, key=lambda i: -snippet_scores[i])
+        compressed = [" ".join(sentence for _, sentence in sorted(chosen[i])) for i in order]
+        tokens = sum(estimate_tokens(snippet) for snippet in compressed)
+        return compressed, {"snippets": len(snippets), "unique": len(unique), "kept": len(compressed),
+                            "raw_tokens": raw_tokens, "tokens": tokens, "saved_tokens": raw_tokens - tokens}
+
+
+def record_savings(stats, bot):
+    """Publish the search context tokens before and after compression"""
+    tracing.inc_counter("search_context_tokens_total", stats["raw_tokens"], stage="fetched", bot=bot)
+    tracing.inc_counter("search_context_tokens_total", stats["tokens"], stage="sent", bot=bot)
+
+
+def format_stats(stats):
+    """Compression summary for the debug display"""
+    return (f"**Search Compression**\n- Snippets: {stats['snippets']} fetched, {stats['unique']} "
+            f"unique, {stats['kept']} kept\n- Tokens: {stats['raw_tokens']} -> {stats['tokens']} "
+            f"(saved {stats['saved_tokens']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the web and show the snippets before and after compression")
+    parser.add_argument("query")
+    parser.add_argument("--results", type=int, default=FETCH_RESULTS, help="Results to fetch")
+    parser.add_argument("--budget", type=int, default=TOKEN_BUDGET, help="Token budget for the kept sentences")
+    parser.add_argument("--cross-encoder", action="store_true", help=f"Rerank with {CROSS_ENCODER_MODEL}")
+    args = parser.parse_args()
+
+    from chat_engine import ddg_search
+
+    snippets = ddg_search(args.query, args.results)
+    compressed, stats = SnippetCompressor(args.budget, args.results, args.cross_encoder).compress(args.query, snippets)
+    for i, snippet in enumerate(compressed):
+        print(f"Source {i+1}: {snippet}\n")
+    print(format_stats(stats).replace("**", ""))
+
+
+if __name__ == "__main__":
+    main()
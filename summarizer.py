@@ -0,0 +1,181 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import tracing
+
+# Configuration
+SUMMARY_EVERY_N_TURNS = 3  # Update the running summary after this many new user/assistant turns
+KEEP_RECENT_MESSAGES = 6  # Messages always sent verbatim, even when the summary covers them
+MAX_SESSIONS = 10000  # Running summaries kept at once (least recently used dropped)
+SESSION_TTL_SECONDS = 24 * 3600  # Summaries of sessions idle this long are dropped (closed tabs, expired API sessions)
+
+INCREMENTAL_HUMAN_PROMPT_TEMPLATE = (
+    "Summary of the conversation so far:\n{}\n\n"
+    "New messages since that summary:\n{}\n\n"
+    "Write the updated summary as one concise paragraph that keeps the earlier facts and adds the new ones."
+)
+SUMMARY_CONTEXT_TEMPLATE = "Summary of the earlier part of this conversation:\n{}"
+
+
+def history_to_text(history):
+    """Convert Gradio history (message dicts or [user, assistant] pairs) to plain text"""
+    conversation_text = ""
+    for msg in history:
+        if isinstance(msg, dict):
+            role = msg.get("role", "")
+            content = msg.get("content", "")
+            conversation_text += f"{role.capitalize()}: {content}\n"
+        else:
+            conversation_text += f"User: {msg[0]}\nAssistant: {msg[1]}\n"
+    return conversation_text
+
+
+def history_hash(history):
+    """Fingerprint of a history prefix, used to notice a cleared, undone or retried chat"""
+    return hashlib.sha1(history_to_text(history).encode("utf-8")).hexdigest()
+
+
+def append_turn(history, message, response):
+    """Return history with one more user/assistant turn, in the same format as history"""
+    if history and not isinstance(history[0], dict):
+        return list(history) + [[message, response]]
+    return list(history) + [{"role": "user", "content": message}, {"role": "assistant", "content": response}]
+
+
+class RollingSummarizer:
+    """Keeps a running summary per session, updated by a background worker.
+
+    Every `every_n_turns` turns, only the messages added since the last update are sent
+    to the LLM together with the previous summary, so each update costs the same no
+    matter how long the chat gets. `covered` counts how many history entries the
+    summary includes and `prefix` fingerprints them; when the chat no longer starts with
+    those entries (Clear, Undo, Retry), the session starts over with an empty summary.
+    Sessions idle for `ttl` seconds or beyond the `max_sessions` most recent are forgotten.
+    """
+
+    def __init__(self, invoke, system_prompt, every_n_turns=SUMMARY_EVERY_N_TURNS, name="summarizer", model=None,
+                 executor=None, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL_SECONDS):
+        self.invoke = invoke  # Called with a list of messages, returns an AIMessage
+        self.system_prompt = system_prompt
+        self.every_n_turns = every_n_turns
+        self.name = name
+        self.model = model
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # Least recently used first
+        self._lock = threading.Lock()
+        # Updates can share a worker pool; a session's updates are submitted in order
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+
+    @staticmethod
+    def _new_state():
+        return {"summary": "", "covered": 0, "prefix": history_hash([]), "pending": None, "last_used": time.monotonic()}
+
+    def _state(self, session_id):
+        """The session's state, created if needed; drops idle and least recently used sessions.
+        Called with the lock held."""
+        now = time.monotonic()
+        state = self._sessions.pop(session_id, None) or self._new_state()
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest["last_used"] < self.ttl and len(self._sessions) < self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+        state["last_used"] = now
+        self._sessions[session_id] = state
+        return state
+
+    @staticmethod
+    def _matches(state, history):
+        return state["covered"] <= len(history) and history_hash(history[:state["covered"]]) == state["prefix"]
+
+    def _current(self, session_id, history):
+        """The session's state, reset if its summary no longer describes the start of history;
+        called with the lock held. A pending update for the old state is left to finish unused."""
+        state = self._state(session_id)
+        if not self._matches(state, history):
+            state = self._sessions[session_id] = self._new_state()
+        return state
+
+    def get(self, session_id):
+        """Return (summary, covered) for a session"""
+        with self._lock:
+            state = self._state(session_id)
+            return state["summary"], state["covered"]
+
+    def observe(self, session_id, history):
+        """Call after each turn; schedules a background update once enough new turns have arrived"""
+        entries_per_turn = 2 if history and isinstance(history[0], dict) else 1
+        with self._lock:
+            state = self._current(session_id, history)
+            if state["pending"] is not None or len(history) - state["covered"] < self.every_n_turns * entries_per_turn:
+                return
+            state["pending"] = self._executor.submit(self._update, state, list(history))
+
+    def finalize(self, session_id, history, callback, fallback_summary=None):
+        """Forget the session now; fold its unsummarized messages into the summary in the
+        background and then call `callback(summary)`. Returns immediately.
+
+        If the update fails and there is no earlier summary, `fallback_summary` is saved instead.
+        """
+        with self._lock:
+            state = self._sessions.pop(session_id, None) or self._new_state()
+            pending = state["pending"]
+        history = list(history)
+
+        def run():
+            nonlocal state
+            if pending is not None:
+                pending.result()
+            if not self._matches(state, history):
+                state = self._new_state()
+            if state["covered"] < len(history):
+                self._update(state, history)
+            summary = state["summary"] or (fallback_summary if history else None)
+            if summary:
+                callback(summary)
+
+        return self._executor.submit(run)
+
+    def discard(self, session_id):
+        """Forget a session without saving its summary"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _update(self, state, history):
+        with self._lock:
+            previous, covered = state["summary"], state["covered"]
+        new_text = history_to_text(history[covered:])
+        prompt = [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=INCREMENTAL_HUMAN_PROMPT_TEMPLATE.format(previous or "(nothing yet)", new_text)),
+        ]
+        try:
+            with tracing.trace("summarize", bot=self.name):
+                with tracing.span("summarize_incremental"):
+                    response = self.invoke(prompt)
+                tracing.record_llm_call("summarize_incremental", response, self.model)
+            summary, covered, prefix = response.content, len(history), history_hash(history)
+        except Exception as e:
+            # Keep the old summary and coverage so the next update retries these messages
+            print(f"Error updating running summary: {e}")
+            summary, prefix = previous, state["prefix"]
+        with self._lock:
+            state["summary"], state["covered"], state["prefix"], state["pending"] = summary, covered, prefix, None
+        return summary
+
+    def compact_history(self, session_id, history, keep_recent=KEEP_RECENT_MESSAGES):
+        """Return (summary, remaining_history): the summary stands in for the older entries
+        it covers, while the last `keep_recent` entries are always kept verbatim."""
+        with self._lock:
+            state = self._current(session_id, history)
+            summary, covered = state["summary"], state["covered"]
+        cut = min(covered, len(history) - keep_recent)
+        if not summary or cut <= 0:
+            return None, history
+        return summary, history[cut:]
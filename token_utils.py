@@ -0,0 +1,18 @@
+# Rough token estimate used for budgeting prompts without loading a tokenizer.
+# English text averages about 4 characters per token for Llama-style vocabularies.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """Approximate the number of tokens in a piece of text"""
+    if not text:
+        return 0
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text down to roughly `max_tokens` tokens"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + "..."
@@ -1,17 +1,46 @@
-# Import the AutoModelForCausalLM class from the transformers library
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import copy
+import time
+from collections import OrderedDict
 
 # Define the model name/identifier for a small language model from HuggingFace
 model_name="HuggingFaceTB/SmolLM2-135M-Instruct"
+# Larger model of the same family (same tokenizer), verified against the small model's drafts
+target_model_name="HuggingFaceTB/SmolLM2-360M-Instruct"
 
-# Load the pre-trained causal language model
-# .to("cpu") explicitly places the model on CPU rather than GPU
-model = AutoModelForCausalLM.from_pretrained(model_name).to("cpu")
-tokenizer=AutoTokenizer.from_pretrained(model_name)
+PREFIX_CACHE_ENTRIES = 4  # Static prompt prefixes whose KV cache is kept in memory
+SPECULATIVE_DRAFT_TOKENS = 4  # Tokens the draft model proposes per target forward pass
+
+_model = None
+_tokenizer = None
+_target_model = None
+
+def load_model():
+    """Load the model and tokenizer on first use; torch/transformers are only imported here"""
+    global _model, _tokenizer
+    if _model is None:
+        # Import the AutoModelForCausalLM class from the transformers library
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        # Load the pre-trained causal language model
+        # .to("cpu") explicitly places the model on CPU rather than GPU
+        _model = AutoModelForCausalLM.from_pretrained(model_name).to("cpu")
+        _tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return _model, _tokenizer
+
+def load_target_model(name=None):
+    """Load the larger target model for speculative decoding; it shares the small model's tokenizer"""
+    global _target_model
+    if _target_model is None:
+        from transformers import AutoModelForCausalLM
+
+        _target_model = AutoModelForCausalLM.from_pretrained(name or target_model_name).to("cpu")
+    return _target_model
 
-import torch
-import torch.nn.functional as F
 def predict_next_token(text, num_tokens=5, temperature=0):
+    import torch
+    import torch.nn.functional as F
+    model, tokenizer = load_model()
+
     # Convert text to model format
     tokens = tokenizer.encode(text, return_tensors="pt")
 
@@ -48,7 +77,11 @@ def predict_next_token(text, num_tokens=5, temperature=0):
     print(f"FINAL PREDICTION: '{next_token_text}' ({next_token_prob:.1f}%)")
     return next_token_text
 
-def generate_text(text, max_length=100, top_k=5,temperature=1):
+def generate_text(text, max_length=100, top_k=5,temperature=1, speculative=False):
+    # The larger target model, drafted by the small one, instead of the step-by-step walkthrough
+    if speculative:
+        return generate_speculative(text, max_length, temperature)[0]
+
     # Keep track of original input
     original_text = text
     generated_tokens = 0
@@ -77,5 +110,175 @@ def generate_text(text, max_length=100, top_k=5,temperature=1):
 
     return text
 
-predict_next_token("The capital of Russia was", num_tokens=10, temperature=1)
-generate_text("The capital of Russia was ", max_length=10, top_k=5, temperature=1)
+def greedy_generate(model, input_ids, past_key_values=None, max_new_tokens=50, eos_token_id=None, start=None):
+    """Greedy decoding that continues from an optional KV cache; returns (token ids, seconds to first token)"""
+    import torch
+
+    start = start or time.perf_counter()
+    ttft = None
+    generated = []
+    with torch.no_grad():
+        for _ in range(max_new_tokens):
+            output = model(input_ids, past_key_values=past_key_values, use_cache=True)
+            past_key_values = output.past_key_values
+            next_id = int(output.logits[0, -1].argmax())
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            if next_id == eos_token_id:
+                break
+            generated.append(next_id)
+            input_ids = torch.tensor([[next_id]])
+    return generated, ttft
+
+def _pick(logits, temperature, generator):
+    """Greedy pick (temperature 0) or a sample; returns (token id, probabilities or None)"""
+    import torch
+
+    if temperature <= 0:
+        return int(logits.argmax()), None
+    probs = torch.softmax(logits / temperature, dim=-1)
+    return int(torch.multinomial(probs, 1, generator=generator)), probs
+
+def speculative_generate(draft_model, target_model, input_ids, max_new_tokens=50, k=SPECULATIVE_DRAFT_TOKENS,
+                         temperature=0.0, eos_token_id=None, generator=None):
+    """Speculative decoding: the draft model proposes k tokens and the target model checks
+    them all in one forward pass, keeping the longest accepted run plus one token of its own.
+
+    Tokens are accepted with probability min(1, p/q) and a rejection is resampled from
+    max(0, p - q), so the output has exactly the target model's distribution (and equals
+    its greedy output at temperature 0). Returns (token ids, stats).
+    """
+    import torch
+
+    seq = input_ids[0].tolist()
+    generated = []
+    stats = {"proposed": 0, "accepted": 0, "target_calls": 0}
+    draft_cache = target_cache = None
+    draft_len = target_len = 0
+    with torch.no_grad():
+        while len(generated) < max_new_tokens:
+            steps = min(k, max_new_tokens - len(generated))
+
+            # Draft: feed whatever the draft cache has not seen yet, then one token at a time
+            drafts, draft_probs = [], []
+            pending = seq[draft_len:]
+            for _ in range(steps):
+                output = draft_model(torch.tensor([pending]), past_key_values=draft_cache, use_cache=True)
+                draft_cache = output.past_key_values
+                draft_len += len(pending)
+                token, probs = _pick(output.logits[0, -1], temperature, generator)
+                drafts.append(token)
+                draft_probs.append(probs)
+                pending = [token]
+
+            # Verify: one target pass over the unseen tokens and every draft
+            pending = seq[target_len:]
+            output = target_model(torch.tensor([pending + drafts]), past_key_values=target_cache, use_cache=True)
+            target_cache = output.past_key_values
+            target_len += len(pending) + len(drafts)
+            logits = output.logits[0, len(pending) - 1:]
+            stats["target_calls"] += 1
+            stats["proposed"] += steps
+
+            accepted = 0
+            for i, token in enumerate(drafts):
+                if temperature <= 0:
+                    if int(logits[i].argmax()) != token:
+                        break
+                else:
+                    p = torch.softmax(logits[i] / temperature, dim=-1)
+                    q = draft_probs[i]
+                    if torch.rand(1, generator=generator).item() >= min(1.0, (p[token] / q[token]).item()):
+                        break
+                accepted += 1
+            if accepted < steps:
+                if temperature <= 0:
+                    extra = int(logits[accepted].argmax())
+                else:
+                    residual = (p - q).clamp(min=0)
+                    extra = int(torch.multinomial(residual / residual.sum(), 1, generator=generator))
+            else:
+                extra, _ = _pick(logits[steps], temperature, generator)
+            stats["accepted"] += accepted
+
+            new_tokens = drafts[:accepted] + [extra]
+            if eos_token_id in new_tokens:
+                generated += new_tokens[:new_tokens.index(eos_token_id)]
+                break
+            new_tokens = new_tokens[:max_new_tokens - len(generated)]
+            # Drop cache entries for rejected drafts; both caches resume from the accepted prefix.
+            # A negative crop removes that many tokens on every transformers version
+            valid = len(seq) + accepted
+            if draft_len > valid:
+                draft_cache.crop(valid - draft_len)
+                draft_len = valid
+            if target_len > valid:
+                target_cache.crop(valid - target_len)
+                target_len = valid
+            seq += new_tokens
+            generated += new_tokens
+    return generated, stats
+
+def generate_speculative(text, max_new_tokens=100, temperature=0.0, k=SPECULATIVE_DRAFT_TOKENS):
+    """Generate with the target model, using the small model as the draft; returns (text, stats)"""
+    draft, tokenizer = load_model()
+    target = load_target_model()
+    ids, stats = speculative_generate(draft, target, tokenizer.encode(text, return_tensors="pt"), max_new_tokens, k,
+                                      temperature, tokenizer.eos_token_id)
+    completion = text + tokenizer.decode(ids, skip_special_tokens=True)
+    print(f"Speculative decoding: {len(ids)} tokens in {stats['target_calls']} target passes, "
+          f"{stats['accepted']}/{stats['proposed']} drafts accepted")
+    print(f"Complete text: '{completion}'")
+    return completion, stats
+
+class PrefixKVCache:
+    """Keeps the KV cache of static prompt prefixes (persona + memories) so each request
+    only has to prefill its own suffix (recent turns + new message)."""
+
+    def __init__(self, max_entries=PREFIX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _prefix(self, prefix_text):
+        import torch
+        model, tokenizer = load_model()
+        entry = self._entries.get(prefix_text)
+        if entry is not None:
+            self._entries.move_to_end(prefix_text)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        ids = tokenizer.encode(prefix_text, return_tensors="pt")
+        with torch.no_grad():
+            entry = model(ids, use_cache=True).past_key_values
+        self._entries[prefix_text] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def generate(self, prefix_text, suffix_text, max_new_tokens=50):
+        """Generate a continuation of prefix_text + suffix_text; returns (text, seconds to first token)"""
+        model, tokenizer = load_model()
+        start = time.perf_counter()
+        # Decoding appends to the cache in place, so each request works on its own copy
+        past = copy.deepcopy(self._prefix(prefix_text))
+        suffix_ids = tokenizer.encode(suffix_text, return_tensors="pt", add_special_tokens=False)
+        ids, ttft = greedy_generate(model, suffix_ids, past, max_new_tokens, tokenizer.eos_token_id, start)
+        return tokenizer.decode(ids, skip_special_tokens=True), ttft
+
+def generate_uncached(prompt_text, max_new_tokens=50):
+    """Generate with a full prefill of the prompt; returns (text, seconds to first token)"""
+    model, tokenizer = load_model()
+    start = time.perf_counter()
+    ids, ttft = greedy_generate(model, tokenizer.encode(prompt_text, return_tensors="pt"),
+                                None, max_new_tokens, tokenizer.eos_token_id, start)
+    return tokenizer.decode(ids, skip_special_tokens=True), ttft
+
+def main():
+    predict_next_token("The capital of Russia was", num_tokens=10, temperature=1)
+    generate_text("The capital of Russia was ", max_length=10, top_k=5, temperature=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import argparse
+import json
+from collections import defaultdict
+
+from tracing import TRACE_LOG_FILE
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def load_traces(path, name=None):
+    """Read traces from a JSONL trace log, optionally keeping only one request name"""
+    traces = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if name is None or record.get("name") == name:
+                traces.append(record)
+    return traces
+
+
+def aggregate(traces):
+    """Collect per-stage latencies, token counts and cache hit rates"""
+    stages = defaultdict(list)
+    tokens = defaultdict(lambda: {"calls": 0, "input": 0, "output": 0})
+    caches = defaultdict(lambda: {"hits": 0, "misses": 0})
+    for record in traces:
+        if record.get("duration") is not None:
+            stages["total"].append(record["duration"])
+        for span in record.get("spans", []):
+            stages[span["name"]].append(span["duration"])
+        for call in record.get("llm_calls", []):
+            stats = tokens[call["stage"]]
+            stats["calls"] += 1
+            stats["input"] += call.get("input_tokens", 0)
+            stats["output"] += call.get("output_tokens", 0)
+        for cache_name, stats in record.get("cache", {}).items():
+            caches[cache_name]["hits"] += stats.get("hits", 0)
+            caches[cache_name]["misses"] += stats.get("misses", 0)
+    return stages, tokens, caches
+
+
+def print_report(traces):
+    stages, tokens, caches = aggregate(traces)
+    print(f"Traces: {len(traces)}\n")
+    print(f"{'Stage':<20}{'Count':>8}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}")
+    print("-" * 58)
+    for stage in sorted(stages, key=lambda s: (s == "total", s)):
+        values = stages[stage]
+        print(f"{stage:<20}{len(values):>8}{percentile(values, 50):>10.3f}"
+              f"{percentile(values, 95):>10.3f}{percentile(values, 99):>10.3f}")
+
+    if tokens:
+        print(f"\n{'LLM stage':<20}{'Calls':>8}{'Avg in':>10}{'Avg out':>10}")
+        print("-" * 48)
+        for stage, stats in sorted(tokens.items()):
+            calls = stats["calls"]
+            print(f"{stage:<20}{calls:>8}{stats['input'] / calls:>10.0f}{stats['output'] / calls:>10.0f}")
+
+    if caches:
+        print(f"\n{'Cache':<20}{'Lookups':>8}{'Hit rate':>10}")
+        print("-" * 38)
+        for cache_name, stats in sorted(caches.items()):
+            lookups = stats["hits"] + stats["misses"]
+            print(f"{cache_name:<20}{lookups:>8}{stats['hits'] / lookups * 100:>9.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a JSONL trace log into latency percentiles")
+    parser.add_argument("path", nargs="?", default=TRACE_LOG_FILE, help=f"Trace log (default: {TRACE_LOG_FILE})")
+    parser.add_argument("--name", help="Only include traces with this request name (e.g. chat)")
+    args = parser.parse_args()
+    print_report(load_traces(args.path, args.name))
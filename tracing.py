@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configuration
+TRACE_LOG_FILE = "traces.jsonl"  # One JSON line per finished trace; set to None to disable
+METRICS_PORT = 9464  # Local Prometheus scrape port used by start_metrics_server()
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_local = threading.local()
+_metrics_lock = threading.Lock()
+_trace_log_lock = threading.Lock()
+
+# Metric name -> {label tuple -> value}
+_counters = {}
+_gauges = {}
+# Metric name -> {label tuple -> [bucket counts..., +Inf count, sum]}
+_histograms = {}
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc_counter(name, value=1, **labels):
+    """Add `value` to a counter"""
+    with _metrics_lock:
+        series = _counters.setdefault(name, {})
+        key = _labels_key(labels)
+        series[key] = series.get(key, 0) + value
+
+
+def set_gauge(name, value, **labels):
+    """Set a gauge to `value`"""
+    with _metrics_lock:
+        _gauges.setdefault(name, {})[_labels_key(labels)] = value
+
+
+def observe(name, value, **labels):
+    """Record one observation (in seconds) into a latency histogram"""
+    with _metrics_lock:
+        series = _histograms.setdefault(name, {})
+        key = _labels_key(labels)
+        buckets = series.setdefault(key, [0] * (len(LATENCY_BUCKETS) + 2))
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+        buckets[-2] += 1
+        buckets[-1] += value
+
+
+class Trace:
+    """Spans and counters collected for one request (e.g. one chat turn)"""
+
+    def __init__(self, name, **attrs):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.spans = []
+        self.llm_calls = []
+        self.cache = {}
+        self.duration = None
+
+    def to_dict(self):
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "attrs": self.attrs,
+            "spans": self.spans,
+            "llm_calls": self.llm_calls,
+            "cache": self.cache,
+        }
+
+
+def current_trace():
+    """The trace active on this thread, or None"""
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def trace(name, **attrs):
+    """Start a trace for one request; spans opened inside it are attached to it"""
+    parent = current_trace()
+    active = Trace(name, **attrs)
+    _local.trace = active
+    try:
+        yield active
+    finally:
+        active.duration = time.perf_counter() - active.start
+        _local.trace = parent
+        # Trace attributes (e.g. bot=<persona>) become labels, giving per-persona request metrics
+        observe("request_duration_seconds", active.duration, request=name, **attrs)
+        inc_counter("requests_total", request=name, **attrs)
+        write_trace(active)
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time one stage of the current request"""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        active = current_trace()
+        labels = {"stage": name}
+        if active is not None:
+            entry = {"name": name, "start": start - active.start, "duration": elapsed}
+            if attrs:
+                entry["attrs"] = attrs
+            if error:
+                entry["error"] = error
+            active.spans.append(entry)
+            labels.update(active.attrs)
+        observe("stage_duration_seconds", elapsed, **labels)
+
+
+def record_llm_call(stage, response, model=None):
+    """Record token usage from a LangChain chat model response"""
+    usage = getattr(response, "usage_metadata", None) or {}
+    input_tokens = usage.get("input_tokens", 0)
+    output_tokens = usage.get("output_tokens", 0)
+    active = current_trace()
+    labels = dict(active.attrs) if active is not None else {}
+    if active is not None:
+        active.llm_calls.append({"stage": stage, "model": model,
+                                 "input_tokens": input_tokens, "output_tokens": output_tokens})
+    inc_counter("llm_calls_total", stage=stage, **labels)
+    inc_counter("llm_input_tokens_total", input_tokens, stage=stage, **labels)
+    inc_counter("llm_output_tokens_total", output_tokens, stage=stage, **labels)
+
+
+def record_cache(cache_name, hit):
+    """Count a cache lookup as a hit or a miss"""
+    active = current_trace()
+    if active is not None:
+        stats = active.cache.setdefault(cache_name, {"hits": 0, "misses": 0})
+        stats["hits" if hit else "misses"] += 1
+    inc_counter("cache_lookups_total", cache=cache_name, result="hit" if hit else "miss")
+
+
+def write_trace(active):
+    """Append a finished trace to TRACE_LOG_FILE"""
+    if not TRACE_LOG_FILE:
+        return
+    try:
+        line = json.dumps(active.to_dict())
+        with _trace_log_lock:
+            with open(TRACE_LOG_FILE, "a") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        print(f"Error writing trace: {e}")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_metrics():
+    """Render all metrics in the Prometheus text exposition format"""
+    lines = []
+    with _metrics_lock:
+        for name, series in sorted(_counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, series in sorted(_gauges.items()):
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value}")
+        for name, series in sorted(_histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for key, buckets in series.items():
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {buckets[-2]}")
+                lines.append(f"{name}_count{_format_labels(key)} {buckets[-2]}")
+                lines.append(f"{name}_sum{_format_labels(key)} {buckets[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=METRICS_PORT, host="127.0.0.1"):
+    """Serve /metrics on a local port from a daemon thread (idempotent)"""
+    global _metrics_server
+    if _metrics_server is None:
+        port = int(os.environ.get("METRICS_PORT", port))
+        _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+        print(f"Metrics available at http://{host}:{port}/metrics")
+    return _metrics_server